@@ -54,11 +54,17 @@ const ReadingSchema = new Schema(
             type: Object,
             required: true,
         },
+        // Resumen de telemetría del sensor-hub (opcional, cada TELEMETRY_PIGGYBACK_S)
+        hubStats: {
+            type: Object,
+            required: false,
+        },
     },
     { versionKey: false }
 );
 
-ReadingSchema.index({ sensorId: 1, timestamp: -1 });
+// Único: la ingesta es idempotente por (sensorId, timestamp) (ver saveReading en ingestCtrl)
+ReadingSchema.index({ sensorId: 1, timestamp: -1 }, { unique: true });
 
 export const Sensor = mongoose.model("Sensor", SensorSchema);
 export const Reading = mongoose.model("Reading", ReadingSchema);
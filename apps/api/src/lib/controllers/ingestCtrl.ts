@@ -15,83 +15,110 @@ const sensorRepository = new SensorRepository(
     new PostgresRepository()
 );
 
-export function createIngestCtrl(bus: IMessageBus): RequestHandler {
-    return async (req, res) => {
-        try {
-            const data: ReadingData = req.body;
+type IngestResult = { status: number; body: Record<string, any> };
 
-            if (!data || typeof data !== "object")
-                return res.status(400).json({ error: "Invalid or missing payload" });
+// Guarda una lectura una sola vez por (sensorId, timestamp): el hub reenvía lotes enteros
+// si la respuesta falla a mitad de camino. Devuelve false si ya estaba guardada.
+async function saveReading(data: ReadingData): Promise<boolean> {
+    try {
+        const result = await Reading.updateOne(
+            { sensorId: data.sensorId, timestamp: new Date(data.timestamp) },
+            { $setOnInsert: data },
+            { upsert: true }
+        );
+        return result.upsertedCount > 0;
+    } catch (err: any) {
+        // Dos upserts iguales en paralelo: el índice único deja pasar solo uno
+        if (err?.code === 11000) return false;
+        throw err;
+    }
+}
 
-            if (!data.metrics || !data.sensorId || !data.timestamp)
-                return res.status(400).json({ error: "Missing required fields" });
+// Procesa una lectura: la guarda, la publica al ingenio y devuelve la config nueva si hay
+async function ingestReading(bus: IMessageBus, data: ReadingData): Promise<IngestResult> {
+    if (!data || typeof data !== "object")
+        return { status: 400, body: { error: "Invalid or missing payload" } };
 
-            const readingSensorConfig: ConfigData | null =
-                await sensorRepository.getSensorConfig(data.sensorId);
+    if (!data.metrics || !data.sensorId || !data.timestamp)
+        return { status: 400, body: { error: "Missing required fields" } };
 
-            const reading = new Reading(data);
-            await reading.save();
+    if (Number.isNaN(Date.parse(data.timestamp)))
+        return { status: 400, body: { error: "Invalid timestamp" } };
 
-            if (!readingSensorConfig) {
-                console.warn(`⚠️ No sensor config found for sensorId: ${data.sensorId}`);
-                return res.status(404).json({ ok: false });
-            }
+    const readingSensorConfig: ConfigData | null =
+        await sensorRepository.getSensorConfig(data.sensorId);
 
-            if (readingSensorConfig.type === "NOCONFIGURADO") {
-                const metricsConfig: Record<string, any> = {};
+    // Sin config no se guarda nada: el hub conserva la lectura y la reenvía al registrarse
+    if (!readingSensorConfig) {
+        console.warn(`⚠️ No sensor config found for sensorId: ${data.sensorId}`);
+        return { status: 404, body: { ok: false } };
+    }
 
-                // crea una config inicial a partir de una reading
-                for (const [category, readings] of Object.entries(data.metrics)) {
-                    metricsConfig[category] = {};
-                    for (const [metricName, value] of Object.entries(readings)) {
-                        metricsConfig[category][metricName] = { max: 0, min: 0 }
-                    }
-                }
+    const inserted = await saveReading(data);
 
-                // establecemos la config con estos valores iniciales en los campos de las readings
-                // cambiamos tipo a "NOTDEFINED" para que cada vez que llegue una read no se cambien ya que no entra en el if
-                const newSensor = await prisma.sensor.update({
-                    where: {
-                        sensorId: readingSensorConfig.sensorId,
-                    },
-                    data: {
-                        config: metricsConfig,
-                        type: "NOTDEFINED"
-                    }
-                });
+    if (readingSensorConfig.type === "NOCONFIGURADO") {
+        const metricsConfig: Record<string, any> = {};
 
-                await sensorRepository.setSensorConfig({
-                    sensorId: newSensor.sensorId,
-                    name: newSensor.sensorId,
-                    machineId: newSensor.machineId,
-                    ingenioId: newSensor.ingenioId,
-                    type: "NOTDEFINED",
-                    intervalMs: 1000,
-                    metricsConfig: metricsConfig, 
-                    configVersion: "v1",
-                    active: true
-                });
+        // crea una config inicial a partir de una reading
+        for (const [category, readings] of Object.entries(data.metrics)) {
+            metricsConfig[category] = {};
+            for (const [metricName, value] of Object.entries(readings)) {
+                metricsConfig[category][metricName] = { max: 0, min: 0 }
+            }
+        }
 
-                // borramos la cache para que la actualice
-                // todo: por alguna razon no esta funcionando esto pero funciona igual xd
-                await cacheRepository.delete(sensorRepository.getCacheKey(data.sensorId));
+        // establecemos la config con estos valores iniciales en los campos de las readings
+        // cambiamos tipo a "NOTDEFINED" para que cada vez que llegue una read no se cambien ya que no entra en el if
+        const newSensor = await prisma.sensor.update({
+            where: {
+                sensorId: readingSensorConfig.sensorId,
+            },
+            data: {
+                config: metricsConfig,
+                type: "NOTDEFINED"
             }
+        });
+
+        await sensorRepository.setSensorConfig({
+            sensorId: newSensor.sensorId,
+            name: newSensor.sensorId,
+            machineId: newSensor.machineId,
+            ingenioId: newSensor.ingenioId,
+            type: "NOTDEFINED",
+            intervalMs: 1000,
+            metricsConfig: metricsConfig, 
+            configVersion: "v1",
+            active: true
+        });
+
+        // borramos la cache para que la actualice
+        // todo: por alguna razon no esta funcionando esto pero funciona igual xd
+        await cacheRepository.delete(sensorRepository.getCacheKey(data.sensorId));
+    }
 
-            const info = await createFormattedInfo(data, readingSensorConfig);
-            if (readingSensorConfig?.active === true)
-                bus.publishToIngenio("reading", info, readingSensorConfig.ingenioId);
+    const info = await createFormattedInfo(data, readingSensorConfig);
+    // Una lectura repetida no se vuelve a publicar
+    if (inserted && readingSensorConfig?.active === true)
+        bus.publishToIngenio("reading", info, readingSensorConfig.ingenioId);
 
-            const newConfig = await cacheRepository.get(`sensor:${data.sensorId}-updated`);
-            if (newConfig) {
-                const parsed = JSON.parse(newConfig || "null");
+    const newConfig = await cacheRepository.get(`sensor:${data.sensorId}-updated`);
+    if (newConfig) {
+        const parsed = JSON.parse(newConfig || "null");
 
-                await cacheRepository.delete(`sensor:${data.sensorId}-updated`);
-                await cacheRepository.delete(sensorRepository.getCacheKey(data.sensorId));
+        await cacheRepository.delete(`sensor:${data.sensorId}-updated`);
+        await cacheRepository.delete(sensorRepository.getCacheKey(data.sensorId));
 
-                return res.status(202).json({ ok: true, config: parsed });
-            }
+        return { status: 202, body: { ok: true, config: parsed } };
+    }
+
+    return { status: 202, body: { ok: true } };
+}
 
-            return res.status(202).json({ ok: true });
+export function createIngestCtrl(bus: IMessageBus): RequestHandler {
+    return async (req, res) => {
+        try {
+            const { status, body } = await ingestReading(bus, req.body);
+            return res.status(status).json(body);
         } catch (err) {
             console.error("Error in /ingest controller:", err);
             return res.status(500).json({ error: "Internal server error" });
@@ -99,6 +126,43 @@ export function createIngestCtrl(bus: IMessageBus): RequestHandler {
     };
 }
 
+// Lote de lecturas del sensor-hub: { readings: ReadingData[] }
+// Las lecturas inválidas se cuentan y se saltan (reenviarlas no las arregla);
+// 404 si algún sensor no está registrado, para que el hub reenvíe su config.
+// Reenviar el lote es seguro: las lecturas ya guardadas se ignoran (ver saveReading).
+export function createBatchIngestCtrl(bus: IMessageBus): RequestHandler {
+    return async (req, res) => {
+        try {
+            const readings: ReadingData[] = req.body?.readings;
+
+            if (!Array.isArray(readings) || readings.length === 0)
+                return res.status(400).json({ error: "Invalid or missing readings" });
+
+            let accepted = 0;
+            let rejected = 0;
+            let unknownSensor = false;
+            let config: any = undefined;
+
+            for (const data of readings) {
+                const { status, body } = await ingestReading(bus, data);
+                if (status === 400) { rejected++; continue; }
+                if (status === 404) unknownSensor = true;
+                if (body.config) config = body.config;
+                accepted++;
+            }
+
+            if (unknownSensor)
+                return res.status(404).json({ ok: false, accepted, rejected });
+            if (config)
+                return res.status(202).json({ ok: true, accepted, rejected, config });
+            return res.status(202).json({ ok: true, accepted, rejected });
+        } catch (err) {
+            console.error("Error in /ingest/batch controller:", err);
+            return res.status(500).json({ error: "Internal server error" });
+        }
+    };
+}
+
 export const addSensorCtrl: RequestHandler = async (req, res) => {
     const data: ConfigData = req.body;
     console.log("Received sensor config:", data);
@@ -6,6 +6,7 @@ export default function ingestRoutes(bus: IMessageBus) {
     const router = Router();
 
     router.post("/", ingestCtrl.createIngestCtrl(bus));
+    router.post("/batch", ingestCtrl.createBatchIngestCtrl(bus));
     router.post("/sensor", ingestCtrl.addSensorCtrl);
     return router;
 }
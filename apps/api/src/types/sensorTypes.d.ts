@@ -14,8 +14,16 @@ export interface ConfigData {
     intervalMs: number;
     metricsConfig: Record<
         string,
-        Record<string, { min?: number; max?: number }>
+        Record<string, { min?: number; max?: number; deadband?: number }>
     >;
+    // Agregación y compresión en el sensor-hub (ver sensor-hub/processing.py)
+    processing?: {
+        windowMs?: number;
+        stats?: ("mean" | "min" | "max" | "rms")[];
+        compression?: "none" | "deadband" | "swinging_door";
+        deadband?: number;
+        heartbeatMs?: number;
+    };
     createdAt?: Date | string;
     lastSeen?: Date | string;
     active: boolean;
@@ -70,6 +78,7 @@ export interface ReadingData {
     sensorId: string;
     timestamp: string; // ISO timestamp
     metrics: Record<string, Record<string, number>>;
+    hubStats?: Record<string, any>;
 }
 
 
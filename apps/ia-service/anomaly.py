@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+
+# Detección de anomalías para toda la flota en una sola pasada vectorizada.
+# Cada serie (sensor, métrica) se lleva a una fila de una matriz (series x buckets)
+# alineada a la derecha en su última lectura: la última columna es "ahora".
+# Los últimos `recent` buckets se comparan contra la línea base (el resto de la ventana):
+# - z-score: (x - media) / desvío
+# - MAD: 0.6745 * (x - mediana) / MAD (robusto a picos en la línea base)
+# - tasa de cambio: z robusto de la diferencia entre buckets contra las diferencias de la base
+
+MAD_TO_SIGMA = 1.4826
+SCORE_CAP = 99.0
+
+
+def build_matrix(series, step_s, window):
+    """
+    series: lista de (ts epoch segundos, valores), ordenados.
+    Devuelve (matriz (S, window) con la media por bucket y NaN sin datos, ts del último bucket por serie).
+    Todas las series se agrupan con un único bincount.
+    """
+    n_series = len(series)
+    matrix = np.full((n_series, window), np.nan)
+    last_ts = np.full(n_series, np.nan)
+    if n_series == 0:
+        return matrix, last_ts
+
+    lengths = np.array([len(ts) for ts, _ in series])
+    ts = np.concatenate([np.asarray(t, dtype=np.float64) for t, _ in series])
+    y = np.concatenate([np.asarray(v, dtype=np.float64) for _, v in series])
+    row = np.repeat(np.arange(n_series), lengths)
+
+    ends = np.cumsum(lengths) - 1
+    last_ts = np.where(lengths > 0, ts[np.maximum(ends, 0)], np.nan)
+    col = window - 1 - np.floor((last_ts[row] - ts) / step_s).astype(np.int64)
+    keep = (col >= 0) & ~np.isnan(y)
+
+    flat = row[keep] * window + col[keep]
+    sums = np.bincount(flat, weights=y[keep], minlength=n_series * window)
+    counts = np.bincount(flat, minlength=n_series * window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        matrix = (sums / counts).reshape(n_series, window)
+    return matrix, last_ts
+
+
+def nanmedian_rows(a):
+    """
+    Mediana por fila ignorando NaN, con un solo sort: np.nanmedian cae a un bucle
+    por fila cuando hay NaN, que domina el costo con miles de series.
+    """
+    ordered = np.sort(a, axis=1)                     # los NaN quedan al final
+    valid = np.sum(~np.isnan(a), axis=1)
+    low = np.maximum((valid - 1) // 2, 0)[:, None]
+    high = np.maximum(valid // 2, 0)[:, None]
+    median = 0.5 * (np.take_along_axis(ordered, low, axis=1) + np.take_along_axis(ordered, high, axis=1))
+    return np.where(valid[:, None] > 0, median, np.nan)
+
+
+def _robust(dev, scale):
+    """dev / scale con escala nula tratada aparte: sin desvío = 0, con desvío = tope."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score = dev / scale
+    flat = ~(scale > 0)
+    score = np.where(flat, np.where(dev == 0, 0.0, np.sign(dev) * SCORE_CAP), score)
+    return np.clip(score, -SCORE_CAP, SCORE_CAP)
+
+
+def score_matrix(matrix, recent=5, min_points=10):
+    """
+    Puntajes de los últimos `recent` buckets de cada fila contra su línea base.
+    Devuelve dict de arrays (S, recent): z, mad, roc; y (S,) con los puntos válidos de la base.
+    """
+    baseline = matrix[:, :-recent]
+    current = matrix[:, -recent:]
+    valid = np.sum(~np.isnan(baseline), axis=1)
+    usable = valid >= min_points
+
+    # Filas sin datos: nanmean/nanmedian avisan "all-NaN slice" y devuelven NaN, que es lo buscado
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(baseline, axis=1, keepdims=True)
+        std = np.nanstd(baseline, axis=1, ddof=1, keepdims=True)
+        median = nanmedian_rows(baseline)
+        mad = nanmedian_rows(np.abs(baseline - median))
+
+        # Diferencias entre buckets consecutivos (con NaN donde falta alguno de los dos)
+        diffs = np.diff(matrix, axis=1)
+        base_diffs = diffs[:, :-recent]
+        diff_median = nanmedian_rows(base_diffs)
+        diff_mad = nanmedian_rows(np.abs(base_diffs - diff_median))
+        current_diffs = diffs[:, -recent:]
+
+    z = _robust(current - mean, std)
+    robust = _robust(current - median, MAD_TO_SIGMA * mad)
+    roc = _robust(current_diffs - diff_median, MAD_TO_SIGMA * diff_mad)
+
+    # Filas sin base suficiente o buckets recientes vacíos: sin puntaje
+    missing = ~usable[:, None] | np.isnan(current)
+    for arr in (z, robust, roc):
+        arr[missing] = np.nan
+    roc[np.isnan(current_diffs)] = np.nan
+
+    return {"z": z, "mad": robust, "roc": roc, "median": median[:, 0], "valid": valid}
+
+
+def rank_anomalies(scores, thresholds):
+    """
+    Combina los tres puntajes normalizados por su umbral (>= 1 = anómalo) y ordena de mayor a menor.
+    Devuelve (orden de filas, score por fila, bucket reciente del peor punto, flags por método).
+    """
+    normalized = {
+        name: np.abs(scores[name]) / thresholds[name] for name in ("z", "mad", "roc")
+    }
+    stacked = np.stack([normalized["z"], normalized["mad"], normalized["roc"]])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        per_point = np.nanmax(stacked, axis=0)              # (S, recent)
+    has_score = ~np.all(np.isnan(per_point), axis=1)
+    filled = np.where(np.isnan(per_point), -np.inf, per_point)
+    worst = np.argmax(filled, axis=1)
+    rows = np.arange(len(worst))
+    score = np.where(has_score, filled[rows, worst], np.nan)
+
+    flags = {name: normalized[name][rows, worst] >= 1 for name in normalized}
+    order = np.argsort(np.where(has_score, -score, np.inf), kind="stable")
+    order = order[has_score[order]]
+    return order, score, worst, flags
@@ -0,0 +1,257 @@
+"""
+Benchmark reproducible de las rutas de análisis del ia-service.
+
+Uso (desde apps/ia-service):
+    python -m bench.run
+    python -m bench.run --points 1000,50000 --metrics 3,6 --sensors 1,20 --repeat 5
+    python -m bench.run --save-baseline            # reescribe bench/baseline.json
+    python -m bench.run --compare --tolerance 0.25 # contra bench/baseline.json
+    python -m bench.run --compare otro.json
+
+bench/baseline.json es el baseline versionado, medido con los argumentos por defecto:
+compararlo solo tiene sentido en una máquina parecida (ver "environment" en el JSON).
+Ojo: el actual se midió fuera del contenedor (Python 3.11, pandas 3.0) y la imagen usa
+python:3.9-slim; para comparar contra producción, regrabarlo dentro de la imagen con
+--save-baseline. --compare avisa si el entorno no coincide.
+Mide la mediana de cada etapa (validación, aplanado, estrategias, downsampling,
+serialización, end-to-end) y el pico de memoria del end-to-end. Con --compare
+sale con código 1 si alguna etapa empeora más que la tolerancia.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import main
+from lowmem import ijson, iter_sensors
+from bench.synthetic import (
+    generate_series_set, to_rows_payload, to_columnar_payload, metric_frame
+)
+
+# Diferencias menores a esto son ruido del reloj, no regresiones
+NOISE_FLOOR_S = 0.001
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        main.model_cache.clear()
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return {"median": statistics.median(samples), "min": min(samples), "runs": repeat}, result
+
+
+def peak_memory(fn):
+    main.model_cache.clear()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_scenario(sensors, metrics, points, args):
+    series_set = generate_series_set(
+        sensors=sensors, metrics=metrics, points=points, step_s=args.step,
+        gap_fraction=args.gaps, noise=args.noise, trend_per_hour=args.trend,
+        daily_amplitude=args.seasonality, seed=args.seed,
+    )
+    rows = to_rows_payload(series_set, metrics)
+    columnar = to_columnar_payload(series_set, metrics)
+    options = dict(main.DEFAULT_OPTIONS)
+    stages = {}
+
+    stages["validate"], machines = timed(lambda: [main.MachineData(**item) for item in rows], args.repeat)
+    stages["flatten_rows"], frames = timed(lambda: [main.frame_from_readings(m.readings) for m in machines], args.repeat)
+    stages["flatten_columnar"], _ = timed(
+        lambda: [main.frame_from_columns(item["timestamps"], item["columns"]) for item in columnar], args.repeat
+    )
+    if ijson is not None:
+        body = json.dumps(rows).encode()
+        stages["lowmem_parse"], _ = timed(
+            lambda: [main.frame_from_arrays(ts, cols) for _, ts, cols in iter_sensors(io.BytesIO(body), main.parse_timestamps)],
+            args.repeat,
+        )
+    stages["plan"], plan = timed(lambda: main.plan_rows(machines, options), args.repeat)
+    anomaly_options = {
+        "step": main.ANOMALY_STEP_S, "window": main.ANOMALY_WINDOW, "recent": main.ANOMALY_RECENT,
+        "limit": main.ANOMALY_LIMIT, "all": False, "timings": False,
+    }
+    stages["anomaly_score"], _ = timed(
+        lambda: main.score_fleet(main.payload_sources(machines), anomaly_options), args.repeat
+    )
+
+    # Estrategias sobre una métrica representativa
+    ds, columns = next(iter(series_set.values()))
+    df = metric_frame(ds, next(iter(columns.values())))
+    anchor = main.get_smart_anchor(df)
+    stages["strategy_linear"], _ = timed(lambda: main.analyze_linear_high_res(df, 0, 100, anchor), args.repeat)
+    stages["strategy_holt_winters"], _ = timed(
+        lambda: main.holt_winters_strategy(df, 0, 100, anchor, {"meta": {"timings": {}}, "over_budget": False}), args.repeat
+    )
+    if not args.skip_prophet:
+        stages["strategy_prophet"], _ = timed(
+            lambda: main.analyze_prophet_high_res(df, 0, 100, df["y"].max(), anchor), args.repeat
+        )
+        fast = {**options, "fast": True}
+        stages["strategy_prophet_fast"], _ = timed(
+            lambda: main.analyze_prophet_high_res(df, 0, 100, df["y"].max(), anchor, options=fast), args.repeat
+        )
+
+    for method in ("uniform", "lttb", "minmax"):
+        stages[f"downsample_{method}"], _ = timed(
+            lambda: main.downsample_history(df, options["points"], method), args.repeat
+        )
+
+    result = main.run_planned(*main.plan_rows(machines, options))
+    stages["encode_json"], _ = timed(lambda: main.encode_result(result, "application/json"), args.repeat)
+    stages["encode_columnar"], _ = timed(
+        lambda: main.encode_result(result, "application/vnd.ingenio.columnar+json"), args.repeat
+    )
+
+    def end_to_end():
+        payload = [main.MachineData(**item) for item in rows]
+        return main.encode_result(main.run_planned(*main.plan_rows(payload, options)), None)
+
+    stages["end_to_end"], response = timed(end_to_end, args.repeat)
+
+    return {
+        "scenario": f"s{sensors}-m{metrics}-p{points}",
+        "sensors": sensors,
+        "metrics": metrics,
+        "points": points,
+        "stages": stages,
+        "peakMemoryBytes": peak_memory(end_to_end),
+        "responseBytes": len(response.body),
+    }
+
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": main.os.cpu_count(),
+        "analyzeWorkers": main.get_worker_count(),
+    }
+
+
+def flatten_medians(results):
+    return {
+        f"{r['scenario']}/{stage}": values["median"]
+        for r in results
+        for stage, values in r["stages"].items()
+    }
+
+
+COMPARED_ENVIRONMENT = ("python", "numpy", "pandas", "machine", "cpus", "analyzeWorkers")
+
+
+def environment_mismatch(baseline):
+    """Campos del entorno que difieren del baseline: [(campo, baseline, actual)]."""
+    current = environment()
+    recorded = baseline.get("environment", {})
+    return [(key, recorded.get(key), current[key]) for key in COMPARED_ENVIRONMENT if recorded.get(key) != current[key]]
+
+
+def compare(results, baseline, tolerance):
+    """Devuelve las etapas que empeoraron más que la tolerancia respecto del baseline."""
+    current = flatten_medians(results)
+    previous = flatten_medians(baseline["results"])
+    regressions = []
+    for key, value in current.items():
+        base = previous.get(key)
+        if base is None: continue
+        if value > base * (1 + tolerance) and value - base > NOISE_FLOOR_S:
+            regressions.append((key, base, value))
+    return regressions
+
+
+def print_table(results):
+    for r in results:
+        print(f"\n▶ {r['scenario']}  (pico memoria {r['peakMemoryBytes'] / 1e6:.1f} MB, respuesta {r['responseBytes'] / 1e6:.2f} MB)")
+        for stage, values in r["stages"].items():
+            print(f"  {stage:<22} {values['median'] * 1000:10.2f} ms   (min {values['min'] * 1000:.2f} ms)")
+
+
+def int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ia-service")
+    parser.add_argument("--sensors", type=int_list, default=[1, 10])
+    parser.add_argument("--metrics", type=int_list, default=[3])
+    parser.add_argument("--points", type=int_list, default=[1000, 10000])
+    parser.add_argument("--step", type=float, default=2.0, help="Segundos entre lecturas")
+    parser.add_argument("--trend", type=float, default=0.05, help="Tendencia por hora")
+    parser.add_argument("--noise", type=float, default=0.5, help="Desvío del ruido gaussiano")
+    parser.add_argument("--seasonality", type=float, default=2.0, help="Amplitud de la estacionalidad diaria")
+    parser.add_argument("--gaps", type=float, default=0.0, help="Fracción de lecturas perdidas en bloques")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-prophet", action="store_true")
+    parser.add_argument("--output", help="Guardar resultados en JSON")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="Guardar estos resultados como baseline (por defecto bench/baseline.json)")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE,
+                        help="Baseline JSON contra el cual comparar (por defecto bench/baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo permitido")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    results = [
+        run_scenario(sensors, metrics, points, args)
+        for sensors in args.sensors
+        for metrics in args.metrics
+        for points in args.points
+    ]
+    print_table(results)
+
+    # Solo los argumentos que definen los escenarios (no las rutas de esta corrida)
+    scenario_args = {k: v for k, v in vars(args).items() if k not in ("output", "save_baseline", "compare")}
+    report = {"environment": environment(), "args": scenario_args, "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Resultados guardados en {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        mismatch = environment_mismatch(baseline)
+        if mismatch:
+            print("\n⚠️ El baseline se midió en otro entorno; los tiempos no son comparables uno a uno:")
+            for key, recorded, current in mismatch:
+                print(f"  {key}: {recorded} -> {current}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} etapas empeoraron más de {args.tolerance:.0%}:")
+            for key, base, value in regressions:
+                print(f"  {key}: {base * 1000:.2f} ms -> {value * 1000:.2f} ms")
+            return 1
+        print("\n✅ Sin regresiones respecto del baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
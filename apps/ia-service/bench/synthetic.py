@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Generador de payloads sintéticos para /analyze.
+# Cada serie = base + tendencia + estacionalidad diaria + ruido, con huecos opcionales.
+
+DEFAULT_START = "2025-01-01T00:00:00"
+
+
+def synthetic_series(points, step_s=2.0, base=50.0, trend_per_hour=0.05,
+                     daily_amplitude=2.0, noise=0.5, rng=None, start=DEFAULT_START):
+    """Devuelve (timestamps datetime64[ns], valores float64) ya ordenados."""
+    rng = rng or np.random.default_rng(0)
+    t = np.arange(points, dtype=np.float64) * step_s
+    values = (
+        base
+        + trend_per_hour * t / 3600
+        + daily_amplitude * np.sin(2 * np.pi * t / 86400)
+        + rng.normal(0.0, noise, points)
+    )
+    ds = np.datetime64(start, "ns") + (t * 1e9).astype("timedelta64[ns]")
+    return ds, values
+
+
+def gap_mask(points, gap_fraction, rng, block=50):
+    """Huecos en bloques (cortes de red), no puntos sueltos. True = lectura presente."""
+    keep = np.ones(points, dtype=bool)
+    if gap_fraction <= 0:
+        return keep
+    n_gaps = max(1, int(points * gap_fraction / block))
+    for start_idx in rng.integers(0, points, n_gaps):
+        keep[start_idx:start_idx + block] = False
+    keep[0] = keep[-1] = True
+    return keep
+
+
+def metric_names(metrics):
+    return [f"m{i}" for i in range(metrics)]
+
+
+def generate_series_set(sensors=1, metrics=3, points=1000, step_s=2.0, gap_fraction=0.0, seed=0, **kwargs):
+    """{sensorId: (ds, {"synthetic__mX": valores})}: una línea de tiempo común por sensor."""
+    rng = np.random.default_rng(seed)
+    out = {}
+    for s in range(sensors):
+        keep = gap_mask(points, gap_fraction, rng)
+        columns = {}
+        ds = None
+        for name in metric_names(metrics):
+            ds, values = synthetic_series(
+                points, step_s=step_s, base=rng.uniform(10, 90), rng=rng, **kwargs
+            )
+            columns[f"synthetic__{name}"] = values[keep]
+        out[f"bench-{s:04d}"] = (ds[keep], columns)
+    return out
+
+
+def metrics_config(metrics, min_val=0.0, max_val=100.0):
+    return {"synthetic": {name: {"min": min_val, "max": max_val} for name in metric_names(metrics)}}
+
+
+def to_rows_payload(series_set, metrics):
+    """Formato clásico de MachineData (una lectura por timestamp)."""
+    payload = []
+    for sensor_id, (ds, columns) in series_set.items():
+        iso = np.datetime_as_string(ds.astype("datetime64[ms]"), unit="ms")
+        names = [key.split("__", 1)[1] for key in columns]
+        matrix = np.column_stack([columns[key] for key in columns])
+        readings = [
+            {"timestamp": ts + "Z", "metrics": {"synthetic": dict(zip(names, row))}}
+            for ts, row in zip(iso.tolist(), matrix.tolist())
+        ]
+        payload.append({
+            "config": {"sensorId": sensor_id, "metricsConfig": metrics_config(metrics)},
+            "readings": readings,
+        })
+    return payload
+
+
+def to_columnar_payload(series_set, metrics):
+    """Formato columnar de /analyze/columnar (timestamps en epoch ms)."""
+    payload = []
+    for sensor_id, (ds, columns) in series_set.items():
+        payload.append({
+            "config": {"sensorId": sensor_id, "metricsConfig": metrics_config(metrics)},
+            "timestamps": ds.astype("datetime64[ms]").astype(np.int64).tolist(),
+            "columns": {key: values.tolist() for key, values in columns.items()},
+        })
+    return payload
+
+
+def metric_frame(ds, values):
+    """DataFrame (ds, y) como el que recibe `analyze_metric_ultimate`."""
+    return pd.DataFrame({"ds": ds, "y": values})
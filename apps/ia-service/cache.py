@@ -0,0 +1,151 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Caché en memoria con expulsión LRU por tamaño y por edad.
+    Es segura entre hilos (FastAPI ejecuta los endpoints `def` en un threadpool)
+    y lleva contadores de aciertos/fallos para poder reportarlos.
+    Con `max_bytes` y `sizeof(value)` también limita el tamaño total estimado.
+    """
+
+    def __init__(self, max_size=256, max_age_s=3600, max_bytes=None, sizeof=None):
+        self.max_size = max_size
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if max_bytes is not None else None
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, stored_at, now):
+        return self.max_age_s is not None and now - stored_at > self.max_age_s
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self._expired(stored_at, now):
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= self._sizes.pop(key, 0)
+        return entry
+
+    def put(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (now, value)
+            if self.sizeof is not None:
+                self._sizes[key] = self.sizeof(value)
+                self._bytes += self._sizes[key]
+
+            # Primero lo caducado, luego lo menos usado recientemente
+            for k in [k for k, (t, _) in self._data.items() if self._expired(t, now)]:
+                self._remove(k)
+                self.evictions += 1
+            while len(self._data) > self.max_size or (
+                self.sizeof is not None and self._bytes > self.max_bytes and len(self._data) > 1
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._remove(key) if key in self._data else None
+            return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxSize": self.max_size,
+                "maxAgeSeconds": self.max_age_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / total, 3) if total else 0.0,
+            }
+            if self.sizeof is not None:
+                stats["bytes"] = self._bytes
+                stats["maxBytes"] = self.max_bytes
+            return stats
+
+
+class Flight:
+    __slots__ = ("done", "value")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class SingleFlight:
+    """
+    Deduplicación de cómputos concurrentes idénticos: el primero que reclama una clave
+    la calcula ("líder") y el resto espera su resultado en vez de repetir el trabajo.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """Devuelve (flight, es_lider)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def publish(self, key, flight, value):
+        """Entrega el resultado a quienes esperan. `None` = el líder falló. Vale la primera publicación."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.done.is_set():
+                return
+            flight.value = value
+            flight.done.set()
+
+    @staticmethod
+    def wait(flight, timeout=None):
+        """Resultado del líder, o None si falló o no terminó a tiempo."""
+        if not flight.done.wait(timeout):
+            return None
+        return flight.value
+
+    def __len__(self):
+        return len(self._flights)
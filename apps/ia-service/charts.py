@@ -0,0 +1,62 @@
+import numpy as np
+
+# Series de chartData.
+# Internamente cada métrica guarda su gráfico como arrays NumPy (historia + futuro);
+# el formato final (filas con claves repetidas o columnas) se decide al responder.
+
+
+def iso_timestamps(ds):
+    """datetime64 -> ISO 8601 sin zona, con microsegundos solo si hacen falta."""
+    us = np.asarray(ds, dtype="datetime64[us]")
+    if (us.astype(np.int64) % 1_000_000 == 0).all():
+        return np.datetime_as_string(us, unit="s")
+    return np.datetime_as_string(us, unit="us")
+
+
+def chart_series(past_ds, past_y, forecast):
+    """Une historia (sin incertidumbre) y pronóstico en una sola serie columnar."""
+    past_values = np.round(np.asarray(past_y, dtype=np.float64), 2)
+    n_past, n_future = len(past_values), len(forecast["value"])
+    return {
+        "ds": np.concatenate((np.asarray(past_ds, dtype="datetime64[ns]"), np.asarray(forecast["ds"], dtype="datetime64[ns]"))),
+        "value": np.concatenate((past_values, forecast["value"])),
+        # En el pasado no hay duda: low = high = value
+        "low": np.concatenate((past_values, forecast["low"])),
+        "high": np.concatenate((past_values, forecast["high"])),
+        "isFuture": np.concatenate((np.zeros(n_past, dtype=bool), np.ones(n_future, dtype=bool))),
+    }
+
+
+def forecast_series(forecast):
+    return chart_series(np.array([], dtype="datetime64[ns]"), np.array([]), forecast)
+
+
+def series_to_rows(series):
+    """Formato clásico: una lista de puntos {timestamp, value, confidenceLow, confidenceHigh, isFuture}."""
+    return [
+        {
+            "timestamp": ts,
+            "value": v,
+            "confidenceLow": lo,
+            "confidenceHigh": hi,
+            "isFuture": future
+        }
+        for ts, v, lo, hi, future in zip(
+            iso_timestamps(series["ds"]).tolist(),
+            series["value"].tolist(),
+            series["low"].tolist(),
+            series["high"].tolist(),
+            series["isFuture"].tolist(),
+        )
+    ]
+
+
+def series_to_columns(series):
+    """Formato columnar: un array por campo y timestamps en epoch ms."""
+    return {
+        "timestamp": series["ds"].astype("datetime64[ms]").astype(np.int64).tolist(),
+        "value": series["value"].tolist(),
+        "confidenceLow": series["low"].tolist(),
+        "confidenceHigh": series["high"].tolist(),
+        "isFuture": series["isFuture"].tolist(),
+    }
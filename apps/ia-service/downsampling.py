@@ -0,0 +1,99 @@
+import numpy as np
+
+# Reducción de puntos para la historia del gráfico.
+# Todas las funciones devuelven índices ordenados sobre los arrays originales,
+# así el llamador toma solo los puntos elegidos sin copiar el DataFrame.
+
+
+def uniform_indices(x, y, target):
+    """Índices espaciados equitativamente (comportamiento histórico: puede perder picos)."""
+    n = len(y)
+    if n <= target:
+        return np.arange(n)
+    return np.linspace(0, n - 1, target).astype(int)
+
+
+def lttb_indices(x, y, target):
+    """
+    Largest-Triangle-Three-Buckets: en cada bucket elige el punto que forma el
+    triángulo de mayor área con el punto elegido antes y el promedio del bucket
+    siguiente. Conserva la forma visual (y los picos) con pocos puntos.
+    El trabajo dentro de cada bucket es vectorizado; solo se itera por bucket.
+    """
+    n = len(y)
+    if n <= target or target < 3:
+        return uniform_indices(x, y, target)
+
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x[0]
+    y = np.asarray(y, dtype=np.float64)
+
+    # target-2 buckets para los puntos intermedios; el primero y el último se conservan
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Promedio de cada bucket con sumas acumuladas (sin recorrer los puntos)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    avg_x = (cx[ends] - cx[starts]) / sizes
+    avg_y = (cy[ends] - cy[starts]) / sizes
+
+    # Para cada bucket, el "siguiente" promedio; el último apunta al punto final
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(target, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(target - 2):
+        lo, hi = starts[i], ends[i]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _first_index_per_bucket(mask, bucket_id):
+    pos = np.flatnonzero(mask)
+    _, first = np.unique(bucket_id[pos], return_index=True)
+    return pos[first]
+
+
+def minmax_indices(x, y, target):
+    """
+    Mínimo y máximo de cada bucket ((target-2)/2 buckets, más los extremos de la serie),
+    totalmente vectorizado. Garantiza que toda excursión aparezca en el gráfico.
+    """
+    n = len(y)
+    if n <= target:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    buckets = max(1, (target - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    starts = edges[:-1]
+
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    bucket_id = np.repeat(np.arange(buckets), np.diff(edges))
+
+    idx_min = _first_index_per_bucket(y == mins[bucket_id], bucket_id)
+    idx_max = _first_index_per_bucket(y == maxs[bucket_id], bucket_id)
+    return np.unique(np.concatenate((idx_min, idx_max, [0, n - 1])))
+
+
+DOWNSAMPLERS = {
+    "uniform": uniform_indices,
+    "lttb": lttb_indices,
+    "minmax": minmax_indices,
+}
+
+
+def downsample_indices(method, x, y, target):
+    try:
+        fn = DOWNSAMPLERS[method]
+    except KeyError:
+        raise ValueError(f"Método de downsampling desconocido: {method}")
+    return fn(x, y, target)
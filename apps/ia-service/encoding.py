@@ -0,0 +1,101 @@
+import json
+import numpy as np
+from fastapi.responses import Response
+
+from charts import series_to_rows, series_to_columns
+
+# Serializadores opcionales: si no están instalados se usa json estándar
+# y el formato binario responde 406.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.ingenio.columnar+json"
+MSGPACK = "application/msgpack"
+
+_ACCEPT_ALIASES = {
+    JSON: JSON,
+    "application/*": JSON,
+    "*/*": JSON,
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+class NotAcceptable(Exception):
+    pass
+
+
+def _to_builtin(obj):
+    """Escalares y arrays NumPy -> tipos nativos (para json/msgpack)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_to_builtin, separators=(",", ":")).encode()
+
+
+def negotiate(accept):
+    """Elige el formato según el header Accept (respetando q=). Sin header: JSON por filas."""
+    if not accept:
+        return JSON
+
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        fields = [f.strip() for f in part.split(";")]
+        media = fields[0].lower()
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media in _ACCEPT_ALIASES and q > 0:
+            candidates.append((-q, position, _ACCEPT_ALIASES[media]))
+
+    for _, _, fmt in sorted(candidates):
+        if fmt == MSGPACK and msgpack is None:
+            continue
+        return fmt
+    raise NotAcceptable(accept)
+
+
+def render_report(sensor_report, layout):
+    """Copia del reporte con cada serie de chartData convertida al layout pedido."""
+    convert = series_to_columns if layout != JSON else series_to_rows
+    return {
+        **sensor_report,
+        "chartData": {
+            category: [{"metric": c["metric"], "data": convert(c["data"])} for c in charts]
+            for category, charts in sensor_report["chartData"].items()
+        },
+    }
+
+
+def render_result(result, layout):
+    return {**result, "report": [render_report(r, layout) for r in result["report"]]}
+
+
+def encode_result(result, accept):
+    """Respuesta final de un análisis según el Accept del cliente."""
+    fmt = negotiate(accept)
+    body = render_result(result, fmt)
+    if fmt == MSGPACK:
+        return Response(msgpack.packb(body, default=_to_builtin, use_bin_type=True), media_type=MSGPACK)
+    return Response(dumps_json(body), media_type=fmt)
@@ -0,0 +1,17 @@
+import os
+
+# Modo multi-worker con precarga: el proceso maestro importa main.py (y hace el warm-up,
+# ver IA_PRELOAD) una sola vez; los workers se crean con fork y comparten esas páginas.
+#   gunicorn -c gunicorn.conf.py main:app
+# Ojo: cachés, historia (/history), streaming (/stream) y trabajos (/jobs) son por worker.
+# Con más de un worker esos endpoints necesitan afinidad de sesión o un solo worker.
+
+os.environ.setdefault("IA_PRELOAD", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_WORKERS", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WEB_TIMEOUT_S", "300"))
+graceful_timeout = 30
+keepalive = 5
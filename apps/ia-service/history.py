@@ -0,0 +1,317 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Historia rodante por sensor, para que el cliente envíe solo las lecturas nuevas.
+# Cada sensor guarda un vector de timestamps (epoch ms, int64) y una columna float por
+# `categoria__metrica`, siempre ordenados y sin timestamps repetidos.
+# La ventana viva ocupa [lo, hi) de arrays preasignados: agregar al final es O(k) y
+# cuando se llega al final del buffer se compacta o se crece (costo amortizado O(1) por lectura).
+
+INITIAL_CAPACITY = 1024
+
+
+class SensorHistory:
+    def __init__(self, dtype=np.float32, spill_path=None):
+        self.dtype = np.dtype(dtype)
+        self.spill_path = spill_path
+        self.capacity = 0
+        self.lo = 0
+        self.hi = 0
+        self.ts = np.empty(0, dtype=np.int64)
+        self.columns = {}  # col_key -> array float
+        self.config = None
+
+    # --- Memoria ---
+
+    def _alloc(self, name, dtype, capacity):
+        if self.spill_path is None:
+            return np.empty(capacity, dtype=dtype)
+        path = os.path.join(self.spill_path, f"{name}.bin")
+        return np.memmap(path + ".tmp", dtype=dtype, mode="w+", shape=(capacity,))
+
+    def _commit(self, name, array):
+        # El memmap nuevo reemplaza al anterior en disco (el viejo sigue mapeado hasta liberarse)
+        if isinstance(array, np.memmap):
+            path = os.path.join(self.spill_path, f"{name}.bin")
+            os.replace(path + ".tmp", path)
+        return array
+
+    def _column_names(self):
+        return {col_key: f"c{hashlib.blake2b(col_key.encode(), digest_size=8).hexdigest()}" for col_key in self.columns}
+
+    def _reallocate(self, capacity):
+        """Copia la ventana viva al inicio de arrays nuevos de `capacity` posiciones."""
+        size = self.hi - self.lo
+        names = self._column_names()
+        ts = self._alloc("ts", np.int64, capacity)
+        ts[:size] = self.ts[self.lo:self.hi]
+        self.ts = self._commit("ts", ts)
+        for col_key, values in self.columns.items():
+            new = self._alloc(names[col_key], self.dtype, capacity)
+            new[:size] = values[self.lo:self.hi]
+            self.columns[col_key] = self._commit(names[col_key], new)
+        self.capacity, self.lo, self.hi = capacity, 0, size
+
+    def _reserve(self, extra, max_points):
+        """
+        Garantiza lugar para `extra` lecturas al final. Solo se compacta si la ventana ocupa
+        a lo sumo la mitad del buffer; si no, se crece. Como la ventana no pasa de `max_points`,
+        la capacidad se estabiliza en ~2 x `max_points`: cada compactación (O(max_points))
+        se paga con al menos `max_points` lecturas agregadas desde la anterior.
+        """
+        if self.hi + extra <= self.capacity:
+            return
+        needed = self.size + extra
+        if needed <= self.capacity // 2:
+            self._reallocate(self.capacity)  # alcanza con compactar
+            return
+        self._reallocate(max(INITIAL_CAPACITY, min(2 * self.capacity, 2 * max_points), 2 * needed))
+
+    def _ensure_column(self, col_key):
+        if col_key in self.columns:
+            return
+        name = f"c{hashlib.blake2b(col_key.encode(), digest_size=8).hexdigest()}"
+        values = self._alloc(name, self.dtype, self.capacity)
+        values[:] = np.nan
+        self.columns[col_key] = self._commit(name, values)
+
+    def spill(self, spill_path):
+        """Pasa los arrays a archivos mapeados en disco (no cuentan para el tope de memoria)."""
+        os.makedirs(spill_path, exist_ok=True)
+        self.spill_path = spill_path
+        self._reallocate(max(self.capacity, INITIAL_CAPACITY))
+
+    @property
+    def spilled(self):
+        return self.spill_path is not None
+
+    @property
+    def size(self):
+        return self.hi - self.lo
+
+    @property
+    def nbytes(self):
+        return self.capacity * (8 + self.dtype.itemsize * len(self.columns))
+
+    # --- Escritura ---
+
+    def append(self, ts, columns, retention_ms, max_points):
+        """
+        Agrega lecturas (ts epoch ms, {col_key: valores}) y devuelve (nuevas, duplicadas).
+        - Timestamps ya presentes: se actualizan solo los valores no nulos (la última lectura gana).
+        - Lecturas atrasadas: se intercalan en orden (camino lento, poco frecuente).
+        """
+        if len(ts) == 0:
+            return 0, 0
+
+        # Lote ordenado y sin repetidos (ante repetidos dentro del lote gana el último)
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        columns = {k: np.asarray(v, dtype=np.float64)[order] for k, v in columns.items()}
+        last_of_run = np.append(ts[1:] != ts[:-1], True)
+        batch_duplicates = int((~last_of_run).sum())
+        ts = ts[last_of_run]
+        columns = {k: v[last_of_run] for k, v in columns.items()}
+
+        for col_key in columns:
+            self._ensure_column(col_key)
+
+        live_ts = self.ts[self.lo:self.hi]
+        if self.size and ts[0] <= live_ts[-1]:
+            # Coincidencias exactas con la historia: actualizar en el lugar
+            pos = np.searchsorted(live_ts, ts)
+            found = pos < len(live_ts)
+            found[found] = live_ts[pos[found]] == ts[found]
+            if found.any():
+                target = self.lo + pos[found]
+                for col_key, values in columns.items():
+                    incoming = values[found]
+                    valid = ~np.isnan(incoming)
+                    self.columns[col_key][target[valid]] = incoming[valid]
+            duplicates = int(found.sum())
+            new = ~found
+            ts = ts[new]
+            columns = {k: v[new] for k, v in columns.items()}
+            if len(ts) and ts[0] <= live_ts[-1]:
+                added = self._merge(ts, columns, max_points)
+                self._apply_limits(retention_ms, max_points)
+                return added, duplicates + batch_duplicates
+        else:
+            duplicates = 0
+
+        added = len(ts)
+        if added:
+            self._reserve(added, max_points)
+            self.ts[self.hi:self.hi + added] = ts
+            for col_key, values in self.columns.items():
+                incoming = columns.get(col_key)
+                values[self.hi:self.hi + added] = np.nan if incoming is None else incoming
+            self.hi += added
+        self._apply_limits(retention_ms, max_points)
+        return added, duplicates + batch_duplicates
+
+    def _merge(self, ts, columns, max_points):
+        """Intercala lecturas atrasadas reescribiendo la ventana completa."""
+        merged_ts = np.concatenate((self.ts[self.lo:self.hi], ts))
+        order = np.argsort(merged_ts, kind="stable")
+        merged = {}
+        for col_key, values in self.columns.items():
+            incoming = columns.get(col_key)
+            if incoming is None:
+                incoming = np.full(len(ts), np.nan)
+            merged[col_key] = np.concatenate((values[self.lo:self.hi].astype(np.float64), incoming))[order]
+
+        self.lo = self.hi = 0
+        self._reserve(len(merged_ts), max_points)
+        n = len(merged_ts)
+        self.ts[:n] = merged_ts[order]
+        for col_key, values in merged.items():
+            self.columns[col_key][:n] = values
+        self.hi = n
+        return len(ts)
+
+    def _apply_limits(self, retention_ms, max_points):
+        """Retención por antigüedad (respecto de la lectura más nueva) y por cantidad de puntos."""
+        if self.size == 0:
+            return
+        if retention_ms:
+            cutoff = self.ts[self.hi - 1] - retention_ms
+            self.lo += int(np.searchsorted(self.ts[self.lo:self.hi], cutoff, side="left"))
+        if self.size > max_points:
+            self.lo = self.hi - max_points
+
+    # --- Lectura ---
+
+    def frame(self):
+        """DataFrame (ds + columnas float64), ya ordenado: listo para `plan_sensor`."""
+        data = {"ds": self.ts[self.lo:self.hi].astype("datetime64[ms]").astype("datetime64[ns]")}
+        for col_key, values in self.columns.items():
+            data[col_key] = np.asarray(values[self.lo:self.hi], dtype=np.float64)
+        return pd.DataFrame(data, copy=False)
+
+    def tail(self, window_ms):
+        """(ts epoch ms, {col_key: float64}) de las lecturas de los últimos `window_ms` (copias)."""
+        if self.size == 0:
+            return self.ts[:0].copy(), {}
+        live_ts = self.ts[self.lo:self.hi]
+        start = self.lo + int(np.searchsorted(live_ts, live_ts[-1] - window_ms, side="left"))
+        ts = np.array(self.ts[start:self.hi])
+        return ts, {col_key: np.asarray(values[start:self.hi], dtype=np.float64) for col_key, values in self.columns.items()}
+
+    def info(self):
+        info = {
+            "points": self.size,
+            "metrics": sorted(self.columns),
+            "bytes": self.nbytes,
+            "spilled": self.spilled,
+        }
+        if self.size:
+            info["first"] = str(self.ts[self.lo].astype("datetime64[ms]"))
+            info["last"] = str(self.ts[self.hi - 1].astype("datetime64[ms]"))
+        return info
+
+
+class HistoryStore:
+    """
+    Historias por sensor con tope global de memoria.
+    Al superar `max_bytes` se desalojan los sensores menos usados: con `spill_dir` pasan a
+    disco (memmap) y siguen disponibles; sin él se descartan y el cliente debe reenviar todo.
+    Es memoria del proceso: con varios workers cada uno tiene su propia historia.
+    """
+
+    def __init__(self, retention_s=7 * 86400, max_points=500_000, max_bytes=512 * 2**20,
+                 spill_dir=None, dtype=np.float32):
+        self.retention_ms = int(retention_s * 1000) if retention_s else 0
+        self.max_points = max_points
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or None
+        self.dtype = dtype
+        self._sensors = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.spills = 0
+
+    def _spill_path(self, sensor_id):
+        return os.path.join(self.spill_dir, hashlib.blake2b(sensor_id.encode(), digest_size=16).hexdigest())
+
+    def append(self, sensor_id, ts, columns, metrics_config=None):
+        """Agrega un lote de lecturas. Devuelve (nuevas, duplicadas, puntos en historia)."""
+        with self._lock:
+            history = self._sensors.get(sensor_id)
+            if history is None:
+                history = self._sensors[sensor_id] = SensorHistory(self.dtype)
+            self._sensors.move_to_end(sensor_id)
+            if metrics_config is not None:
+                history.config = metrics_config
+            added, duplicates = history.append(ts, columns, self.retention_ms, self.max_points)
+            size = history.size
+            self._enforce_memory(keep=sensor_id)
+        return added, duplicates, size
+
+    def _enforce_memory(self, keep):
+        resident = sum(h.nbytes for h in self._sensors.values() if not h.spilled)
+        for sensor_id in list(self._sensors):
+            if resident <= self.max_bytes:
+                break
+            history = self._sensors[sensor_id]
+            if sensor_id == keep or history.spilled:
+                continue
+            resident -= history.nbytes
+            if self.spill_dir:
+                history.spill(self._spill_path(sensor_id))
+                self.spills += 1
+            else:
+                del self._sensors[sensor_id]
+                self.evictions += 1
+
+    def frame(self, sensor_id):
+        """(metricsConfig, DataFrame) del sensor, o None si no hay historia."""
+        with self._lock:
+            history = self._sensors.get(sensor_id)
+            if history is None or history.size == 0:
+                return None
+            self._sensors.move_to_end(sensor_id)
+            return history.config, history.frame()
+
+    def tails(self, window_ms):
+        """[(sensorId, metricsConfig, ts, columns)] con la cola reciente de cada sensor (ver `SensorHistory.tail`)."""
+        with self._lock:
+            return [
+                (sensor_id, history.config, *history.tail(window_ms))
+                for sensor_id, history in self._sensors.items() if history.size
+            ]
+
+    def info(self, sensor_id):
+        with self._lock:
+            history = self._sensors.get(sensor_id)
+            return None if history is None else history.info()
+
+    def reset(self, sensor_id):
+        with self._lock:
+            history = self._sensors.pop(sensor_id, None)
+        if history is None:
+            return False
+        if history.spilled:
+            shutil.rmtree(history.spill_path, ignore_errors=True)
+        return True
+
+    def stats(self):
+        with self._lock:
+            histories = list(self._sensors.values())
+            return {
+                "sensors": len(histories),
+                "points": sum(h.size for h in histories),
+                "residentBytes": sum(h.nbytes for h in histories if not h.spilled),
+                "spilledSensors": sum(1 for h in histories if h.spilled),
+                "maxBytes": self.max_bytes,
+                "maxPoints": self.max_points,
+                "retentionSeconds": self.retention_ms / 1000,
+                "evictions": self.evictions,
+                "spills": self.spills,
+            }
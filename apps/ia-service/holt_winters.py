@@ -0,0 +1,171 @@
+import numpy as np
+
+from linear_engine import FORECAST_STEPS, STEP_SECONDS, STEP_OFFSETS_S
+
+# Holt-Winters aditivo con tendencia amortiguada y estacionalidad diaria, solo NumPy.
+# La historia se lleva a una grilla regular de 10 minutos (la misma resolución del pronóstico),
+# así el costo depende de los días de historia y no de la frecuencia del sensor.
+# Los parámetros se eligen por búsqueda en grilla minimizando el error a un paso más el
+# error a SCORE_HORIZON pasos (el de un paso solo no distingue bien la amortiguación);
+# todas las combinaciones avanzan juntas en un solo recorrido vectorizado.
+
+SEASON_SECONDS = 86400
+SEASON_STEPS = SEASON_SECONDS // STEP_SECONDS
+MAX_SEASONS = 14
+SCORE_HORIZON = 36  # 6 horas
+WARMUP_STEPS = 12
+
+ALPHAS = (0.05, 0.1, 0.2, 0.4, 0.7)
+BETAS = (0.0, 0.01, 0.05, 0.15)
+GAMMAS = (0.05, 0.15, 0.3)
+PHIS = (0.95, 0.98, 1.0)
+
+
+def regular_grid(ts, y, step=STEP_SECONDS):
+    """
+    Promedia las lecturas en buckets de `step` segundos alineados al reloj
+    y rellena los buckets vacíos interpolando. Devuelve (inicio de la grilla, valores).
+    """
+    start = np.floor(ts[0] / step) * step
+    bucket = ((ts - start) // step).astype(np.int64)
+    n = int(bucket[-1]) + 1
+    sums = np.bincount(bucket, weights=y, minlength=n)
+    counts = np.bincount(bucket, minlength=n)
+    filled = counts > 0
+    grid = np.empty(n)
+    grid[filled] = sums[filled] / counts[filled]
+    if not filled.all():
+        idx = np.arange(n)
+        grid[~filled] = np.interp(idx[~filled], idx[filled], grid[filled])
+    return start, grid
+
+
+def season_slots(t):
+    """Posición dentro del día (0..SEASON_STEPS-1) de cada instante epoch."""
+    return ((np.asarray(t) % SEASON_SECONDS) // STEP_SECONDS).astype(np.int64)
+
+
+def _initial_state(grid, grid_t, seasonal):
+    """
+    Estado inicial por mínimos cuadrados: recta + armónicos diarios (dos si hay
+    al menos dos días). Evita arrancar la estacionalidad de un solo día ruidoso.
+    """
+    x = np.arange(len(grid), dtype=np.float64)
+    columns = [np.ones_like(x), x]
+    harmonics = (2 if len(grid) >= 2 * SEASON_STEPS else 1) if seasonal else 0
+    phase = 2 * np.pi * (grid_t % SEASON_SECONDS) / SEASON_SECONDS
+    slot_phase = 2 * np.pi * np.arange(SEASON_STEPS) / SEASON_STEPS
+    for k in range(1, harmonics + 1):
+        columns += [np.sin(k * phase), np.cos(k * phase)]
+    coef, *_ = np.linalg.lstsq(np.column_stack(columns), grid, rcond=None)
+
+    season = np.zeros(SEASON_STEPS)
+    for k in range(1, harmonics + 1):
+        season += coef[2 * k] * np.sin(k * slot_phase) + coef[2 * k + 1] * np.cos(k * slot_phase)
+    return coef[0], coef[1], season
+
+
+def fit_holt_winters(ts, y):
+    """
+    Ajusta el modelo sobre (ts epoch segundos, y). Con al menos un día de grilla usa
+    estacionalidad diaria; con menos, Holt amortiguado sin estacionalidad.
+    Devuelve un dict con el estado final y los parámetros, o None si no hay datos suficientes.
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = ts >= ts[-1] - MAX_SEASONS * SEASON_SECONDS
+    start, grid = regular_grid(ts[keep], y[keep])
+    n = len(grid)
+    if n < 6:
+        return None
+
+    grid_t = start + np.arange(n) * STEP_SECONDS
+    slots = season_slots(grid_t)
+    seasonal = n >= SEASON_STEPS
+    gammas = GAMMAS if seasonal else (0.0,)
+    alpha, beta, gamma, phi = (
+        p.ravel() for p in np.meshgrid(ALPHAS, BETAS, gammas, PHIS, indexing="ij")
+    )
+    k = len(alpha)
+
+    level0, trend0, season0 = _initial_state(grid, grid_t, seasonal)
+    level = np.full(k, level0)
+    trend = np.full(k, trend0)
+    season = np.tile(season0, (k, 1))
+    sse = np.zeros(k)
+    sse_h = np.zeros(k)
+    scored = scored_h = 0
+
+    # Pronóstico a H pasos hecho en t-H: nivel + tendencia amortiguada de ese momento
+    horizon = min(SCORE_HORIZON, max(1, n // 4))
+    damped_h = phi * (1 - phi ** horizon) / np.where(phi == 1, 1, 1 - phi)
+    damped_h = np.where(phi == 1, horizon, damped_h)
+    pending = np.empty((horizon, k))
+
+    for t in range(n):
+        slot = slots[t]
+        s = season[:, slot]
+        damped = phi * trend
+        err = grid[t] - (level + damped + s)
+        if t >= WARMUP_STEPS:
+            sse += err * err
+            scored += 1
+        if t >= horizon + WARMUP_STEPS:
+            err_h = grid[t] - (pending[t % horizon] + s)
+            sse_h += err_h * err_h
+            scored_h += 1
+        new_level = level + damped + alpha * err
+        trend = damped + beta * (new_level - level - damped)
+        season[:, slot] = s + gamma * (grid[t] - new_level - s)
+        level = new_level
+        pending[t % horizon] = level + damped_h * trend
+
+    score = sse / max(scored, 1) + sse_h / max(scored_h, 1)
+    best = int(np.argmin(score)) if scored else 0
+    return {
+        "level": float(level[best]),
+        "trend": float(trend[best]),
+        "season": season[best].copy(),
+        "alpha": float(alpha[best]),
+        "beta": float(beta[best]),
+        "gamma": float(gamma[best]),
+        "phi": float(phi[best]),
+        "sigma": float(np.sqrt(sse[best] / scored)) if scored else float(np.std(grid)),
+        "lastGrid": float(start + (n - 1) * STEP_SECONDS),
+        "seasonal": seasonal,
+    }
+
+
+def holt_winters_forecast(model, last_ts, anchor_val):
+    """
+    Pronóstico de 144 pasos de 10 minutos desde `last_ts`, desplazado para que arranque
+    en el anchor (misma continuidad que Prophet). Devuelve (arrays, valor a 24h).
+    """
+    last_ts = np.datetime64(last_ts, "ns")
+    last_s = last_ts.astype(np.int64) / 1e9
+    phi, trend = model["phi"], model["trend"]
+
+    def damped_sum(h):
+        # phi + phi^2 + ... + phi^h (h en pasos de grilla, puede ser fraccionario)
+        return h if phi == 1 else phi * (1 - phi ** h) / (1 - phi)
+
+    target_s = last_s + STEP_OFFSETS_S
+    h = (target_s - model["lastGrid"]) / STEP_SECONDS
+    values = model["level"] + damped_sum(h) * trend + model["season"][season_slots(target_s)]
+
+    h_now = (last_s - model["lastGrid"]) / STEP_SECONDS
+    model_now = model["level"] + damped_sum(h_now) * trend + model["season"][season_slots(last_s)]
+    values = values + (anchor_val - model_now)
+
+    # Varianza a h pasos del modelo aditivo: sigma^2 * (1 + sum_j (alpha * (1 + j*beta))^2)
+    j = np.arange(FORECAST_STEPS)
+    growth = np.cumsum((model["alpha"] * (1 + j * model["beta"])) ** 2) - model["alpha"] ** 2
+    width = 1.96 * model["sigma"] * np.sqrt(1 + growth)
+
+    forecast = {
+        "ds": last_ts + (STEP_OFFSETS_S * 1e9).astype("timedelta64[ns]"),
+        "value": np.round(values, 2),
+        "low": np.round(values - width, 2),
+        "high": np.round(values + width, 2),
+    }
+    return forecast, float(values[-1])
@@ -0,0 +1,96 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobStore:
+    """
+    Trabajos de análisis en segundo plano (submit -> status -> result).
+    Se ejecutan en un pool de hilos propio para no ocupar los hilos de los requests;
+    el cómputo pesado sigue yendo al pool de procesos si está activo.
+    Los trabajos terminados se purgan tras `ttl_s` segundos.
+    """
+
+    def __init__(self, max_workers=2, ttl_s=900):
+        self.ttl_s = ttl_s
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+
+    def submit(self, fn, total):
+        """
+        `fn(on_progress, on_plan)` debe devolver el resultado final, llamar a
+        `on_progress(sensor_report)` cada vez que termina un sensor y puede corregir
+        con `on_plan(total)` la estimación de `total` al planificar.
+        """
+        self._purge()
+        job_id = uuid.uuid4().hex
+        job = {
+            "jobId": job_id,
+            "status": "queued",
+            "submittedAt": time.time(),
+            "finishedAt": None,
+            "totalSensors": total,
+            "completedSensors": [],
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+
+        self._pool.submit(self._run, job, fn)
+        return job_id
+
+    def _run(self, job, fn):
+        job["status"] = "running"
+
+        def on_progress(sensor_report):
+            with self._lock:
+                job["completedSensors"].append(sensor_report["sensorId"])
+
+        def on_plan(total):
+            with self._lock:
+                job["totalSensors"] = total
+
+        try:
+            job["result"] = fn(on_progress, on_plan)
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finishedAt"] = time.time()
+
+    def _purge(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finishedAt"] is not None and now - job["finishedAt"] > self.ttl_s
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        self._purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            return {
+                "jobId": job["jobId"],
+                "status": job["status"],
+                "submittedAt": job["submittedAt"],
+                "finishedAt": job["finishedAt"],
+                "totalSensors": job["totalSensors"],
+                "completedSensors": list(job["completedSensors"]),
+                "error": job["error"],
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
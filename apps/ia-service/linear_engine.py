@@ -0,0 +1,96 @@
+import numpy as np
+
+# Horizonte fijo: 144 pasos de 10 minutos = 24 horas
+FORECAST_STEPS = 144
+STEP_SECONDS = 600
+STEP_OFFSETS_S = np.arange(1, FORECAST_STEPS + 1, dtype=np.float64) * STEP_SECONDS
+
+
+def to_epoch_seconds(ds):
+    """datetime64 (Series o array) -> segundos epoch en float64, sin pasar por objetos Python."""
+    values = np.asarray(ds, dtype="datetime64[ns]")
+    return values.astype(np.int64) / 1e9
+
+
+def fit_linear_batch(ts_num, Y):
+    """
+    Ajusta la pendiente de mínimos cuadrados para todas las columnas de Y a la vez.
+    ts_num: (n,) segundos epoch. Y: (n, k), NaN donde la métrica no tiene lectura.
+    Devuelve (slopes, stds, counts), cada uno de forma (k,).
+    Equivale a `np.polyfit(ts, y, 1)` + `y.std()` por columna tras `dropna()`.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+
+    mask = ~np.isnan(Y)
+    counts = mask.sum(axis=0)
+    safe_counts = np.maximum(counts, 1)
+
+    # Centramos el tiempo: los epoch en segundos al cuadrado pierden precisión
+    x = (np.asarray(ts_num, dtype=np.float64) - ts_num[0])[:, None]
+    X = np.where(mask, x, 0.0)
+    Yz = np.where(mask, Y, 0.0)
+
+    mean_x = X.sum(axis=0) / safe_counts
+    mean_y = Yz.sum(axis=0) / safe_counts
+    dx = np.where(mask, x - mean_x, 0.0)
+    dy = np.where(mask, Y - mean_y, 0.0)
+
+    sxx = np.einsum("ij,ij->j", dx, dx)
+    sxy = np.einsum("ij,ij->j", dx, dy)
+    syy = np.einsum("ij,ij->j", dy, dy)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where((counts > 1) & (sxx > 0), sxy / sxx, 0.0)
+        stds = np.where(counts > 1, np.sqrt(syy / (counts - 1)), np.nan)
+
+    # Línea plana: sin pendiente
+    slopes = np.where(stds == 0, 0.0, slopes)
+    return slopes, stds, counts
+
+
+def linear_forecast(last_ts, anchor_val, slope, std_dev, count):
+    """
+    Proyección lineal desde el anchor con cono de confianza parabólico.
+    Devuelve arrays numéricos (timestamps datetime64, value, low, high) y el valor a 24h.
+    """
+    # Limiter: Evitar proyecciones verticales absurdas (máx 10% cambio/hora)
+    max_change_ph = anchor_val * 0.10
+    if abs(slope * 3600) > abs(max_change_ph):
+        slope = (max_change_ph / 3600) * (1 if slope > 0 else -1)
+
+    if count <= 2:
+        std_dev = anchor_val * 0.01
+    if np.isnan(std_dev) or std_dev == 0:
+        std_dev = max(abs(anchor_val) * 0.01, 0.1)
+
+    y_pred = anchor_val + slope * STEP_OFFSETS_S
+    uncertainty = std_dev * np.sqrt(np.arange(1, FORECAST_STEPS + 1) / 6) * 1.96
+
+    timestamps = np.datetime64(last_ts, "ns") + (STEP_OFFSETS_S * 1e9).astype("timedelta64[ns]")
+    forecast = {
+        "ds": timestamps,
+        "value": np.round(y_pred, 2),
+        "low": np.round(y_pred - uncertainty, 2),
+        "high": np.round(y_pred + uncertainty, 2),
+    }
+    return forecast, float(y_pred[-1])
+
+
+def first_crossing_hours(ds, values, last_ts, min_val, max_val):
+    """
+    RUL: horas hasta el primer punto del pronóstico fuera de [min, max].
+    Trabaja sobre los arrays numéricos, antes de serializar nada.
+    """
+    crossed = np.zeros(len(values), dtype=bool)
+    if max_val is not None:
+        crossed |= values >= max_val
+    if min_val is not None:
+        crossed |= values <= min_val
+    if not crossed.any():
+        return None
+
+    idx = int(np.argmax(crossed))
+    delta_s = (np.datetime64(ds[idx], "ns") - np.datetime64(last_ts, "ns")) / np.timedelta64(1, "s")
+    return max(0.1, round(delta_s / 3600, 1))
@@ -0,0 +1,154 @@
+from array import array
+
+import numpy as np
+
+# Parser incremental para payloads muy grandes (/analyze/lowmem).
+# Recorre el JSON evento por evento y arma, por sensor, un vector de timestamps y un
+# array contiguo por métrica, sin crear un objeto por lectura. Se entrega un sensor
+# a la vez para que el anterior pueda liberarse antes de leer el siguiente.
+# ijson es opcional: sin él este modo no está disponible.
+try:
+    import ijson
+    from ijson.common import ObjectBuilder, JSONError
+except ImportError:
+    ijson = None
+
+    class JSONError(ValueError):
+        pass
+
+_TYPECODES = {"float64": "d", "float32": "f"}
+_ROW_METRICS = "item.readings.item.metrics."
+
+
+class _SensorBuilder:
+    def __init__(self, parse_timestamps, dtype, chunk):
+        self.parse_timestamps = parse_timestamps
+        self.dtype = np.dtype(dtype)
+        self.typecode = _TYPECODES[self.dtype.name]
+        self.chunk = chunk
+        self.config = None
+        self.rows = 0            # lecturas vistas (formato por filas)
+        self.key = None          # categoría (filas) o categoria__metrica (columnas)
+        self.col = None          # categoria__metrica de la lectura en curso (filas)
+        self._pending_ts = []
+        self._ts_chunks = []
+        self._columns = {}       # col_key -> (posiciones, valores)
+        self._lengths = {}       # formato columnar: elementos vistos por columna (incluidos null)
+        self.invalid = False     # timestamps ilegibles: el sensor se descarta, como en /analyze
+
+    def add_timestamp(self, value):
+        self._pending_ts.append(value)
+        if len(self._pending_ts) >= self.chunk:
+            self._flush_timestamps()
+
+    def _flush_timestamps(self):
+        if self._pending_ts and not self.invalid:
+            try:
+                ds = self.parse_timestamps(self._pending_ts)
+                self._ts_chunks.append(np.asarray(ds, dtype="datetime64[ms]").astype(np.int64))
+            except (ValueError, TypeError):
+                self.invalid = True
+                self._ts_chunks = []
+        self._pending_ts = []
+
+    def _column(self, col_key):
+        column = self._columns.get(col_key)
+        if column is None:
+            column = self._columns[col_key] = (array("q"), array(self.typecode))
+        return column
+
+    def add_value(self, col_key, position, value):
+        positions, values = self._column(col_key)
+        positions.append(position)
+        values.append(value)
+
+    def add_column_item(self, col_key, value):
+        position = self._lengths.get(col_key, 0)
+        self._lengths[col_key] = position + 1
+        if value is not None:
+            self.add_value(col_key, position, value)
+
+    def finish(self):
+        """
+        (config, timestamps epoch ms ordenados, {col_key: array denso con NaN en los huecos}).
+        Un sensor inválido sale sin lecturas.
+        """
+        self._flush_timestamps()
+        ts = np.concatenate(self._ts_chunks) if self._ts_chunks else np.empty(0, dtype=np.int64)
+        self._ts_chunks = []
+        if self.invalid or (self.rows and self.rows != len(ts)):
+            return self.config, np.empty(0, dtype=np.int64), {}
+        n = len(ts)
+
+        columns = {}
+        for col_key, (positions, values) in self._columns.items():
+            if self._lengths and self._lengths.get(col_key) != n:
+                continue  # largo distinto al de los timestamps: se ignora como en /analyze/columnar
+            pos = np.frombuffer(positions, dtype=np.int64)
+            dense = np.full(n, np.nan, dtype=self.dtype)
+            dense[pos] = np.frombuffer(values, dtype=self.dtype)
+            columns[col_key] = dense
+        self._columns = {}
+
+        # Ordenar solo si hace falta (una copia por columna, de a una)
+        if n > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+            for col_key in columns:
+                columns[col_key] = columns[col_key][order]
+        return self.config, ts, columns
+
+
+def iter_sensors(fileobj, parse_timestamps, dtype="float64", chunk=50_000):
+    """
+    Recorre una lista JSON de sensores y entrega uno a la vez:
+    (config dict, timestamps epoch ms int64, {categoria__metrica: array}).
+    Acepta el formato por filas (MachineData) y el columnar de /analyze/columnar.
+    """
+    events = ijson.parse(fileobj, use_float=True)
+    sensor = None
+    col_keys = {}
+
+    for prefix, event, value in events:
+        # Camino caliente: un valor de métrica dentro de una lectura
+        if event == "number" and sensor is not None and prefix.startswith(_ROW_METRICS):
+            sensor.add_value(sensor.col, sensor.rows - 1, value)
+            continue
+
+        if prefix == "item":
+            if event == "start_map":
+                sensor = _SensorBuilder(parse_timestamps, dtype, chunk)
+            elif event == "end_map" and sensor is not None:
+                yield sensor.finish()
+                sensor = None
+            continue
+        if sensor is None:
+            continue
+
+        # --- Config: objeto chico, se arma completo ---
+        if prefix == "item.config" and event == "start_map":
+            builder = ObjectBuilder()
+            builder.event(event, value)
+            for p, e, v in events:
+                builder.event(e, v)
+                if p == "item.config" and e == "end_map":
+                    break
+            sensor.config = builder.value
+
+        # --- Formato por filas ---
+        elif prefix == "item.readings.item" and event == "start_map":
+            sensor.rows += 1
+        elif prefix == "item.readings.item.timestamp":
+            sensor.add_timestamp(value)
+        elif prefix == "item.readings.item.metrics" and event == "map_key":
+            sensor.key = value
+        elif event == "map_key" and prefix.startswith(_ROW_METRICS):
+            sensor.col = col_keys.get((sensor.key, value)) or col_keys.setdefault((sensor.key, value), f"{sensor.key}__{value}")
+
+        # --- Formato columnar ---
+        elif prefix == "item.timestamps.item":
+            sensor.add_timestamp(value)
+        elif prefix == "item.columns" and event == "map_key":
+            sensor.key = value
+        elif prefix.startswith("item.columns.") and event in ("number", "null"):
+            sensor.add_column_item(sensor.key, value)
@@ -1,11 +1,38 @@
+import os
+import json
+import time
+import hashlib
 import logging
+import tempfile
+import threading
+import zlib
+import multiprocessing
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
-from prophet import Prophet
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, ValidationError
+from typing import List, Dict, Optional, Literal
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cache import LRUCache, SingleFlight
+from jobs import JobStore
+from streaming import StreamStore
+from history import HistoryStore
+from instrumentation import Registry, SIZE_BUCKETS, stage
+from linear_engine import (
+    to_epoch_seconds, fit_linear_batch, linear_forecast, first_crossing_hours
+)
+from charts import chart_series, forecast_series, series_to_rows
+from encoding import JSON, NotAcceptable, dumps_json, encode_result, render_report
+from downsampling import downsample_indices
+from strategies import AUTO, FALLBACK, register_strategy, select_strategy, auto_strategy, is_known
+from holt_winters import fit_holt_winters, holt_winters_forecast
+from lowmem import ijson, JSONError, iter_sensors
+from anomaly import build_matrix, score_matrix, rank_anomalies
 
 # --- CONFIGURACIÓN SILENCIOSA (Evita ruido en consola) ---
 logging.getLogger('cmdstanpy').disabled = True
@@ -14,6 +41,121 @@ logger = logging.getLogger("uvicorn")
 
 app = FastAPI(title="Ingenio AI Brain 🧠 - Fusion Edition")
 
+# Procesos para el análisis por métrica (1 = serie en el proceso del request, 0 = todos los núcleos)
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "1"))
+# Cómo se crean esos procesos: "spawn" o "forkserver". No "fork": el proceso del servidor ya
+# tiene hilos (threadpool, warm-up, jobs) y un fork puede heredar un lock tomado y colgarse.
+ANALYZE_START_METHOD = os.getenv("ANALYZE_START_METHOD", "spawn")
+
+# Caché de modelos Prophet ajustados (por proceso)
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "256"))
+MODEL_CACHE_TTL_S = float(os.getenv("MODEL_CACHE_TTL_S", "3600"))
+
+# Pre-agregación de la historia antes de Prophet ("" = usar lecturas crudas) y modo rápido
+PROPHET_RESAMPLE = os.getenv("PROPHET_RESAMPLE", "10min")
+PROPHET_AGG = os.getenv("PROPHET_AGG", "mean")
+PROPHET_FAST = os.getenv("PROPHET_FAST", "0") == "1"
+
+# Arranque: warm-up antes de reportar listo (/ready). IA_PRELOAD=1 lo hace al importar
+# el módulo, para que gunicorn con preload_app lo ejecute una sola vez antes del fork.
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_PROPHET = os.getenv("WARMUP_PROPHET", "1") == "1"
+IA_PRELOAD = os.getenv("IA_PRELOAD", "0") == "1"
+
+# Estrategia para las métricas en "auto". Vacío = según los datos (ver `auto_strategy` en
+# strategies.py); prophet | holt_winters | linear la fija para todas.
+AUTO_STRATEGY = os.getenv("AUTO_STRATEGY", "")
+
+# Presupuesto de latencia por request en ms (0 = sin límite). Agotado, las métricas que
+# faltan usan el pronóstico en caché o la lineal y salen marcadas como degradadas.
+ANALYZE_BUDGET_MS = float(os.getenv("ANALYZE_BUDGET_MS", "0"))
+# Costo supuesto (s) de cada estrategia mientras este proceso no la midió: "nombre=segundos,..."
+STRATEGY_DEFAULT_COSTS_S = os.getenv("STRATEGY_DEFAULT_COSTS_S", "prophet=2.0,holt_winters=0.05")
+
+# Opciones de análisis cuando el request no las especifica
+DEFAULT_OPTIONS = {
+    "downsample": "uniform", "points": 200, "timings": False,
+    "resample": PROPHET_RESAMPLE, "agg": PROPHET_AGG, "fast": PROPHET_FAST,
+    "strategy": AUTO,
+}
+
+# Caché de reportes por sensor (misma ventana de lecturas + misma config = mismo reporte)
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "512"))
+REPORT_CACHE_TTL_S = float(os.getenv("REPORT_CACHE_TTL_S", "60"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(128 * 2**20)))
+REPORT_FLIGHT_TIMEOUT_S = float(os.getenv("REPORT_FLIGHT_TIMEOUT_S", "300"))
+
+# Modo de baja memoria (/analyze/lowmem): cuerpo a disco pasado este tamaño, dtype de las series
+LOWMEM_SPOOL_BYTES = int(os.getenv("LOWMEM_SPOOL_BYTES", str(8 * 2**20)))
+LOWMEM_DTYPE = os.getenv("LOWMEM_DTYPE", "float64")
+
+# Trabajos asíncronos de análisis
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "900"))
+
+# Historia rodante en el servidor (lecturas delta)
+HISTORY_RETENTION_S = float(os.getenv("HISTORY_RETENTION_S", str(7 * 86400)))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "500000"))
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(512 * 2**20)))
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR", "")
+HISTORY_DTYPE = os.getenv("HISTORY_DTYPE", "float32")
+
+# Detección de anomalías de flota: bucket (s), buckets por ventana, buckets "actuales" y umbrales
+ANOMALY_STEP_S = float(os.getenv("ANOMALY_STEP_S", "60"))
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "360"))
+ANOMALY_RECENT = int(os.getenv("ANOMALY_RECENT", "5"))
+ANOMALY_MIN_POINTS = int(os.getenv("ANOMALY_MIN_POINTS", "30"))
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.5"))
+ANOMALY_MAD = float(os.getenv("ANOMALY_MAD", "4.0"))
+ANOMALY_ROC = float(os.getenv("ANOMALY_ROC", "4.5"))
+ANOMALY_LIMIT = int(os.getenv("ANOMALY_LIMIT", "100"))
+
+# ==========================================
+# 0. INSTRUMENTACIÓN (Prometheus en /metrics)
+# ==========================================
+
+telemetry = Registry()
+STAGE_SECONDS = telemetry.histogram("ia_stage_duration_seconds", "Duración de cada etapa del análisis", ["stage"])
+STRATEGY_SECONDS = telemetry.histogram("ia_strategy_duration_seconds", "Duración del análisis de una métrica por estrategia", ["strategy"])
+STRATEGY_TOTAL = telemetry.counter("ia_strategy_total", "Métricas analizadas por estrategia", ["strategy"])
+FALLBACK_TOTAL = telemetry.counter("ia_prophet_fallback_total", "Métricas que no usaron Prophet, por motivo", ["reason"])
+METRIC_ERRORS = telemetry.counter("ia_metric_errors_total", "Métricas cuyo análisis lanzó una excepción")
+REQUEST_SECONDS = telemetry.histogram("ia_request_duration_seconds", "Duración de los requests HTTP", ["endpoint"])
+REQUEST_BYTES = telemetry.histogram("ia_request_body_bytes", "Tamaño del cuerpo recibido", ["endpoint"], buckets=SIZE_BUCKETS)
+RESPONSE_BYTES = telemetry.histogram("ia_response_body_bytes", "Tamaño del cuerpo respondido", ["endpoint"], buckets=SIZE_BUCKETS)
+IN_FLIGHT = telemetry.gauge("ia_requests_in_flight", "Requests en curso")
+SENSORS_TOTAL = telemetry.counter("ia_sensors_analyzed_total", "Sensores incluidos en reportes")
+MODEL_CACHE_GAUGE = telemetry.gauge("ia_model_cache", "Estado de la caché de modelos de este proceso", ["field"])
+REPORT_CACHE_GAUGE = telemetry.gauge("ia_report_cache", "Estado de la caché de reportes de este proceso", ["field"])
+DEGRADED_TOTAL = telemetry.counter("ia_degraded_metrics_total", "Métricas degradadas por presupuesto de latencia, por estrategia pedida", ["strategy"])
+HISTORY_GAUGE = telemetry.gauge("ia_history_store", "Estado de la historia rodante de este proceso", ["field"])
+ANOMALY_SERIES = telemetry.counter("ia_anomaly_series_total", "Series evaluadas por la detección de anomalías", ["outcome"])
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    start = time.perf_counter()
+    request.state.received_at = start
+    IN_FLIGHT.inc()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        # Ruta con parámetros sin expandir ("/jobs/{job_id}") para no explotar la cardinalidad
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        if request.headers.get("content-length"):
+            REQUEST_BYTES.observe(int(request.headers["content-length"]), endpoint=endpoint)
+        if response is not None and response.headers.get("content-length"):
+            RESPONSE_BYTES.observe(int(response.headers["content-length"]), endpoint=endpoint)
+
+def elapsed_since_received(request):
+    """Tiempo entre que llegó el request y que entró al endpoint: lectura del cuerpo + validación Pydantic."""
+    received_at = getattr(request.state, "received_at", None)
+    return time.perf_counter() - received_at if received_at is not None else 0.0
+
 # ==========================================
 # 1. MODELOS DE DATOS
 # ==========================================
@@ -21,6 +163,7 @@ app = FastAPI(title="Ingenio AI Brain 🧠 - Fusion Edition")
 class MetricConfig(BaseModel):
     min: Optional[float] = None
     max: Optional[float] = None
+    strategy: Optional[str] = None  # None/"auto" = según la historia; si no, un nombre de strategies.py
 
 class SensorConfig(BaseModel):
     sensorId: str
@@ -34,6 +177,11 @@ class MachineData(BaseModel):
     config: SensorConfig
     readings: List[Reading]
 
+class StreamPush(BaseModel):
+    sensorId: str
+    readings: List[Reading]
+    metricsConfig: Optional[Dict[str, Dict[str, MetricConfig]]] = None
+
 # ==========================================
 # 2. MOTOR MATEMÁTICO (Helpers)
 # ==========================================
@@ -61,18 +209,30 @@ def calculate_trend_metrics(start_val, end_val, hours):
     
     return slope_per_hour, trend
 
-def downsample_history(df, target_points=200):
+def downsample_history(df, target_points=200, method="uniform"):
     """
     IMPORTANTE: Esta función toma TODA la historia real disponible,
     pero reduce la cantidad de puntos visuales para no saturar el frontend.
     Mantiene la forma de la curva completa (días, semanas) con pocos puntos.
+    Devuelve arrays (ds, y) con solo los puntos elegidos, sin copiar el DataFrame.
     """
-    if len(df) <= target_points:
-        return df.copy()
-    
-    # Seleccionamos índices espaciados equitativamente
-    indices = np.linspace(0, len(df) - 1, target_points).astype(int)
-    return df.iloc[indices].copy()
+    ds = df['ds'].to_numpy()
+    y = df['y'].to_numpy()
+    if len(y) <= target_points:
+        return ds, y
+
+    idx = downsample_indices(method, to_epoch_seconds(ds), y, target_points)
+    return ds[idx], y[idx]
+
+def evaluate_status(anchor_val, predicted_val, min_val, max_val):
+    status = "ok"
+    if max_val is not None:
+        if anchor_val > max_val: status = "critical"
+        elif predicted_val > max_val: status = "warning"
+    if min_val is not None:
+        if anchor_val < min_val: status = "critical"
+        elif predicted_val < min_val: status = "warning"
+    return status
 
 def generate_recommendation(status, trend, rul, strategy, volatility):
     prefix = "🧠 [IA] " if "prophet" in strategy else "📊 [Estadística] "
@@ -95,85 +255,173 @@ def generate_recommendation(status, trend, rul, strategy, volatility):
 # ==========================================
 # 3. ESTRATEGIA A: REGRESIÓN DE ALTA RESOLUCIÓN (Linear High-Res)
 # ==========================================
-def analyze_linear_high_res(df, min_val, max_val, anchor_val):
-    last_ts = df.iloc[-1]['ds']
-
-    # 1. Pendiente Robusta (Polyfit sobre toda la historia)
-    df['ts_num'] = df['ds'].apply(lambda x: x.timestamp())
-    
-    if len(df) > 1:
-        if df['y'].std() == 0: # Línea plana
-            m = 0
-        else:
-            m, _ = np.polyfit(df['ts_num'], df['y'], 1)
-    else:
-        m = 0
+def analyze_linear_high_res(df, min_val, max_val, anchor_val, linear_fit=None):
+    """
+    Proyección lineal vectorizada. `linear_fit` = (slope, std, count) ya calculado
+    en lote para todas las métricas del sensor; si no llega, se ajusta aquí.
+    """
+    last_ts = df['ds'].iloc[-1]
 
-    # Limiter: Evitar proyecciones verticales absurdas
-    max_change_ph = anchor_val * 0.10 # Max 10% cambio/hora
-    if abs(m * 3600) > abs(max_change_ph):
-        m = (max_change_ph / 3600) * (1 if m > 0 else -1)
+    # 1. Pendiente Robusta (mínimos cuadrados sobre toda la historia)
+    if linear_fit is None:
+        slopes, stds, counts = fit_linear_batch(to_epoch_seconds(df['ds']), df['y'].to_numpy())
+        linear_fit = (slopes[0], stds[0], counts[0])
+    slope, std_dev, count = linear_fit
 
     # 2. Generación de Puntos (Cada 10 mins = 144 puntos)
-    chart_export = []
-    
-    std_dev = df['y'].std() if len(df) > 2 else (anchor_val * 0.01)
-    if np.isnan(std_dev) or std_dev == 0: std_dev = max(abs(anchor_val) * 0.01, 0.1)
+    forecast, predicted_val_24h = linear_forecast(last_ts, anchor_val, slope, std_dev, count)
+    return forecast, predicted_val_24h, "linear_high_res"
 
-    predicted_val_24h = anchor_val
-    steps = 144 
-    minutes_per_step = 10 
+# ==========================================
+# 4. ESTRATEGIA B: PROPHET NEURAL OFFSET (Prophet High-Res)
+# ==========================================
+PROPHET_PARAMS = dict(
+    changepoint_prior_scale=0.05, 
+    seasonality_mode='additive',
+    daily_seasonality=True,
+    yearly_seasonality=False,
+    weekly_seasonality=False
+)
 
-    for i in range(1, steps + 1):
-        future_time = last_ts + timedelta(minutes=i * minutes_per_step)
-        seconds_from_now = (future_time - last_ts).total_seconds()
-        
-        # Proyección suave desde el anchor
-        y_pred = anchor_val + (m * seconds_from_now)
-        
-        # Cono de confianza parabólico
-        uncertainty = std_dev * np.sqrt(i/6) * 1.96 
-
-        chart_export.append({
-            "timestamp": future_time.isoformat(),
-            "value": round(y_pred, 2),
-            "confidenceLow": round(y_pred - uncertainty, 2),
-            "confidenceHigh": round(y_pred + uncertainty, 2),
-            "isFuture": True
+# Guardamos parámetros + pronóstico, no el objeto Prophet (arrastra toda la historia)
+model_cache = LRUCache(max_size=MODEL_CACHE_SIZE, max_age_s=MODEL_CACHE_TTL_S)
+
+_prophet_class = None
+
+def get_prophet():
+    """
+    Importa Prophet (y con él cmdstanpy y el modelo Stan) recién cuando hace falta:
+    es la mayor parte del tiempo de arranque y las estrategias NumPy no lo necesitan.
+    """
+    global _prophet_class
+    if _prophet_class is None:
+        from prophet import Prophet
+        _prophet_class = Prophet
+    return _prophet_class
+
+def aggregate_history(df, freq, how="mean"):
+    """
+    Re-muestrea la historia a una grilla fija (mean/min/max por bucket) antes del fit.
+    El costo de Prophet pasa a depender del largo de la grilla, no de la frecuencia del sensor.
+    """
+    if not freq:
+        return df
+    grid = df.set_index('ds')['y'].resample(freq).agg(how).dropna()
+    if len(grid) < 2 or len(grid) >= len(df):
+        return df
+    return grid.reset_index()
+
+def history_fingerprint(df, last_real_ts):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(df['ds'].to_numpy().tobytes())
+    h.update(df['y'].to_numpy().tobytes())
+    h.update(str(last_real_ts).encode())
+    return h.hexdigest()
+
+def warm_start_params(m):
+    """Extrae los parámetros MAP de un modelo ajustado para usarlos como `init` del siguiente fit."""
+    res = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        res[pname] = m.params[pname][0][0]
+    for pname in ['delta', 'beta']:
+        res[pname] = m.params[pname][0]
+    return res
+
+def analytic_intervals(m, df_fit, forecast, last_real_ts, z=1.96):
+    """
+    Modo rápido: en vez de simular 1000 trayectorias, el intervalo sale del desvío
+    de los residuos en la historia y se abre con la raíz del horizonte (en horas).
+    """
+    in_sample = m.predict(df_fit[['ds']])
+    sigma = float(np.std(df_fit['y'].to_numpy() - in_sample['yhat'].to_numpy()))
+    horizon_h = np.maximum((forecast['ds'] - last_real_ts).dt.total_seconds().to_numpy() / 3600, 0)
+    width = z * sigma * np.sqrt(1 + horizon_h)
+    forecast['yhat_lower'] = forecast['yhat'] - width
+    forecast['yhat_upper'] = forecast['yhat'] + width
+    return forecast
+
+def fit_prophet_forecast(df, cache_key=None, timings=None, options=None, allow_fit=True):
+    """
+    Ajusta Prophet y predice 144 pasos de 10 min, reutilizando trabajo previo:
+    - "hit": la historia es idéntica a la del último ajuste -> se devuelve el pronóstico guardado.
+    - "warm": solo llegaron lecturas nuevas -> se reajusta partiendo de los parámetros anteriores.
+    - "miss": ajuste en frío.
+    Sin `allow_fit` (presupuesto agotado) no se ajusta: se devuelve el último pronóstico
+    guardado aunque sea de una historia anterior ("stale"), o (None, None) si no hay.
+    """
+    timings = {} if timings is None else timings
+    options = options or DEFAULT_OPTIONS
+    last_real_ts = df['ds'].iloc[-1]
+
+    with stage(timings, "prophet_aggregate"):
+        df_fit = aggregate_history(df, options["resample"], options["agg"])
+
+    fingerprint = history_fingerprint(df_fit, last_real_ts)
+    entry = model_cache.get(cache_key) if cache_key is not None else None
+
+    if entry is not None and entry["fingerprint"] == fingerprint:
+        return entry["forecast"], "hit"
+    if not allow_fit:
+        return (entry["forecast"], "stale") if entry is not None else (None, None)
+
+    init = None
+    first_ds, last_ds = df_fit['ds'].iloc[0], df_fit['ds'].iloc[-1]
+    if entry is not None and first_ds <= entry["last_ds"] < last_ds:
+        init = entry["params"]
+
+    with stage(timings, "prophet_fit"):
+        # Sin muestras de incertidumbre el fit sigue siendo MAP, pero predict no simula
+        extra = {"uncertainty_samples": 0} if options["fast"] else {}
+        m = get_prophet()(**PROPHET_PARAMS, **extra)
+        if init is not None:
+            m.fit(df_fit, init=init)
+        else:
+            m.fit(df_fit)
+
+    # Predicción cada 10 minutos (144 puntos) para curvas suaves.
+    # Solo se predice "ahora" (para el offset) y el futuro, no toda la historia.
+    with stage(timings, "prophet_predict"):
+        steps = pd.to_timedelta(np.arange(1, 145) * 10, unit="min")
+        future = pd.DataFrame({'ds': pd.DatetimeIndex([last_real_ts]).append(last_real_ts + steps)})
+        forecast = m.predict(future)
+        if options["fast"]:
+            forecast = analytic_intervals(m, df_fit, forecast, last_real_ts)
+        forecast = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+    if cache_key is not None:
+        model_cache.put(cache_key, {
+            "fingerprint": fingerprint,
+            "first_ds": first_ds,
+            "last_ds": last_ds,
+            "params": warm_start_params(m),
+            "forecast": forecast,
         })
-        
-        if i == steps: predicted_val_24h = y_pred
 
-    return chart_export, predicted_val_24h, "linear_high_res"
+    return forecast, ("warm" if init is not None else "miss")
 
-# ==========================================
-# 4. ESTRATEGIA B: PROPHET NEURAL OFFSET (Prophet High-Res)
-# ==========================================
-def analyze_prophet_high_res(df, min_val, max_val, historical_max, anchor_val):
+def analyze_prophet_high_res(df, min_val, max_val, historical_max, anchor_val, cache_key=None, meta=None, options=None, allow_fit=True):
+    meta = {} if meta is None else meta
     try:
         if df['y'].std() < 0.0001:
+            meta["fallback"] = "flat"
             return None # Fallback a lineal si es línea plana
 
-        m = Prophet(
-            changepoint_prior_scale=0.05, 
-            seasonality_mode='additive',
-            daily_seasonality=True,
-            yearly_seasonality=False,
-            weekly_seasonality=False
-        )
-        m.fit(df)
-        
-        # Predicción cada 10 minutos (144 puntos) para curvas suaves
-        future = m.make_future_dataframe(periods=144, freq='10min')
-        forecast = m.predict(future)
-    except Exception:
+        forecast, cache_outcome = fit_prophet_forecast(df, cache_key, meta.setdefault("timings", {}), options, allow_fit)
+    except Exception as e:
+        logger.warning(f"⚠️ Prophet falló, se usa regresión lineal: {e}")
+        meta["fallback"] = "error"
         return None 
+    if forecast is None:
+        meta["fallback"] = "budget"
+        return None
 
     # 1. Cálculo de Offset (El secreto de la continuidad)
     last_real_ts = df.iloc[-1]['ds']
     
     mask = forecast['ds'] <= last_real_ts
-    if not mask.any(): return None
+    if not mask.any():
+        meta["fallback"] = "no_overlap"
+        return None
     idx_now = forecast[mask].index[-1]
     
     val_model_now = forecast.loc[idx_now, 'yhat']
@@ -181,7 +429,9 @@ def analyze_prophet_high_res(df, min_val, max_val, historical_max, anchor_val):
 
     # 2. Ajuste del Futuro
     future_forecast = forecast.iloc[idx_now+1:].head(144).copy()
-    if future_forecast.empty: return None
+    if future_forecast.empty:
+        meta["fallback"] = "no_future"
+        return None
 
     future_forecast['yhat_adj'] = future_forecast['yhat'] + offset
     future_forecast['yhat_lower_adj'] = future_forecast['yhat_lower'] + offset
@@ -191,93 +441,154 @@ def analyze_prophet_high_res(df, min_val, max_val, historical_max, anchor_val):
     limit_ceiling = historical_max * 2.0 if historical_max > 0 else 1000000
     future_forecast['yhat_adj'] = future_forecast['yhat_adj'].clip(lower=0, upper=limit_ceiling)
 
-    chart_export = []
-    for _, row in future_forecast.iterrows():
-        chart_export.append({
-            "timestamp": row['ds'].isoformat(),
-            "value": round(row['yhat_adj'], 2),
-            "confidenceLow": round(row['yhat_lower_adj'], 2),
-            "confidenceHigh": round(row['yhat_upper_adj'], 2),
-            "isFuture": True
-        })
-
-    if not chart_export: return None
+    forecast_arrays = {
+        "ds": future_forecast['ds'].to_numpy(),
+        "value": np.round(future_forecast['yhat_adj'].to_numpy(), 2),
+        "low": np.round(future_forecast['yhat_lower_adj'].to_numpy(), 2),
+        "high": np.round(future_forecast['yhat_upper_adj'].to_numpy(), 2),
+    }
     
-    predicted_val_24h = chart_export[-1]['value']
-    return chart_export, predicted_val_24h, "prophet_neural_res"
+    predicted_val_24h = float(forecast_arrays["value"][-1])
+    meta["modelCache"] = cache_outcome
+    return forecast_arrays, predicted_val_24h, "prophet_neural_res"
 
 # ==========================================
 # 5. ORQUESTADOR CENTRAL (FUSIÓN)
 # ==========================================
-def analyze_metric_ultimate(history_df, min_val, max_val):
+
+# --- Estrategias registradas (se eligen por métrica en `select_strategy`) ---
+
+@register_strategy("linear")
+def linear_strategy(df, min_val, max_val, anchor_val, ctx):
+    with stage(ctx["meta"]["timings"], "linear"):
+        return analyze_linear_high_res(df, min_val, max_val, anchor_val, ctx["linear_fit"])
+
+@register_strategy("prophet", min_hours=6)
+def prophet_strategy(df, min_val, max_val, anchor_val, ctx):
+    # Fuera de presupuesto solo sirve lo que ya está en la caché de modelos
+    return analyze_prophet_high_res(
+        df, min_val, max_val, ctx["historical_max"], anchor_val, ctx["cache_key"], ctx["meta"], ctx["options"],
+        allow_fit=not ctx["over_budget"],
+    )
+
+@register_strategy("holt_winters", min_hours=2)
+def holt_winters_strategy(df, min_val, max_val, anchor_val, ctx):
+    """Holt-Winters amortiguado (NumPy): milisegundos por métrica en vez de segundos."""
+    if ctx["over_budget"]:
+        ctx["meta"]["fallback"] = "budget"
+        return None
+    with stage(ctx["meta"]["timings"], "holt_winters"):
+        model = fit_holt_winters(to_epoch_seconds(df['ds']), df['y'].to_numpy())
+        if model is None:
+            ctx["meta"]["fallback"] = "short_history"
+            return None
+        forecast, predicted_val = holt_winters_forecast(model, df['ds'].iloc[-1], anchor_val)
+    return forecast, predicted_val, "holt_winters_damped"
+
+# Costo esperado de cada estrategia en este proceso (promedio móvil de los ajustes reales).
+# Con presupuesto, una estrategia no arranca si no alcanza a terminar antes del deadline.
+# Sin mediciones (proceso recién arrancado, hijo del pool sin warm-up) se usa un costo
+# conservador: con 0 un proceso frío empezaría un ajuste de Prophet sin margen. El warm-up
+# corre cada estrategia sin presupuesto y deja medidos los costos reales.
+STRATEGY_COST_ALPHA = 0.2
+strategy_costs = {}
+
+def parse_costs(raw):
+    costs = {}
+    for item in raw.split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            costs[name.strip()] = float(seconds)
+    return costs
+
+default_strategy_costs = parse_costs(STRATEGY_DEFAULT_COSTS_S)
+
+def expected_cost(strategy_name):
+    """Costo medido, o el supuesto; una estrategia registrada sin supuesto cuenta como la más cara."""
+    cost = strategy_costs.get(strategy_name)
+    if cost is None:
+        cost = default_strategy_costs.get(strategy_name, max(default_strategy_costs.values(), default=0.0))
+    return cost
+
+def record_strategy_cost(name, seconds):
+    previous = strategy_costs.get(name)
+    strategy_costs[name] = seconds if previous is None else previous + STRATEGY_COST_ALPHA * (seconds - previous)
+
+def over_budget(strategy_name, options):
+    """True si la estrategia no entra en lo que queda del presupuesto del request (la lineal siempre entra)."""
+    deadline = options.get("deadline")
+    if deadline is None or strategy_name == FALLBACK:
+        return False
+    return time.time() + expected_cost(strategy_name) > deadline
+
+def analyze_metric_ultimate(history_df, min_val, max_val, cache_key=None, linear_fit=None, options=None):
+    options = options or DEFAULT_OPTIONS
+    # Metadatos internos (caché, fallback, tiempos por etapa); se retiran antes de responder
+    meta = {"timings": {}, "modelCache": None, "fallback": None}
+    timings = meta["timings"]
+
     # 1. Limpieza
     if history_df['ds'].dt.tz is not None:
         history_df['ds'] = history_df['ds'].dt.tz_localize(None)
 
     duration_hours = (history_df['ds'].max() - history_df['ds'].min()).total_seconds() / 3600
     historical_max = history_df['y'].max()
-    anchor_val = get_smart_anchor(history_df)
+    with stage(timings, "anchor"):
+        anchor_val = get_smart_anchor(history_df)
     
     # 2. Ejecución de Estrategia Predictiva
-    chart_future = None
+    forecast = None
     predicted_val = anchor_val
     strategy_name = "linear"
 
-    if duration_hours >= 6:
-        res = analyze_prophet_high_res(history_df, min_val, max_val, historical_max, anchor_val)
-        if res:
-            chart_future, predicted_val, strategy_name = res
+    auto_name = AUTO_STRATEGY or (lambda: auto_strategy(to_epoch_seconds(history_df['ds']), history_df['y'].to_numpy()))
+    with stage(timings, "select"):
+        strategy, meta["fallback"] = select_strategy(options["strategy"], duration_hours, auto_name)
+    ctx = {
+        "historical_max": historical_max,
+        "cache_key": cache_key,
+        "linear_fit": linear_fit,
+        "meta": meta,
+        "options": options,
+        "over_budget": over_budget(strategy.name, options),
+    }
+    start = time.perf_counter()
+    res = strategy.fn(history_df, min_val, max_val, anchor_val, ctx)
+    if res:
+        forecast, predicted_val, strategy_name = res
+    if ctx["over_budget"]:
+        # Degradada si se usó la lineal por el presupuesto o un pronóstico en caché desactualizado
+        if meta["fallback"] == "budget" or meta["modelCache"] == "stale":
+            meta["degraded"] = strategy.name
+    elif res and meta["modelCache"] != "hit":
+        record_strategy_cost(strategy.name, time.perf_counter() - start)
     
-    if chart_future is None:
-        chart_future, predicted_val, strategy_name = analyze_linear_high_res(history_df, min_val, max_val, anchor_val)
+    if forecast is None:
+        with stage(timings, "linear"):
+            forecast, predicted_val, strategy_name = analyze_linear_high_res(history_df, min_val, max_val, anchor_val, linear_fit)
 
     # 3. Procesamiento de Historia (FUSIÓN: Todo el pasado + Downsampling)
     # Aquí usamos 'downsample_history' para traer TODA la data visualmente, 
     # no solo las últimas 6 horas.
-    past_visual = downsample_history(history_df, target_points=200)
-    
-    final_chart = []
-    for _, row in past_visual.iterrows():
-        final_chart.append({
-            "timestamp": row['ds'].isoformat(),
-            "value": round(float(row['y']), 2),
-            "confidenceLow": round(float(row['y']), 2), # En el pasado no hay duda
-            "confidenceHigh": round(float(row['y']), 2),
-            "isFuture": False
-        })
+    with stage(timings, "downsample"):
+        past_ds, past_y = downsample_history(history_df, options["points"], options["downsample"])
     
-    # Unir Futuro
-    final_chart.extend(chart_future)
+    # Unir Futuro (se serializa recién al responder, según el formato pedido)
+    with stage(timings, "chart"):
+        final_chart = chart_series(past_ds, past_y, forecast)
 
     # 4. Métricas Finales
     slope, trend = calculate_trend_metrics(anchor_val, predicted_val, 24)
     volatility = history_df['y'].std() / history_df['y'].mean() if history_df['y'].mean() != 0 else 0
 
-    # RUL Calculation (Iterativo sobre alta resolución)
-    rul_hours = None
-    last_ts = history_df.iloc[-1]['ds']
-    
-    for point in chart_future:
-        val = point['value']
-        ts = datetime.fromisoformat(point['timestamp'])
-        
-        if (max_val is not None and val >= max_val) or \
-           (min_val is not None and val <= min_val):
-            
-            delta = (ts - last_ts).total_seconds() / 3600
-            rul_hours = max(0.1, round(delta, 1))
-            break 
+    # RUL: primer cruce de límites sobre los arrays numéricos del pronóstico
+    last_ts = history_df['ds'].iloc[-1]
+    rul_hours = first_crossing_hours(forecast["ds"], forecast["value"], last_ts, min_val, max_val)
 
     # Estado
-    status = "ok"
-    if max_val is not None:
-        if anchor_val > max_val: status = "critical"
-        elif predicted_val > max_val: status = "warning"
-    if min_val is not None:
-        if anchor_val < min_val: status = "critical"
-        elif predicted_val < min_val: status = "warning"
+    status = evaluate_status(anchor_val, predicted_val, min_val, max_val)
 
-    return {
+    analysis = {
         "status": status,
         "currentValue": round(anchor_val, 2),
         "predictedValue24h": round(predicted_val, 2),
@@ -287,27 +598,99 @@ def analyze_metric_ultimate(history_df, min_val, max_val):
         "rulHours": rul_hours,
         "strategy": strategy_name,
         "recommendation": generate_recommendation(status, trend, rul_hours, strategy_name, volatility),
-        "chartData": final_chart
+        "chartData": final_chart,
+        "_meta": meta
     }
+    if meta.get("degraded"):
+        # Qué se pidió y qué se entregó: "stale" = pronóstico en caché de una historia anterior
+        analysis["degraded"] = {"reason": "budget", "requested": meta["degraded"], "modelCache": meta["modelCache"]}
+    return analysis
 
 # ==========================================
-# 6. ENDPOINT API
+# 6. EJECUCIÓN PARALELA (Process Pool)
 # ==========================================
 
-@app.post("/analyze")
-def analyze_sensors(payload: List[MachineData]):
-    reports = []
-    
-    for item in payload:
-        sensor_id = item.config.sensorId
-        readings = item.readings
-        metrics_config = item.config.metricsConfig
+# Cada proceso hijo tiene su propia caché de modelos (y su historial de costos, ver
+# `strategy_costs`): por eso no es un pool común sino un proceso por lugar, y cada
+# (sensor, métrica) va siempre al mismo. Así los aciertos y warm starts de Prophet no
+# dependen de qué hijo tomó la tarea; a cambio, dos métricas pesadas pueden caer juntas.
+_executors = None
 
-        if not readings: continue
+def get_worker_count():
+    if ANALYZE_WORKERS <= 0:
+        return os.cpu_count() or 1
+    return ANALYZE_WORKERS
 
-        sensor_report = { "sensorId": sensor_id, "resumen": {}, "chartData": {} }
-        
-        # Procesamiento de datos crudos
+def get_executors():
+    """Crea los procesos la primera vez que se necesitan y los reutiliza."""
+    global _executors
+    if _executors is None:
+        context = multiprocessing.get_context(ANALYZE_START_METHOD)
+        _executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(get_worker_count())]
+    return _executors
+
+def executor_for(task):
+    """El proceso que le toca a la tarea: fijo por clave de caché (o por sensor y métrica)."""
+    sensor_id, metric_name, cache_key = task[0], task[1], task[5]
+    key = repr(cache_key if cache_key is not None else (sensor_id, metric_name))
+    executors = get_executors()
+    return executors[zlib.crc32(key.encode()) % len(executors)]
+
+def shutdown_executors():
+    global _executors
+    if _executors is not None:
+        for executor in _executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors = None
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    job_store.shutdown()
+    shutdown_executors()
+
+def run_metric_task(task):
+    """
+    Unidad de trabajo independiente: (sensor, métrica) -> análisis.
+    Vive a nivel de módulo para poder serializarse hacia los procesos hijos.
+    """
+    sensor_id, metric_name, df_metric, min_val, max_val, cache_key, linear_fit, options = task
+    try:
+        start = time.perf_counter()
+        analysis = analyze_metric_ultimate(df_metric, min_val, max_val, cache_key, linear_fit, options)
+        analysis["_meta"]["seconds"] = time.perf_counter() - start
+        return analysis
+    except Exception as e:
+        logger.error(f"❌ Error en {sensor_id} ({metric_name}): {e}")
+        return None
+
+def run_metric_tasks(tasks):
+    """Ejecuta las tareas en serie o en el pool, devolviendo resultados en el mismo orden."""
+    workers = get_worker_count()
+    if workers <= 1 or len(tasks) <= 1:
+        return [run_metric_task(t) for t in tasks]
+
+    futures = [executor_for(t).submit(run_metric_task, t) for t in tasks]
+    return [future.result() for future in futures]
+
+def iter_metric_tasks(tasks):
+    """Como `run_metric_tasks`, pero entrega (índice, análisis) a medida que cada tarea termina."""
+    if get_worker_count() <= 1 or len(tasks) <= 1:
+        for i, t in enumerate(tasks):
+            yield i, run_metric_task(t)
+        return
+
+    futures = {executor_for(t).submit(run_metric_task, t): i for i, t in enumerate(tasks)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+# ==========================================
+# 7. APLANADO DE DATOS (Filas o Columnas -> df_main)
+# ==========================================
+
+def frame_from_readings(readings, timings=None):
+    """Formato clásico: una lista de `Reading` con métricas anidadas por categoría."""
+    timings = {} if timings is None else timings
+    with stage(timings, "flatten"):
         flat_data = []
         for r in readings:
             # Normalizar formato fecha
@@ -319,50 +702,1066 @@ def analyze_sensors(payload: List[MachineData]):
             flat_data.append(row)
         
         df_main = pd.DataFrame(flat_data)
-        if df_main.empty: continue
-        
-        try:
+    if df_main.empty: return None
+    
+    try:
+        with stage(timings, "to_datetime"):
             df_main['ds'] = pd.to_datetime(df_main['ds'])
-        except Exception:
+    except Exception:
+        return None
+
+    # Ordenar cronológicamente es vital
+    with stage(timings, "sort"):
+        return df_main.sort_values("ds")
+
+def parse_timestamps(timestamps):
+    """Epoch en milisegundos (números) o ISO 8601 (strings) -> datetime64 sin zona."""
+    raw = np.asarray(timestamps)
+    if raw.dtype.kind in "iuf":
+        return pd.to_datetime(raw, unit="ms").to_numpy()
+    return pd.to_datetime(raw, utc=True).tz_localize(None).to_numpy()
+
+def frame_from_columns(timestamps, columns, timings=None):
+    """
+    Formato columnar: un array de timestamps y un array de valores por `categoria__metrica`.
+    Se carga directo a NumPy, sin crear un objeto por lectura.
+    """
+    timings = {} if timings is None else timings
+    if not timestamps: return None
+    try:
+        with stage(timings, "to_datetime"):
+            ds = parse_timestamps(timestamps)
+    except Exception:
+        return None
+
+    with stage(timings, "flatten"):
+        data = {"ds": ds}
+        for col_key, values in columns.items():
+            if values is None or len(values) != len(ds): continue
+            try:
+                # None -> NaN al convertir con dtype float
+                data[col_key] = np.asarray(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                continue
+
+        df_main = pd.DataFrame(data, copy=False)
+
+    # Ordenar cronológicamente solo si hace falta
+    if not df_main['ds'].is_monotonic_increasing:
+        with stage(timings, "sort"):
+            df_main = df_main.sort_values("ds")
+    return df_main
+
+def frame_from_arrays(ts_ms, columns):
+    """
+    Modo de baja memoria: los arrays ya vienen contiguos y ordenados (ver lowmem.py);
+    el DataFrame los envuelve sin copiar.
+    """
+    data = {"ds": ts_ms.astype("datetime64[ms]").astype("datetime64[ns]")}
+    data.update(columns)
+    return pd.DataFrame(data, copy=False)
+
+def metric_view(ds, values):
+    """(ds, y) de una métrica: vista directa si no tiene huecos; si los tiene, solo sus filas válidas."""
+    valid = ~np.isnan(values)
+    if not valid.all():
+        ds, values = ds[valid], values[valid]
+    return pd.DataFrame({"ds": ds, "y": values}, copy=False)
+
+# ==========================================
+# 8. ENDPOINT API
+# ==========================================
+
+# Opciones que cambian el contenido del reporte (las demás, como `timings`, no)
+REPORT_OPTION_KEYS = ("downsample", "points", "resample", "agg", "fast", "strategy")
+
+def report_nbytes(sensor_report):
+    """Tamaño aproximado de un reporte: domina el chartData (arrays NumPy)."""
+    size = 1024
+    for charts in sensor_report["chartData"].values():
+        for chart in charts:
+            size += 512 + sum(values.nbytes for values in chart["data"].values())
+    return size
+
+report_cache = LRUCache(REPORT_CACHE_SIZE, REPORT_CACHE_TTL_S, max_bytes=REPORT_CACHE_MAX_BYTES, sizeof=report_nbytes)
+report_flights = SingleFlight()
+
+def report_key(sensor_id, metrics_config, df_main, options):
+    """Hash del contenido: sensorId, config por métrica (límites, estrategia), opciones y la ventana de lecturas."""
+    h = hashlib.blake2b(digest_size=16)
+    limits = [
+        [category, [[metric_name, config.min, config.max, config.strategy] for metric_name, config in metrics.items()]]
+        for category, metrics in metrics_config.items()
+    ]
+    h.update(json.dumps([sensor_id, limits, [options[k] for k in REPORT_OPTION_KEYS]]).encode())
+    h.update(np.asarray(df_main['ds'], dtype="datetime64[ns]").tobytes())
+    for category, metrics in metrics_config.items():
+        for metric_name in metrics:
+            col_key = f"{category}__{metric_name}"
+            if col_key not in df_main.columns: continue
+            h.update(col_key.encode())
+            h.update(df_main[col_key].to_numpy(dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def plan_sensor(sensor_id, metrics_config, df_main, tasks, task_slots, options, low_memory=False):
+    """
+    Crea el esqueleto del reporte de un sensor y encola sus tareas (sensor, métrica).
+    Con `low_memory` se evitan las copias del DataFrame completo (ver /analyze/lowmem).
+    """
+    sensor_report = { "sensorId": sensor_id, "resumen": {}, "chartData": {} }
+
+    # Regresión lineal de todas las métricas del sensor en una sola operación matricial
+    metric_cols = [
+        f"{category}__{metric_name}"
+        for category, metrics in metrics_config.items()
+        for metric_name in metrics
+        if f"{category}__{metric_name}" in df_main.columns
+    ]
+    linear_fits = {}
+    if metric_cols and low_memory:
+        # Una columna a la vez: sin la matriz float64 (lecturas x métricas)
+        ts_num = to_epoch_seconds(df_main['ds'])
+        for col in metric_cols:
+            slopes, stds, counts = fit_linear_batch(ts_num, df_main[col].to_numpy())
+            linear_fits[col] = (slopes[0], stds[0], counts[0])
+    elif metric_cols:
+        slopes, stds, counts = fit_linear_batch(to_epoch_seconds(df_main['ds']), df_main[metric_cols].to_numpy(dtype=np.float64))
+        linear_fits = {col: (slopes[i], stds[i], counts[i]) for i, col in enumerate(metric_cols)}
+
+    for category, metrics in metrics_config.items():
+        if category not in sensor_report["resumen"]:
+            sensor_report["resumen"][category] = {}
+            sensor_report["chartData"][category] = []
+
+        for metric_name, config in metrics.items():
+            col_key = f"{category}__{metric_name}"
+            if col_key not in df_main.columns: continue
+            if not is_known(config.strategy):
+                raise HTTPException(status_code=422, detail=f"Estrategia desconocida para {category}.{metric_name}: {config.strategy}")
+
+            # DataFrame específico para esta métrica
+            if low_memory:
+                df_metric = metric_view(df_main['ds'].to_numpy(), df_main[col_key].to_numpy())
+            else:
+                df_metric = df_main[['ds', col_key]].rename(columns={col_key: 'y'}).dropna()
+            
+            if len(df_metric) < 2: continue
+
+            # --- ANÁLISIS PRINCIPAL (diferido) ---
+            cache_key = (sensor_id, category, metric_name, config.min, config.max, options["resample"], options["agg"], options["fast"])
+            # La estrategia de la config de la métrica manda sobre la del request
+            metric_options = options if config.strategy in (None, AUTO) else {**options, "strategy": config.strategy}
+            tasks.append((sensor_id, metric_name, df_metric, config.min, config.max, cache_key, linear_fits[col_key], metric_options))
+            task_slots.append((sensor_report, category, metric_name))
+
+    return sensor_report
+
+def plan_memoized(reports, sensor_id, metrics_config, df_main, tasks, task_slots, options, stats, low_memory=False):
+    """
+    Planifica un sensor pasando antes por la caché de reportes:
+    - hit: se reutiliza el reporte ya calculado para la misma ventana.
+    - otro request ya lo está calculando: se deja un lugar y se espera su resultado
+      después de correr las tareas propias (ver `resolve_followers`).
+    - si no: se planifica normalmente y el reporte se publica al terminar.
+    """
+    memo = stats.get("memo")
+    if memo is None:
+        reports.append(plan_sensor(sensor_id, metrics_config, df_main, tasks, task_slots, options, low_memory))
+        return
+
+    key = report_key(sensor_id, metrics_config, df_main, options)
+    cached = report_cache.get(key)
+    if cached is not None:
+        stats["reportCache"]["hits"] += 1
+        reports.append(cached)
+        return
+
+    stats["reportCache"]["misses"] += 1
+    if key in memo["keys"]:
+        # El mismo sensor repetido en este request: calcularlo de nuevo es más simple que esperarse a sí mismo
+        reports.append(plan_sensor(sensor_id, metrics_config, df_main, tasks, task_slots, options, low_memory))
+        return
+
+    flight, leader = report_flights.claim(key)
+    if not leader:
+        stats["reportCache"]["misses"] -= 1
+        placeholder = {"sensorId": sensor_id}
+        memo["followers"].append((len(reports), flight, (sensor_id, metrics_config, df_main, low_memory)))
+        memo["placeholders"].add(id(placeholder))
+        reports.append(placeholder)
+        return
+
+    try:
+        sensor_report = plan_sensor(sensor_id, metrics_config, df_main, tasks, task_slots, options, low_memory)
+    except BaseException:
+        # Sin esto la clave queda reclamada y los demás esperan el timeout completo
+        report_flights.publish(key, flight, None)
+        raise
+    memo["keys"].add(key)
+    memo["leaders"][id(sensor_report)] = (key, flight)
+    reports.append(sensor_report)
+
+def publish_report(stats, sensor_report, complete=True):
+    """Guarda el reporte terminado (si no falló ninguna métrica) y despierta a quienes lo esperan."""
+    memo = stats.get("memo")
+    entry = memo["leaders"].pop(id(sensor_report), None) if memo else None
+    if entry is None:
+        return
+    key, flight = entry
+    if complete:
+        report_cache.put(key, sensor_report)
+    report_flights.publish(key, flight, sensor_report)
+
+def release_reports(stats):
+    """Si el run se corta, los que esperaban calculan por su cuenta en vez de esperar el timeout."""
+    memo = stats.get("memo")
+    if not memo:
+        return
+    # Copia: puede correr en paralelo con el generador de /analyze/stream que publica
+    leaders = list(memo["leaders"].values())
+    memo["leaders"].clear()
+    for key, flight in leaders:
+        report_flights.publish(key, flight, None)
+
+@contextmanager
+def releasing_on_error(stats):
+    """Si la planificación falla a mitad del payload, suelta las claves ya reclamadas por este request."""
+    try:
+        yield
+    except BaseException:
+        release_reports(stats)
+        raise
+
+class FlightStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que suelta las claves del request al terminar pase lo que pase:
+    si el cliente se desconecta antes del primer byte, el generador nunca corre y su
+    `finally` no alcanza.
+    """
+
+    def __init__(self, content, stats, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            release_reports(self.stats)
+
+def resolve_followers(reports, options, stats):
+    """Completa los sensores que calculaba otro request; si ese cálculo falló, se hacen aquí."""
+    memo = stats.get("memo")
+    if not memo:
+        return
+    followers, memo["followers"] = memo["followers"], []
+    for index, flight, (sensor_id, metrics_config, df_main, low_memory) in followers:
+        sensor_report = report_flights.wait(flight, REPORT_FLIGHT_TIMEOUT_S)
+        if sensor_report is not None:
+            stats["reportCache"]["shared"] += 1
+        else:
+            stats["reportCache"]["misses"] += 1
+            tasks, task_slots = [], []
+            sensor_report = plan_sensor(sensor_id, metrics_config, df_main, tasks, task_slots, options, low_memory)
+            attach_results(task_slots, run_metric_tasks(tasks), stats)
+        reports[index] = sensor_report
+        yield sensor_report
+
+def new_run_stats(memo=True):
+    """
+    Acumulados de un request: resultados de las cachés y segundos por etapa.
+    Con `memo`, además lleva qué reportes calcula este request para otros y cuáles espera.
+    """
+    stats = {
+        "modelCache": {"hits": 0, "warmStarts": 0, "misses": 0, "stale": 0},
+        "reportCache": {"hits": 0, "shared": 0, "misses": 0},
+        "degraded": 0,
+        "timings": {},
+    }
+    if memo and REPORT_CACHE_SIZE > 0:
+        stats["memo"] = {"keys": set(), "leaders": {}, "followers": [], "placeholders": set()}
+    return stats
+
+def record_stage(stats, name, seconds):
+    stats["timings"][name] = stats["timings"].get(name, 0.0) + seconds
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+def record_stages(stats, timings):
+    for name, seconds in timings.items():
+        record_stage(stats, name, seconds)
+
+def attach_analysis(sensor_report, category, metric_name, analysis, stats):
+    meta = analysis.pop("_meta")
+    cache_counts = stats["modelCache"]
+    outcome = meta["modelCache"]
+    if outcome == "hit": cache_counts["hits"] += 1
+    elif outcome == "warm": cache_counts["warmStarts"] += 1
+    elif outcome == "miss": cache_counts["misses"] += 1
+    elif outcome == "stale": cache_counts["stale"] += 1
+    if meta.get("degraded"):
+        stats["degraded"] += 1
+        DEGRADED_TOTAL.inc(strategy=meta["degraded"])
+
+    # Los tiempos por etapa viajan dentro del análisis: así funcionan también desde el pool
+    record_stages(stats, meta["timings"])
+    strategy = analysis["strategy"]
+    STRATEGY_TOTAL.inc(strategy=strategy)
+    STRATEGY_SECONDS.observe(meta.get("seconds", 0.0), strategy=strategy)
+    if meta["fallback"]:
+        FALLBACK_TOTAL.inc(reason=meta["fallback"])
+
+    # Extraer chartData para reducir peso del JSON de resumen
+    chart_series = analysis.pop("chartData")
+    
+    sensor_report["resumen"][category][metric_name] = analysis
+    sensor_report["chartData"][category].append({
+        "metric": metric_name, 
+        "data": chart_series
+    })
+
+def finish_result(reports, stats, options):
+    SENSORS_TOTAL.inc(len(reports))
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "report": reports,
+        "modelCache": stats["modelCache"],
+        "reportCache": stats["reportCache"],
+    }
+    if options.get("budget_ms"):
+        result["budget"] = {"ms": options["budget_ms"], "degradedMetrics": stats["degraded"]}
+    if options.get("timings"):
+        result["timings"] = {name: round(seconds * 1000, 3) for name, seconds in stats["timings"].items()}
+    return result
+
+def attach_results(task_slots, analyses, stats):
+    """
+    Incorpora cada análisis a su reporte. Devuelve los ids de reportes incompletos
+    (alguna métrica falló o salió degradada): esos no se guardan en la caché de reportes.
+    """
+    failed = set()
+    for (sensor_report, category, metric_name), analysis in zip(task_slots, analyses):
+        if analysis is None:
+            METRIC_ERRORS.inc()
+            failed.add(id(sensor_report))
             continue
+        if "degraded" in analysis:
+            failed.add(id(sensor_report))
+        attach_analysis(sensor_report, category, metric_name, analysis, stats)
+    return failed
 
-        # Ordenar cronológicamente es vital
-        df_main = df_main.sort_values("ds")
+def execute_planned(reports, tasks, task_slots, options, stats):
+    """Corre las tareas, arma los reportes, los publica en la caché y completa los que calculó otro request."""
+    try:
+        start = time.perf_counter()
+        analyses = run_metric_tasks(tasks)
+        record_stage(stats, "analysis_wall", time.perf_counter() - start)
+
+        failed = attach_results(task_slots, analyses, stats)
+        for sensor_report in reports:
+            publish_report(stats, sensor_report, id(sensor_report) not in failed)
+    finally:
+        release_reports(stats)
+
+    for _ in resolve_followers(reports, options, stats): pass
+
+def run_planned(reports, tasks, task_slots, options=None, stats=None):
+    """Ejecuta las tareas y reensambla los resultados en el orden original del payload."""
+    options = options or DEFAULT_OPTIONS
+    stats = stats or new_run_stats(memo=False)
+    execute_planned(reports, tasks, task_slots, options, stats)
+    return finish_result(reports, stats, options)
+
+def iter_planned(reports, tasks, task_slots, stats, options=None):
+    """
+    Entrega cada `sensor_report` en cuanto terminan todas sus métricas,
+    sin esperar al resto del payload. Los sensores salen en orden de finalización;
+    dentro de cada sensor, las métricas conservan el orden de la configuración.
+    """
+    sensor_tasks = {id(r): [] for r in reports}
+    for i, (sensor_report, _, _) in enumerate(task_slots):
+        sensor_tasks[id(sensor_report)].append(i)
+    pending = {key: len(indices) for key, indices in sensor_tasks.items()}
+    placeholders = stats["memo"]["placeholders"] if "memo" in stats else set()
+
+    try:
+        for sensor_report in reports:
+            if pending[id(sensor_report)] == 0 and id(sensor_report) not in placeholders:
+                publish_report(stats, sensor_report)
+                yield sensor_report
+
+        results = {}
+        for i, analysis in iter_metric_tasks(tasks):
+            sensor_report = task_slots[i][0]
+            results[i] = analysis
+
+            pending[id(sensor_report)] -= 1
+            if pending[id(sensor_report)] > 0: continue
 
-        if len(df_main) < 2: continue 
+            indices = sensor_tasks[id(sensor_report)]
+            failed = attach_results([task_slots[j] for j in indices], [results.pop(j) for j in indices], stats)
+            publish_report(stats, sensor_report, not failed)
+            yield sensor_report
+    finally:
+        release_reports(stats)
 
-        for category, metrics in metrics_config.items():
-            if category not in sensor_report["resumen"]:
-                sensor_report["resumen"][category] = {}
-                sensor_report["chartData"][category] = []
+    yield from resolve_followers(reports, options or DEFAULT_OPTIONS, stats)
 
+def plan_rows(payload, options, stats=None):
+    stats = stats or new_run_stats(memo=False)
+    timings = {}
+    reports = []
+    tasks = []
+    task_slots = []
+    
+    with releasing_on_error(stats):
+        for item in payload:
+            if not item.readings: continue
+
+            df_main = frame_from_readings(item.readings, timings)
+            if df_main is None or len(df_main) < 2: continue 
+
+            with stage(timings, "plan"):
+                plan_memoized(reports, item.config.sensorId, item.config.metricsConfig, df_main, tasks, task_slots, options, stats)
+
+    record_stages(stats, timings)
+    return reports, tasks, task_slots
+
+def parse_sensor_config(raw, index):
+    """
+    Valida la config de un sensor que no pasó por el modelo de FastAPI (columnar/lowmem):
+    si es inválida responde el mismo 422 que /analyze, con la ubicación dentro del body.
+    """
+    try:
+        return SensorConfig.model_validate(raw)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", index, "config", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+
+def plan_columnar(payload, options, stats=None):
+    stats = stats or new_run_stats(memo=False)
+    timings = {}
+    reports = []
+    tasks = []
+    task_slots = []
+
+    with releasing_on_error(stats):
+        for index, item in enumerate(payload):
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=422, detail=f"Se esperaba un objeto por sensor (posición {index})")
+            config = parse_sensor_config(item.get("config"), index)
+            timestamps = item.get("timestamps") or []
+            columns = item.get("columns") or {}
+
+            df_main = frame_from_columns(timestamps, columns, timings)
+            if df_main is None or len(df_main) < 2: continue
+
+            with stage(timings, "plan"):
+                plan_memoized(reports, config.sensorId, config.metricsConfig, df_main, tasks, task_slots, options, stats)
+
+    record_stages(stats, timings)
+    return reports, tasks, task_slots
+
+def with_deadline(options, elapsed=0.0):
+    """Fija el deadline absoluto (epoch, válido también en los procesos del pool) a partir de `budget_ms`."""
+    if not options.get("budget_ms"):
+        return {**options, "deadline": None}
+    return {**options, "deadline": time.time() + options["budget_ms"] / 1000 - elapsed}
+
+def analysis_options(
+    request: Request,
+    downsample: Literal["uniform", "lttb", "minmax"] = Query("uniform", description="Reducción de la historia del gráfico"),
+    points: int = Query(200, ge=10, le=5000, description="Puntos de historia por métrica"),
+    timings: bool = Query(False, description="Incluir el desglose de tiempos por etapa en la respuesta"),
+    resample: str = Query(PROPHET_RESAMPLE, description="Grilla de pre-agregación para Prophet (ej. 10min); vacío = lecturas crudas"),
+    agg: Literal["mean", "min", "max"] = Query(PROPHET_AGG, description="Agregación por bucket de la grilla"),
+    fast: bool = Query(PROPHET_FAST, description="Prophet sin simulación de incertidumbre (intervalos analíticos)"),
+    strategy: str = Query(AUTO, description="Estrategia para las métricas sin estrategia en su config"),
+    budget_ms: float = Query(ANALYZE_BUDGET_MS, ge=0, description="Presupuesto de latencia en ms; agotado, se degrada a caché o lineal (0 = sin límite)"),
+):
+    """Opciones por request, comunes a todos los endpoints de análisis."""
+    if not is_known(strategy):
+        raise HTTPException(status_code=422, detail=f"Estrategia desconocida: {strategy}")
+    if resample:
+        try:
+            pd.tseries.frequencies.to_offset(resample)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Frecuencia de resample inválida: {resample}")
+    options = {
+        "downsample": downsample, "points": points, "timings": timings,
+        "resample": resample, "agg": agg, "fast": fast, "strategy": strategy,
+        "budget_ms": budget_ms,
+    }
+    # El presupuesto corre desde que llegó el request (incluye leer y validar el cuerpo)
+    return with_deadline(options, elapsed_since_received(request))
+
+def respond(result, accept, stats=None):
+    """Negociación de contenido: JSON por filas (default), JSON columnar o MessagePack."""
+    start = time.perf_counter()
+    try:
+        response = encode_result(result, accept)
+    except NotAcceptable:
+        raise HTTPException(status_code=406, detail="Formatos soportados: application/json, application/vnd.ingenio.columnar+json, application/msgpack")
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="encode")
+
+    if stats is not None and "timings" in result:
+        # El encode no puede ir dentro del cuerpo que está serializando: va en Server-Timing
+        record_stage(stats, "encode", time.perf_counter() - start)
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in stats["timings"].items()
+        )
+    return response
+
+@app.post("/analyze")
+def analyze_sensors(request: Request, payload: List[MachineData], options: dict = Depends(analysis_options), accept: Optional[str] = Header(None)):
+    stats = new_run_stats()
+    record_stage(stats, "parse_validate", elapsed_since_received(request))
+    result = run_planned(*plan_rows(payload, options, stats), options, stats)
+    return respond(result, accept, stats)
+
+def analyze_columnar_payload(payload, options, stats):
+    return run_planned(*plan_columnar(payload, options, stats), options, stats)
+
+@app.post("/analyze/columnar")
+async def analyze_sensors_columnar(request: Request, options: dict = Depends(analysis_options), accept: Optional[str] = Header(None)):
+    """
+    Variante columnar de /analyze. Cuerpo:
+    [{ "config": SensorConfig,
+       "timestamps": [epoch_ms | ISO 8601, ...],
+       "columns": { "categoria__metrica": [valor | null, ...] } }]
+    Solo se valida `config` con Pydantic; las series van directo a NumPy.
+    """
+    stats = new_run_stats()
+    try:
+        with stage(stats["timings"], "parse_validate"):
+            payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Se esperaba una lista de sensores")
+
+    result = await run_in_threadpool(analyze_columnar_payload, payload, options, stats)
+    return respond(result, accept, stats)
+
+@app.post("/analyze/stream")
+def analyze_sensors_stream(payload: List[MachineData], options: dict = Depends(analysis_options)):
+    """
+    Igual que /analyze, pero responde NDJSON: una línea por `sensor_report` en cuanto
+    termina, y una última línea de cierre con `done: true`.
+    """
+    stats = new_run_stats()
+    reports, tasks, task_slots = plan_rows(payload, options, stats)
+
+    def generate():
+        for sensor_report in iter_planned(reports, tasks, task_slots, stats, options):
+            yield dumps_json(render_report(sensor_report, JSON)) + b"\n"
+        closing = finish_result([], stats, options)
+        closing.pop("report")
+        closing["done"] = True
+        yield dumps_json(closing) + b"\n"
+
+    return FlightStreamingResponse(generate(), stats, media_type="application/x-ndjson")
+
+def analyze_lowmem_file(fileobj, options, stats):
+    """Un sensor a la vez: parsear, analizar y soltar sus series antes de leer el siguiente."""
+    timings = {}
+    reports = []
+    sensors = iter_sensors(fileobj, parse_timestamps, options["dtype"])
+    index = 0
+    while True:
+        with stage(timings, "parse_validate"):
+            item = next(sensors, None)
+        if item is None: break
+        raw_config, ts_ms, columns = item
+        config = parse_sensor_config(raw_config, index)
+        index += 1
+        if len(ts_ms) < 2: continue
+
+        df_main = frame_from_arrays(ts_ms, columns)
+        del item, ts_ms, columns
+
+        sensor_reports, tasks, task_slots = [], [], []
+        with stage(timings, "plan"):
+            plan_memoized(sensor_reports, config.sensorId, config.metricsConfig, df_main, tasks, task_slots, options, stats, low_memory=True)
+        del df_main
+        execute_planned(sensor_reports, tasks, task_slots, options, stats)
+        reports.extend(sensor_reports)
+        del tasks, task_slots
+
+    record_stages(stats, timings)
+    return finish_result(reports, stats, options)
+
+@app.post("/analyze/lowmem")
+async def analyze_sensors_lowmem(
+    request: Request,
+    options: dict = Depends(analysis_options),
+    dtype: Literal["float64", "float32"] = Query(LOWMEM_DTYPE, description="Precisión de las series en memoria"),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Variante de memoria acotada para exportaciones muy grandes. Acepta el cuerpo de /analyze
+    o el de /analyze/columnar. El cuerpo se vuelca a un archivo temporal (en RAM hasta
+    LOWMEM_SPOOL_BYTES) y se parsea de forma incremental, un sensor a la vez.
+    """
+    if ijson is None:
+        raise HTTPException(status_code=501, detail="El modo de baja memoria requiere el paquete ijson")
+
+    stats = new_run_stats()
+    with tempfile.SpooledTemporaryFile(max_size=LOWMEM_SPOOL_BYTES) as spool:
+        with stage(stats["timings"], "spool"):
+            async for chunk in request.stream():
+                spool.write(chunk)
+        spool.seek(0)
+        try:
+            result = await run_in_threadpool(analyze_lowmem_file, spool, {**options, "dtype": dtype}, stats)
+        except JSONError as e:
+            raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+    return respond(result, accept, stats)
+
+# ==========================================
+# 9. TRABAJOS ASÍNCRONOS (submit / status / result)
+# ==========================================
+
+job_store = JobStore(max_workers=JOB_WORKERS, ttl_s=JOB_TTL_S)
+
+def check_strategies(payload):
+    """Valida en el submit lo que plan_sensor rechazaría con 422, para no aceptar un trabajo que va a fallar."""
+    for item in payload:
+        for category, metrics in item.config.metricsConfig.items():
             for metric_name, config in metrics.items():
-                col_key = f"{category}__{metric_name}"
-                if col_key not in df_main.columns: continue
+                if not is_known(config.strategy):
+                    raise HTTPException(status_code=422, detail=f"Estrategia desconocida para {category}.{metric_name}: {config.strategy}")
 
-                # DataFrame específico para esta métrica
-                df_metric = df_main[['ds', col_key]].rename(columns={col_key: 'y'}).dropna()
-                
-                if len(df_metric) < 2: continue
-
-                try:
-                    # --- ANÁLISIS PRINCIPAL ---
-                    analysis = analyze_metric_ultimate(df_metric, config.min, config.max)
-                    
-                    # Extraer chartData para reducir peso del JSON de resumen
-                    chart_points = analysis.pop("chartData")
-                    
-                    sensor_report["resumen"][category][metric_name] = analysis
-                    sensor_report["chartData"][category].append({
-                        "metric": metric_name, 
-                        "data": chart_points
-                    })
-                except Exception as e:
-                    print(f"❌ Error en {sensor_id} ({metric_name}): {e}")
-
-        reports.append(sensor_report)
-
-    return { "timestamp": datetime.now().isoformat(), "report": reports }
+@app.post("/jobs", status_code=202)
+def submit_analysis_job(payload: List[MachineData], options: dict = Depends(analysis_options)):
+    check_strategies(payload)
+
+    def run(on_progress, on_plan):
+        # Se planifica (y se reclaman las claves de la caché de reportes) recién cuando el trabajo
+        # empieza: uno encolado no hace esperar a los /analyze idénticos. El presupuesto también
+        # corre desde acá, no desde el submit.
+        stats = new_run_stats()
+        run_options = with_deadline(options)
+        reports, tasks, task_slots = plan_rows(payload, run_options, stats)
+        on_plan(len(reports))
+        for sensor_report in iter_planned(reports, tasks, task_slots, stats, run_options):
+            on_progress(sensor_report)
+        return finish_result(reports, stats, options)
+
+    job_id = job_store.submit(run, total=sum(1 for item in payload if len(item.readings) >= 2))
+    return job_store.status(job_id)
+
+@app.get("/jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    status = job_store.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return status
+
+@app.get("/jobs/{job_id}/result")
+def get_analysis_job_result(job_id: str, accept: Optional[str] = Header(None)):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "done":
+        # Aún en curso: el cliente debe seguir consultando
+        return JSONResponse(status_code=202, content=job_store.status(job_id))
+    return respond(job["result"], accept)
+
+# ==========================================
+# 10. MODO STREAMING (Estado incremental por lectura)
+# ==========================================
+
+stream_store = StreamStore(span=5)
+
+def analyze_stream_state(state, min_val, max_val, include_chart=False):
+    """Mismo resumen que la estrategia lineal, pero desde el estado acumulado (sin historia)."""
+    anchor_val = state.ewma
+    last_ts = np.datetime64(int(round(state.last_ts * 1e9)), "ns")
+
+    forecast, predicted_val = linear_forecast(last_ts, anchor_val, state.slope, state.std, state.n)
+    slope, trend = calculate_trend_metrics(anchor_val, predicted_val, 24)
+    std = state.std
+    volatility = std / state.mean_y if state.mean_y != 0 and not np.isnan(std) else 0
+    rul_hours = first_crossing_hours(forecast["ds"], forecast["value"], last_ts, min_val, max_val)
+    status = evaluate_status(anchor_val, predicted_val, min_val, max_val)
+    strategy_name = "linear_streaming"
+
+    analysis = {
+        "status": status,
+        "currentValue": round(anchor_val, 2),
+        "predictedValue24h": round(predicted_val, 2),
+        "trend": trend,
+        "slope": round(slope, 4),
+        "volatility": round(volatility, 3),
+        "rulHours": rul_hours,
+        "strategy": strategy_name,
+        "recommendation": generate_recommendation(status, trend, rul_hours, strategy_name, volatility),
+        "samples": state.n,
+        "min": round(state.min, 2),
+        "max": round(state.max, 2),
+        # UTC sin zona, como el resto de los timestamps (utcfromtimestamp está deprecado)
+        "lastTimestamp": datetime.fromtimestamp(state.last_ts, tz=timezone.utc).replace(tzinfo=None).isoformat(),
+    }
+    if include_chart:
+        analysis["chartData"] = series_to_rows(forecast_series(forecast))
+    return analysis
+
+@app.post("/stream/readings")
+def push_stream_readings(push: StreamPush):
+    """Acumula lecturas nuevas en el estado del sensor. No guarda historia."""
+    accepted, rejected = stream_store.push(push.sensorId, push.readings, push.metricsConfig)
+    return { "sensorId": push.sensorId, "accepted": accepted, "rejected": rejected }
+
+@app.get("/stream/{sensor_id}")
+def get_stream_analysis(sensor_id: str, chart: bool = False):
+    snapshot = stream_store.snapshot(sensor_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Sensor sin lecturas en modo streaming")
+    metrics_config, states = snapshot
+
+    # Sin config conocida se reportan todas las métricas recibidas, sin límites
+    if metrics_config is None:
+        metrics_config = {}
+        for col_key in states:
+            category, metric_name = col_key.split("__", 1)
+            metrics_config.setdefault(category, {})[metric_name] = MetricConfig()
+
+    resumen = {}
+    for category, metrics in metrics_config.items():
+        resumen[category] = {}
+        for metric_name, config in metrics.items():
+            state = states.get(f"{category}__{metric_name}")
+            if state is None or state.n == 0: continue
+            resumen[category][metric_name] = analyze_stream_state(state, config.min, config.max, chart)
+
+    return { "timestamp": datetime.now().isoformat(), "sensorId": sensor_id, "resumen": resumen }
+
+@app.delete("/stream/{sensor_id}")
+def reset_stream_sensor(sensor_id: str):
+    if not stream_store.reset(sensor_id):
+        raise HTTPException(status_code=404, detail="Sensor sin lecturas en modo streaming")
+    return { "sensorId": sensor_id, "reset": True }
+
+# ==========================================
+# 11. HISTORIA EN EL SERVIDOR (Lecturas delta)
+# ==========================================
+
+history_store = HistoryStore(
+    retention_s=HISTORY_RETENTION_S,
+    max_points=HISTORY_MAX_POINTS,
+    max_bytes=HISTORY_MAX_BYTES,
+    spill_dir=HISTORY_SPILL_DIR,
+    dtype=HISTORY_DTYPE,
+)
+
+def readings_to_columns(readings):
+    """Lecturas -> (timestamps epoch ms, {categoria__metrica: valores}) con NaN donde falta el dato."""
+    ts = parse_timestamps([r.timestamp for r in readings]).astype("datetime64[ms]").astype(np.int64)
+    columns = {}
+    for i, r in enumerate(readings):
+        for cat, metrics in r.metrics.items():
+            for name, val in metrics.items():
+                if val is None: continue
+                col_key = f"{cat}__{name}"
+                values = columns.get(col_key)
+                if values is None:
+                    values = columns[col_key] = np.full(len(readings), np.nan)
+                values[i] = float(val)
+    return ts, columns
+
+def append_history(sensor_id, readings, metrics_config=None):
+    if not readings:
+        return 0, 0, (history_store.info(sensor_id) or {}).get("points", 0)
+    try:
+        ts, columns = readings_to_columns(readings)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail=f"Timestamps inválidos para el sensor {sensor_id}")
+    return history_store.append(sensor_id, ts, columns, metrics_config)
+
+def plan_history(payload, options, stats=None):
+    """Como `plan_rows`, pero `readings` trae solo lo nuevo: el resto sale de la historia guardada."""
+    stats = stats or new_run_stats(memo=False)
+    timings = {}
+    reports = []
+    tasks = []
+    task_slots = []
+
+    with releasing_on_error(stats):
+        for item in payload:
+            with stage(timings, "history_append"):
+                append_history(item.config.sensorId, item.readings, item.config.metricsConfig)
+            with stage(timings, "history_frame"):
+                stored = history_store.frame(item.config.sensorId)
+            if stored is None: continue
+            _, df_main = stored
+            if len(df_main) < 2: continue
+
+            with stage(timings, "plan"):
+                plan_memoized(reports, item.config.sensorId, item.config.metricsConfig, df_main, tasks, task_slots, options, stats)
+
+    record_stages(stats, timings)
+    return reports, tasks, task_slots
+
+@app.post("/history/readings")
+def push_history_readings(push: StreamPush):
+    """Agrega lecturas a la historia del sensor (deduplicadas por timestamp) sin analizar."""
+    added, duplicates, points = append_history(push.sensorId, push.readings, push.metricsConfig)
+    return { "sensorId": push.sensorId, "accepted": added, "duplicates": duplicates, "points": points }
+
+@app.post("/analyze/delta")
+def analyze_sensors_delta(request: Request, payload: List[MachineData], options: dict = Depends(analysis_options), accept: Optional[str] = Header(None)):
+    """
+    Igual que /analyze, pero cada sensor envía solo las lecturas nuevas desde su último envío.
+    El análisis usa la historia acumulada en el servidor (ver HISTORY_*).
+    """
+    stats = new_run_stats()
+    record_stage(stats, "parse_validate", elapsed_since_received(request))
+    result = run_planned(*plan_history(payload, options, stats), options, stats)
+    return respond(result, accept, stats)
+
+@app.get("/history/{sensor_id}")
+def get_sensor_history(sensor_id: str):
+    info = history_store.info(sensor_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Sensor sin historia en el servidor")
+    return { "sensorId": sensor_id, **info }
+
+@app.delete("/history/{sensor_id}")
+def reset_sensor_history(sensor_id: str):
+    if not history_store.reset(sensor_id):
+        raise HTTPException(status_code=404, detail="Sensor sin historia en el servidor")
+    return { "sensorId": sensor_id, "reset": True }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Métricas de este proceso en formato de texto de Prometheus."""
+    return Response(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+@telemetry.on_collect
+def collect_model_cache():
+    for field, value in model_cache.stats().items():
+        if isinstance(value, (int, float)):
+            MODEL_CACHE_GAUGE.set(value, field=field)
+
+@telemetry.on_collect
+def collect_report_cache():
+    for field, value in report_cache.stats().items():
+        if isinstance(value, (int, float)):
+            REPORT_CACHE_GAUGE.set(value, field=field)
+
+@telemetry.on_collect
+def collect_history_store():
+    for field, value in history_store.stats().items():
+        HISTORY_GAUGE.set(value, field=field)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Estadísticas de la caché de modelos de este proceso (con pool, cada hijo tiene la suya)."""
+    return { "models": model_cache.stats(), "reports": report_cache.stats(), "history": history_store.stats() }
+
+# ==========================================
+# 12. ANOMALÍAS DE FLOTA (Scoring vectorizado)
+# ==========================================
+
+ANOMALY_METHODS = {"z": "zscore", "mad": "mad", "roc": "rateOfChange"}
+
+def anomaly_options(
+    step: float = Query(ANOMALY_STEP_S, gt=0, description="Tamaño del bucket en segundos"),
+    window: int = Query(ANOMALY_WINDOW, ge=20, le=20000, description="Buckets por serie (línea base + actuales)"),
+    recent: int = Query(ANOMALY_RECENT, ge=1, le=120, description="Últimos buckets evaluados contra la línea base"),
+    limit: int = Query(ANOMALY_LIMIT, ge=1, le=100000, description="Máximo de series en la respuesta"),
+    include_all: bool = Query(False, alias="all", description="Incluir también las series que no superan los umbrales"),
+    timings: bool = Query(False, description="Incluir el desglose de tiempos por etapa en la respuesta"),
+):
+    if window - recent < ANOMALY_MIN_POINTS:
+        raise HTTPException(status_code=422, detail=f"La línea base necesita al menos {ANOMALY_MIN_POINTS} buckets (window - recent)")
+    return { "step": step, "window": window, "recent": recent, "limit": limit, "all": include_all, "timings": timings }
+
+def metric_limits(metrics_config, col_key):
+    """(min, max) configurados para `categoria__metrica`, o (None, None)."""
+    category, _, metric_name = col_key.partition("__")
+    config = (metrics_config or {}).get(category, {}).get(metric_name)
+    if config is None: return None, None
+    if isinstance(config, dict): return config.get("min"), config.get("max")
+    return config.min, config.max
+
+def finite_or_none(value, digits=3):
+    return None if not np.isfinite(value) else round(float(value), digits)
+
+def score_fleet(sources, options):
+    """
+    sources: (sensorId, metricsConfig, ts epoch ms ordenados, {categoria__metrica: valores}).
+    Cada métrica de cada sensor es una fila de una sola matriz; los puntajes se calculan
+    para toda la flota de una vez (ver anomaly.py) y se devuelven ordenados por severidad.
+    """
+    timings = {}
+    step, window, recent = options["step"], options["window"], options["recent"]
+    window_ms = step * window * 1000
+
+    with stage(timings, "anomaly_gather"):
+        labels, series = [], []
+        for sensor_id, metrics_config, ts, columns in sources:
+            if len(ts) == 0: continue
+            start = int(np.searchsorted(ts, ts[-1] - window_ms, side="left"))
+            seconds = ts[start:] / 1000.0
+            for col_key, values in columns.items():
+                labels.append((sensor_id, metrics_config, col_key))
+                series.append((seconds, values[start:]))
+
+    with stage(timings, "anomaly_matrix"):
+        matrix, last_ts = build_matrix(series, step, window)
+    with stage(timings, "anomaly_score"):
+        scores = score_matrix(matrix, recent, ANOMALY_MIN_POINTS)
+        order, score, worst, flags = rank_anomalies(scores, {"z": ANOMALY_Z, "mad": ANOMALY_MAD, "roc": ANOMALY_ROC})
+
+    with stage(timings, "anomaly_rank"):
+        anomalous = int(np.sum(score[order] >= 1))
+        selected = order if options["all"] else order[:anomalous]
+        anomalies = []
+        for row in selected[:options["limit"]]:
+            sensor_id, metrics_config, col_key = labels[row]
+            category, _, metric_name = col_key.partition("__")
+            point = worst[row]
+            value = matrix[row, window - recent + point]
+            low, high = metric_limits(metrics_config, col_key)
+            bucket_ms = (last_ts[row] - (recent - 1 - point) * step) * 1000
+            anomalies.append({
+                "sensorId": sensor_id,
+                "category": category,
+                "metric": metric_name,
+                "score": finite_or_none(score[row]),
+                "anomalous": bool(score[row] >= 1),
+                "methods": [label for name, label in ANOMALY_METHODS.items() if flags[name][row]],
+                "zScore": finite_or_none(scores["z"][row, point]),
+                "madScore": finite_or_none(scores["mad"][row, point]),
+                "rocScore": finite_or_none(scores["roc"][row, point]),
+                "value": finite_or_none(value),
+                "baseline": finite_or_none(scores["median"][row]),
+                "outOfRange": bool((low is not None and value < low) or (high is not None and value > high)),
+                "timestamp": str(np.datetime64(int(bucket_ms), "ms")),
+            })
+
+    evaluated = len(order)
+    ANOMALY_SERIES.inc(anomalous, outcome="anomalous")
+    ANOMALY_SERIES.inc(evaluated - anomalous, outcome="normal")
+    ANOMALY_SERIES.inc(len(series) - evaluated, outcome="insufficient")
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "series": len(series),
+        "evaluated": evaluated,
+        "anomalous": anomalous,
+        "anomalies": anomalies,
+        "params": {
+            "step": step, "window": window, "recent": recent, "minPoints": ANOMALY_MIN_POINTS,
+            "thresholds": {"zscore": ANOMALY_Z, "mad": ANOMALY_MAD, "rateOfChange": ANOMALY_ROC},
+        },
+    }
+    if options["timings"]:
+        result["timings"] = {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+    return result
+
+def payload_sources(payload):
+    """Sensores del request -> fuentes para `score_fleet` (timestamps ordenados)."""
+    for item in payload:
+        if not item.readings: continue
+        try:
+            ts, columns = readings_to_columns(item.readings)
+        except (ValueError, TypeError):
+            continue  # timestamps inválidos: el sensor se omite, como en /analyze
+        if len(ts) > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+            columns = {col_key: values[order] for col_key, values in columns.items()}
+        yield item.config.sensorId, item.config.metricsConfig, ts, columns
+
+@app.post("/anomalies")
+def score_payload_anomalies(payload: List[MachineData], options: dict = Depends(anomaly_options)):
+    """Anomalías actuales de los sensores enviados, ordenadas por severidad (score >= 1 = anómalo)."""
+    return score_fleet(payload_sources(payload), options)
+
+@app.get("/anomalies")
+def score_history_anomalies(options: dict = Depends(anomaly_options)):
+    """
+    Anomalías actuales de toda la flota con historia en el servidor (/history/readings, /analyze/delta).
+    Solo se copia la cola reciente de cada sensor: pensado para correr cada minuto.
+    """
+    window_ms = options["step"] * options["window"] * 1000
+    return score_fleet(history_store.tails(window_ms), options)
+
+# ==========================================
+# 13. ARRANQUE (Warm-up y readiness)
+# ==========================================
+
+readiness = {"ready": False, "pid": os.getpid(), "startedAt": datetime.now().isoformat(), "readyAt": None, "warmup": {}, "error": None}
+
+def warm_up():
+    """
+    Carga el stack de pronóstico y corre cada estrategia una vez sobre una serie sintética,
+    para que el primer request real no pague imports, compilación ni cachés frías.
+    No toca las cachés de modelos ni de reportes (cache_key=None).
+    """
+    timings = {}
+    t = np.arange(2 * 144) * 600.0
+    df = pd.DataFrame({
+        "ds": np.datetime64("2025-01-01T00:00:00", "ns") + (t * 1e9).astype("timedelta64[ns]"),
+        "y": 50 + 2 * np.sin(2 * np.pi * t / 86400) + np.random.default_rng(0).normal(0, 0.3, len(t)),
+    })
+    strategies = ["linear", "holt_winters"] + (["prophet"] if WARMUP_PROPHET else [])
+    for name in strategies:
+        if name == "prophet":
+            with stage(timings, "prophet_import"):
+                get_prophet()
+        with stage(timings, name):
+            options = {**DEFAULT_OPTIONS, "strategy": name, "fast": True}
+            analysis = analyze_metric_ultimate(df.copy(), 0, 100, options=options)
+    with stage(timings, "encode"):
+        analysis.pop("_meta")
+        encode_result({"report": [{"sensorId": "warmup", "resumen": {}, "chartData": {"x": [{"metric": "y", "data": analysis["chartData"]}]}}]}, None)
+    return timings
+
+def run_warm_up():
+    start = time.perf_counter()
+    try:
+        timings = warm_up()
+        readiness["warmup"] = {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+    except Exception as e:
+        # Sin Prophet el servicio igual responde (lineal / Holt-Winters): se informa y se sigue
+        logger.warning(f"⚠️ Warm-up incompleto: {e}")
+        readiness["error"] = str(e)
+    readiness["ready"] = True
+    readiness["readyAt"] = datetime.now().isoformat()
+    logger.info(f"✅ ia-service listo en {time.perf_counter() - start:.1f}s (pid {os.getpid()})")
+
+@app.on_event("startup")
+def start_warm_up():
+    readiness["pid"] = os.getpid()
+    if readiness["ready"]:
+        return  # ya calentado en el proceso padre antes del fork (IA_PRELOAD)
+    if not WARMUP:
+        readiness.update(ready=True, readyAt=datetime.now().isoformat())
+        return
+    # En segundo plano: /health responde mientras tanto y /ready da 503
+    threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+
+@app.get("/health")
+def health():
+    """Liveness: el proceso responde (aunque todavía esté calentando)."""
+    return { "status": "ok" }
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 recién cuando terminó el warm-up; mientras tanto 503."""
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+if IA_PRELOAD and WARMUP:
+    run_warm_up()
 
 if __name__ == "__main__":
     import uvicorn
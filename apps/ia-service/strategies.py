@@ -0,0 +1,107 @@
+# Registro de estrategias de pronóstico.
+# Cada estrategia es una función `fn(df, min_val, max_val, anchor_val, ctx)` que devuelve
+# (forecast, valor_24h, nombre) o None para que el orquestador use la lineal.
+# `ctx` trae lo que algunas necesitan: historical_max, cache_key, linear_fit, meta, options y
+# over_budget (presupuesto del request agotado: solo vale lo que no cuesta ajustar).
+
+import numpy as np
+
+from holt_winters import regular_grid, SEASON_STEPS, SEASON_SECONDS, STEP_SECONDS
+
+AUTO = "auto"
+FALLBACK = "linear"
+
+# "auto" mira la serie (en la grilla de 10 minutos de Holt-Winters, O(n)) antes de elegir:
+# - poca historia o recta + ruido (residuos sin estructura): lineal
+# - ciclo diario claro: Holt-Winters; con varios días de historia, Prophet
+# - residuos autocorrelacionados (nivel/tendencia local que una recta no sigue): Holt-Winters
+AUTO_MIN_GRID_POINTS = 36       # 6 horas de grilla
+SEASONAL_MIN_SHARE = 0.3        # varianza residual que explica el ciclo diario
+PROPHET_MIN_DAYS = 3
+STRUCTURE_MIN_ACF = 0.5         # autocorrelación lag-1 de los residuos de la recta
+
+
+class Strategy:
+    __slots__ = ("name", "fn", "min_hours")
+
+    def __init__(self, name, fn, min_hours=0.0):
+        self.name = name
+        self.fn = fn
+        self.min_hours = min_hours
+
+
+STRATEGIES = {}
+
+
+def register_strategy(name, min_hours=0.0):
+    """Decorador: registra `fn` bajo `name`. `min_hours` = historia mínima para usarla."""
+    def decorator(fn):
+        STRATEGIES[name] = Strategy(name, fn, min_hours)
+        return fn
+    return decorator
+
+
+def is_known(name):
+    return name is None or name == AUTO or name in STRATEGIES
+
+
+def _share_explained(design, target):
+    """Fracción de la varianza de `target` que explica un ajuste por mínimos cuadrados sobre `design`."""
+    total = target.var()
+    if total <= 0:
+        return 0.0
+    coef, *_ = np.linalg.lstsq(design, target, rcond=None)
+    return float(1 - (target - design @ coef).var() / total)
+
+
+def series_profile(ts_s, y):
+    """Rasgos baratos de la serie: puntos de grilla, días, autocorrelación de residuos y peso del ciclo diario."""
+    start, grid = regular_grid(ts_s, y)
+    n = len(grid)
+    x = np.arange(n, dtype=np.float64)
+    line = np.column_stack([np.ones(n), x])
+    coef, *_ = np.linalg.lstsq(line, grid, rcond=None)
+    resid = grid - line @ coef
+
+    acf1 = 0.0
+    if n > 2 and resid[:-1].std() > 0 and resid[1:].std() > 0:
+        acf1 = float(np.corrcoef(resid[:-1], resid[1:])[0, 1])
+
+    seasonal = 0.0
+    if n >= SEASON_STEPS:
+        phase = 2 * np.pi * ((start + x * STEP_SECONDS) % SEASON_SECONDS) / SEASON_SECONDS
+        harmonics = np.column_stack([np.sin(phase), np.cos(phase), np.sin(2 * phase), np.cos(2 * phase)])
+        seasonal = _share_explained(harmonics, resid)
+
+    return {"gridPoints": n, "days": n / SEASON_STEPS, "acf1": acf1, "seasonalShare": seasonal}
+
+
+def auto_strategy(ts_s, y):
+    """Nombre de la estrategia para una métrica en "auto", según `series_profile`."""
+    if len(y) < 2:
+        return FALLBACK
+    profile = series_profile(ts_s, y)
+    if profile["gridPoints"] < AUTO_MIN_GRID_POINTS:
+        return FALLBACK
+    if profile["seasonalShare"] >= SEASONAL_MIN_SHARE:
+        return "prophet" if profile["days"] >= PROPHET_MIN_DAYS else "holt_winters"
+    if profile["acf1"] >= STRUCTURE_MIN_ACF:
+        return "holt_winters"
+    return FALLBACK
+
+
+def select_strategy(requested, duration_hours, auto_name):
+    """
+    Elige la estrategia de una métrica: la pedida por config/request o, en "auto", `auto_name`
+    (un nombre fijo, o una función que lo elige mirando los datos; solo se llama en "auto").
+    Si la historia no alcanza para la elegida, se usa la lineal.
+    Devuelve (estrategia, motivo del fallback o None).
+    """
+    if requested in (None, AUTO):
+        name = auto_name() if callable(auto_name) else auto_name
+    else:
+        name = requested
+    strategy = STRATEGIES.get(name) or STRATEGIES[FALLBACK]
+    if duration_hours < strategy.min_hours:
+        return STRATEGIES[FALLBACK], "short_history"
+    return strategy, None
@@ -0,0 +1,147 @@
+import math
+import threading
+from datetime import datetime, timezone
+
+
+def parse_epoch_seconds(timestamp):
+    """ISO 8601 -> segundos epoch. Sin zona se asume UTC (igual que el resto del servicio)."""
+    dt = datetime.fromisoformat(timestamp.replace('Z', ''))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class MetricState:
+    """
+    Estado incremental de una métrica: cada lectura nueva cuesta O(1).
+    - EWMA (mismo anchor que `get_smart_anchor`, span=5, adjust=False)
+    - Media/varianza de Welford
+    - Co-momento tiempo/valor para la pendiente de mínimos cuadrados
+    - Mínimo/máximo
+    El tiempo se mide desde la primera lectura para no perder precisión con epochs grandes.
+    """
+
+    __slots__ = (
+        "alpha", "n", "t0", "last_ts", "ewma",
+        "mean_t", "mean_y", "m2_t", "m2_y", "c_ty",
+        "min", "max", "rejected"
+    )
+
+    def __init__(self, span=5):
+        self.alpha = 2.0 / (span + 1)
+        self.n = 0
+        self.t0 = None
+        self.last_ts = None
+        self.ewma = None
+        self.mean_t = 0.0
+        self.mean_y = 0.0
+        self.m2_t = 0.0
+        self.m2_y = 0.0
+        self.c_ty = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.rejected = 0
+
+    def update(self, ts, y):
+        # Lecturas repetidas o atrasadas romperían el EWMA: se descartan
+        if self.last_ts is not None and ts <= self.last_ts:
+            self.rejected += 1
+            return False
+
+        if self.t0 is None:
+            self.t0 = ts
+        t = ts - self.t0
+
+        self.n += 1
+        dt = t - self.mean_t
+        dy = y - self.mean_y
+        self.mean_t += dt / self.n
+        self.mean_y += dy / self.n
+        self.m2_t += dt * (t - self.mean_t)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_ty += dt * (y - self.mean_y)
+
+        self.ewma = y if self.ewma is None else self.alpha * y + (1 - self.alpha) * self.ewma
+        self.min = min(self.min, y)
+        self.max = max(self.max, y)
+        self.last_ts = ts
+        return True
+
+    @property
+    def slope(self):
+        """Pendiente en unidades/segundo."""
+        if self.n < 2 or self.m2_t <= 0 or self.m2_y == 0:
+            return 0.0
+        return self.c_ty / self.m2_t
+
+    @property
+    def std(self):
+        if self.n < 2:
+            return math.nan
+        return math.sqrt(max(self.m2_y, 0.0) / (self.n - 1))
+
+    @property
+    def duration_hours(self):
+        if self.n == 0:
+            return 0.0
+        return (self.last_ts - self.t0) / 3600
+
+
+class StreamStore:
+    """Estados por sensor y por `categoria__metrica`, más la última config conocida del sensor."""
+
+    def __init__(self, span=5):
+        self.span = span
+        self._states = {}   # sensorId -> {col_key: MetricState}
+        self._configs = {}  # sensorId -> metricsConfig
+        self._lock = threading.Lock()
+
+    def push(self, sensor_id, readings, metrics_config=None):
+        """Aplica las lecturas en orden. Devuelve (aceptadas, descartadas)."""
+        accepted = rejected = 0
+        with self._lock:
+            if metrics_config is not None:
+                self._configs[sensor_id] = metrics_config
+            states = self._states.setdefault(sensor_id, {})
+
+            for r in readings:
+                try:
+                    ts = parse_epoch_seconds(r.timestamp)
+                except ValueError:
+                    rejected += 1
+                    continue
+                for cat, metrics in r.metrics.items():
+                    for name, val in metrics.items():
+                        if val is None: continue
+                        col_key = f"{cat}__{name}"
+                        state = states.get(col_key)
+                        if state is None:
+                            state = states[col_key] = MetricState(self.span)
+                        if state.update(ts, float(val)):
+                            accepted += 1
+                        else:
+                            rejected += 1
+        return accepted, rejected
+
+    def snapshot(self, sensor_id):
+        """Copia consistente de (config, {col_key: valores}) para calcular fuera del lock."""
+        with self._lock:
+            states = self._states.get(sensor_id)
+            if states is None:
+                return None
+            copies = {}
+            for col_key, state in states.items():
+                clone = MetricState.__new__(MetricState)
+                for attr in MetricState.__slots__:
+                    setattr(clone, attr, getattr(state, attr))
+                copies[col_key] = clone
+            return self._configs.get(sensor_id), copies
+
+    def reset(self, sensor_id):
+        with self._lock:
+            self._configs.pop(sensor_id, None)
+            return self._states.pop(sensor_id, None) is not None
+
+    def sensor_count(self):
+        with self._lock:
+            return len(self._states)
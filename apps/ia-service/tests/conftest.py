@@ -0,0 +1,31 @@
+import os
+import sys
+import math
+import random
+import datetime
+
+import pytest
+
+# Los módulos del servicio se importan planos (como en el contenedor: uvicorn main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_payload(n_sensors=2, n=60, step_s=60, metrics=("temp", "vib"), seed=0):
+    """Payload de /analyze: lecturas cada `step_s` con tendencia, una onda lenta y ruido."""
+    rng = random.Random(seed)
+    t0 = datetime.datetime(2025, 1, 1)
+    payload = []
+    for s in range(n_sensors):
+        readings = []
+        for i in range(n):
+            ts = (t0 + datetime.timedelta(seconds=i * step_s)).isoformat() + "Z"
+            values = {m: 50 + 0.01 * i + 5 * math.sin(i / 30) + rng.random() for m in metrics}
+            readings.append({"timestamp": ts, "metrics": {"thermal": values}})
+        config = {"sensorId": f"s{s}", "metricsConfig": {"thermal": {m: {"min": 0, "max": 80} for m in metrics}}}
+        payload.append({"config": config, "readings": readings})
+    return payload
+
+
+@pytest.fixture
+def make_payload():
+    return build_payload
@@ -0,0 +1,134 @@
+import datetime
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from anomaly import MAD_TO_SIGMA, SCORE_CAP, build_matrix, nanmedian_rows, rank_anomalies, score_matrix
+
+client = TestClient(main.app)
+
+
+def fleet(n_series=40, seed=0):
+    """Series con largos, pasos y huecos distintos; algunas vacías o cortas."""
+    rng = np.random.default_rng(seed)
+    series = []
+    for s in range(n_series):
+        n = [0, 3][s] if s < 2 else int(rng.integers(50, 400))
+        ts = 1.7e9 + np.cumsum(rng.uniform(20, 100, n))
+        y = rng.normal(10 * s, 1 + s % 3, n)
+        y[rng.random(n) < 0.05] = np.nan
+        if s % 7 == 0 and n:
+            y[-1] += 30      # salto en el último bucket
+        series.append((ts, y))
+    return series
+
+
+def matrix_loop(series, step_s, window):
+    matrix = np.full((len(series), window), np.nan)
+    for i, (ts, y) in enumerate(series):
+        if len(ts) == 0: continue
+        buckets = {}
+        for t, v in zip(ts, y):
+            col = window - 1 - int(np.floor((ts[-1] - t) / step_s))
+            if col >= 0 and not np.isnan(v):
+                buckets.setdefault(col, []).append(v)
+        for col, values in buckets.items():
+            matrix[i, col] = np.mean(values)
+    return matrix
+
+
+def robust_loop(dev, scale):
+    if not scale > 0:
+        return 0.0 if dev == 0 else np.sign(dev) * SCORE_CAP
+    return float(np.clip(dev / scale, -SCORE_CAP, SCORE_CAP))
+
+
+def scores_loop(matrix, recent, min_points):
+    """El cálculo original, serie por serie y punto por punto."""
+    rows, _ = matrix.shape
+    z = np.full((rows, recent), np.nan)
+    mad = np.full((rows, recent), np.nan)
+    roc = np.full((rows, recent), np.nan)
+    for i in range(rows):
+        base = matrix[i, :-recent]
+        present = base[~np.isnan(base)]
+        if len(present) < min_points: continue
+        median = np.median(present)
+        spread = np.median(np.abs(present - median))
+        diffs = np.diff(matrix[i])
+        base_diffs = diffs[:-recent][~np.isnan(diffs[:-recent])]
+        diff_median = np.median(base_diffs) if len(base_diffs) else np.nan
+        diff_mad = np.median(np.abs(base_diffs - diff_median)) if len(base_diffs) else np.nan
+        for j in range(recent):
+            x = matrix[i, -recent + j]
+            if np.isnan(x): continue
+            z[i, j] = robust_loop(x - present.mean(), present.std(ddof=1))
+            mad[i, j] = robust_loop(x - median, MAD_TO_SIGMA * spread)
+            d = diffs[-recent + j]
+            if not np.isnan(d):
+                roc[i, j] = robust_loop(d - diff_median, MAD_TO_SIGMA * diff_mad)
+    return z, mad, roc
+
+
+def test_matrix_matches_bucket_loop():
+    series = fleet()
+    matrix, last_ts = build_matrix(series, 60, 120)
+    np.testing.assert_allclose(matrix, matrix_loop(series, 60, 120), equal_nan=True)
+    assert np.isnan(last_ts[0]) and last_ts[1] == series[1][0][-1]
+
+
+def test_nanmedian_rows_matches_numpy():
+    a = np.random.default_rng(1).normal(size=(50, 31))
+    a[a > 1.2] = np.nan
+    a[3] = np.nan
+    expected = np.array([np.nanmedian(row) if (~np.isnan(row)).any() else np.nan for row in a])
+    np.testing.assert_allclose(nanmedian_rows(a)[:, 0], expected, equal_nan=True)
+
+
+def test_scores_match_series_loop():
+    matrix, _ = build_matrix(fleet(), 60, 120)
+    scores = score_matrix(matrix, recent=5, min_points=30)
+    z, mad, roc = scores_loop(matrix, 5, 30)
+    np.testing.assert_allclose(scores["z"], z, equal_nan=True)
+    np.testing.assert_allclose(scores["mad"], mad, equal_nan=True)
+    np.testing.assert_allclose(scores["roc"], roc, equal_nan=True)
+    assert np.isnan(scores["z"][:2]).all()    # sin base suficiente
+
+
+def test_rank_orders_by_worst_normalized_score():
+    nan = np.nan
+    scores = {
+        "z": np.array([[1.0, 2.0], [nan, nan], [0.5, 9.0]]),
+        "mad": np.array([[8.0, 0.0], [nan, nan], [0.1, 0.1]]),
+        "roc": np.array([[nan, nan], [nan, nan], [0.0, 0.0]]),
+    }
+    order, score, worst, flags = rank_anomalies(scores, {"z": 3.0, "mad": 4.0, "roc": 1.0})
+    assert order.tolist() == [2, 0]           # la fila sin puntaje queda afuera
+    assert score[2] == 3.0 and score[0] == 2.0 and np.isnan(score[1])
+    assert worst[0] == 0 and worst[2] == 1
+    assert flags["z"][2] and flags["mad"][0] and not flags["roc"][0]
+
+
+def test_endpoint_ranks_the_spiking_sensor_first():
+    t0 = datetime.datetime(2025, 1, 1)
+    rng = np.random.default_rng(2)
+    payload = []
+    for s in range(4):
+        values = 20 + rng.normal(0, 0.5, 200)
+        if s == 2:
+            values[-1] = 60.0
+        readings = [
+            {"timestamp": (t0 + datetime.timedelta(minutes=i)).isoformat() + "Z", "metrics": {"thermal": {"temp": float(v)}}}
+            for i, v in enumerate(values)
+        ]
+        payload.append({"config": {"sensorId": f"s{s}", "metricsConfig": {"thermal": {"temp": {"min": 0, "max": 50}}}}, "readings": readings})
+
+    body = client.post("/anomalies?window=120&recent=5", json=payload).json()
+    assert (body["series"], body["evaluated"], body["anomalous"]) == (4, 4, 1)
+    top = body["anomalies"][0]
+    assert (top["sensorId"], top["metric"], top["value"]) == ("s2", "temp", 60.0)
+    assert top["outOfRange"] and "zscore" in top["methods"]
+    assert top["timestamp"] == "2025-01-01T03:19:00.000"
+
+    assert client.post("/anomalies?window=30&recent=5", json=payload).status_code == 422
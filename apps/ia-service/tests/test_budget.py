@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def cold(monkeypatch):
+    # Proceso recién arrancado: ningún costo medido
+    monkeypatch.setattr(main, "strategy_costs", {})
+    main.report_cache.clear()
+    main.model_cache.clear()
+    yield
+    main.report_cache.clear()
+    main.model_cache.clear()
+
+
+def resumen(result):
+    return result["report"][0]["resumen"]["thermal"]["temp"]
+
+
+@pytest.mark.parametrize("strategy", ["prophet", "holt_winters"])
+def test_cold_process_under_tiny_budget_degrades(cold, monkeypatch, make_payload, strategy):
+    def no_fit():
+        raise AssertionError("no debería empezar un ajuste sin presupuesto")
+
+    monkeypatch.setattr(main, "get_prophet", no_fit)
+    monkeypatch.setattr(main, "fit_holt_winters", lambda *args: no_fit())
+    payload = make_payload(n_sensors=1, n=420, metrics=("temp",))
+    result = client.post(f"/analyze?strategy={strategy}&budget_ms=20", json=payload).json()
+
+    assert result["budget"]["degradedMetrics"] == 1
+    analysis = resumen(result)
+    assert analysis["strategy"] == "linear_high_res"
+    assert analysis["degraded"] == {"reason": "budget", "requested": strategy, "modelCache": None}
+
+
+def test_cold_budget_serves_stale_forecast(cold, make_payload):
+    fitted = client.post("/analyze?strategy=prophet&fast=true", json=make_payload(n_sensors=1, n=420, metrics=("temp",)))
+    assert resumen(fitted.json())["strategy"] == "prophet_neural_res"
+
+    main.strategy_costs.clear()
+    newer = make_payload(n_sensors=1, n=440, metrics=("temp",))
+    result = client.post("/analyze?strategy=prophet&fast=true&budget_ms=20", json=newer).json()
+    analysis = resumen(result)
+    assert analysis["strategy"] == "prophet_neural_res"
+    assert analysis["degraded"]["modelCache"] == "stale"
+
+
+def test_expected_cost_defaults(monkeypatch):
+    monkeypatch.setattr(main, "strategy_costs", {"prophet": 0.3})
+    monkeypatch.setattr(main, "default_strategy_costs", main.parse_costs("prophet=2, holt_winters=0.05"))
+    assert main.expected_cost("prophet") == 0.3
+    assert main.expected_cost("holt_winters") == 0.05
+    assert main.expected_cost("custom") == 2.0
+    assert not main.over_budget("linear", {"deadline": 0})
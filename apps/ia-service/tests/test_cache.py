@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+import main
+from cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_size=2, max_age_s=None)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1      # "b" pasa a ser el menos usado
+    lru.put("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_lru_expires_by_age(clock):
+    lru = LRUCache(max_size=10, max_age_s=60)
+    lru.put("a", 1)
+    clock[0] += 30
+    lru.put("b", 2)
+    clock[0] += 31
+    assert lru.get("a") is None
+    assert lru.get("b") == 2
+    clock[0] += 60
+    lru.put("c", 3)               # al guardar se barre lo caducado
+    assert len(lru) == 1
+
+    stats = lru.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 2)
+
+
+def test_lru_bounds_total_bytes():
+    lru = LRUCache(max_size=100, max_age_s=None, max_bytes=100, sizeof=len)
+    lru.put("a", "x" * 40)
+    lru.put("b", "x" * 40)
+    lru.put("c", "x" * 40)
+    assert lru.get("a") is None
+    assert lru.stats()["bytes"] == 80
+
+    lru.put("b", "x" * 10)        # reemplazar descuenta el tamaño anterior
+    assert lru.stats()["bytes"] == 50
+    # Una entrada más grande que el tope queda sola, no deja la caché vacía
+    lru.put("d", "x" * 500)
+    assert len(lru) == 1 and lru.get("d") is not None
+
+
+def history(hours, start="2025-01-01"):
+    ds = pd.date_range(start, periods=hours * 6, freq="10min")
+    rng = np.random.default_rng(0)
+    y = 50 + 0.05 * np.arange(len(ds)) + 3 * np.sin(np.arange(len(ds)) / 24) + rng.normal(0, 0.3, len(ds))
+    return pd.DataFrame({"ds": ds, "y": y})
+
+
+def test_prophet_model_cache_outcomes(monkeypatch):
+    monkeypatch.setattr(main, "model_cache", LRUCache(max_size=8, max_age_s=None))
+    options = {**main.DEFAULT_OPTIONS, "resample": "", "fast": True}
+    df = history(24)
+    longer = history(26)
+
+    forecast, outcome = main.fit_prophet_forecast(df, cache_key="k", options=options)
+    assert outcome == "miss"
+    assert main.fit_prophet_forecast(df, cache_key="k", options=options) == (forecast, "hit")
+
+    # Solo llegaron lecturas nuevas: reajuste partiendo de los parámetros guardados
+    warm, outcome = main.fit_prophet_forecast(longer, cache_key="k", options=options)
+    assert outcome == "warm"
+    assert warm["ds"].iloc[0] == longer["ds"].iloc[-1]
+
+    # Sin permiso para ajustar se sirve el último pronóstico guardado
+    newer = history(27)
+    assert main.fit_prophet_forecast(newer, cache_key="k", options=options, allow_fit=False)[1] == "stale"
+    assert main.fit_prophet_forecast(newer, cache_key="otra", options=options, allow_fit=False) == (None, None)
+
+    # Una historia que no continúa la anterior se ajusta en frío
+    assert main.fit_prophet_forecast(history(24, start="2024-06-01"), cache_key="k", options=options)[1] == "miss"
@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+VALID = {"config": {"sensorId": "a", "metricsConfig": {}}, "timestamps": [1, 2], "columns": {}}
+
+
+def test_invalid_config_matches_row_path_422():
+    config = {"metricsConfig": {}}
+    columnar = client.post("/analyze/columnar", json=[VALID, {"config": config, "timestamps": [], "columns": {}}])
+    rows = client.post("/analyze", json=[{"config": config, "readings": []}])
+    assert columnar.status_code == rows.status_code == 422
+    assert columnar.json()["detail"][0]["loc"] == ["body", 1, "config", "sensorId"]
+    assert columnar.json()["detail"][0]["type"] == rows.json()["detail"][0]["type"]
+
+
+def test_missing_config_and_non_object_entries():
+    assert client.post("/analyze/columnar", json=[{"timestamps": []}]).status_code == 422
+    assert client.post("/analyze/columnar", json=[VALID, 3]).status_code == 422
+    assert client.post("/analyze/columnar", json=[VALID]).status_code == 200
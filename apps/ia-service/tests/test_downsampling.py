@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from downsampling import DOWNSAMPLERS, downsample_indices, lttb_indices, minmax_indices, uniform_indices
+
+client = TestClient(main.app)
+
+
+def spiky(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64) * 60
+    y = np.sin(np.arange(n) / 50) + 0.1 * rng.random(n)
+    y[337] = 25.0    # pico de una sola muestra, entre dos puntos de la grilla uniforme
+    y[612] = -25.0
+    return x, y
+
+
+def lttb_loop(x, y, target):
+    """LTTB punto por punto, con los mismos buckets que la versión vectorizada."""
+    n = len(y)
+    x = x - x[0]
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    out = [0]
+    for i in range(target - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nx, ny = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            nx, ny = x[-1], y[-1]
+        ax, ay = x[out[-1]], y[out[-1]]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - nx) * (y[j] - ay) - (ax - x[j]) * (ny - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+    out.append(n - 1)
+    return np.array(out)
+
+
+@pytest.mark.parametrize("method", sorted(DOWNSAMPLERS))
+def test_indices_are_sorted_bounded_and_keep_endpoints(method):
+    x, y = spiky()
+    idx = downsample_indices(method, x, y, 100)
+    assert len(idx) <= 100
+    assert (np.diff(idx) > 0).all()
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+
+
+@pytest.mark.parametrize("method", sorted(DOWNSAMPLERS))
+def test_short_series_is_returned_whole(method):
+    x, y = spiky()
+    x, y = x[:50], y[:50]
+    assert downsample_indices(method, x, y, 100).tolist() == list(range(50))
+
+
+def test_uniform_misses_spikes_that_lttb_and_minmax_keep():
+    x, y = spiky()
+    assert 337 not in uniform_indices(x, y, 100)
+    for fn in (lttb_indices, minmax_indices):
+        idx = fn(x, y, 100)
+        assert y[idx].max() == 25.0 and y[idx].min() == -25.0
+
+
+def test_lttb_matches_point_by_point_loop():
+    x, y = spiky(n=777, seed=3)
+    for target in (3, 10, 64, 200):
+        assert lttb_indices(x, y, target).tolist() == lttb_loop(x, y, target).tolist()
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    x, y = spiky(n=1003, seed=1)
+    idx = set(minmax_indices(x, y, 42).tolist())
+    edges = np.linspace(0, len(y), 21).astype(int)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        assert lo + int(np.argmin(y[lo:hi])) in idx
+        assert lo + int(np.argmax(y[lo:hi])) in idx
+    assert len(idx) <= 42
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample_indices("median", [0, 1], [0, 1], 1)
+
+
+def test_analyze_history_points_per_method(make_payload):
+    payload = make_payload(n_sensors=1, n=500, step_s=600, metrics=("temp",))
+    for method in ("uniform", "lttb"):
+        body = client.post(f"/analyze?downsample={method}&points=50", json=payload).json()
+        chart = body["report"][0]["chartData"]["thermal"][0]["data"]
+        assert sum(not point["isFuture"] for point in chart) == 50
+
+    assert client.post("/analyze?downsample=median", json=payload).status_code == 422
@@ -0,0 +1,43 @@
+import pytest
+
+import encoding
+from encoding import JSON, COLUMNAR_JSON, MSGPACK, NotAcceptable, negotiate
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("*/*", JSON),
+    ("application/json", JSON),
+    ("text/html, application/*;q=0.5", JSON),
+    (COLUMNAR_JSON, COLUMNAR_JSON),
+    ("application/json;q=0.5, application/vnd.ingenio.columnar+json", COLUMNAR_JSON),
+    ("application/vnd.ingenio.columnar+json;q=0.2, application/json;q=0.9", JSON),
+    ("Application/JSON", JSON),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_negotiate_ties_keep_header_order():
+    assert negotiate(f"{COLUMNAR_JSON}, {JSON}") == COLUMNAR_JSON
+    assert negotiate(f"{JSON}, {COLUMNAR_JSON}") == JSON
+
+
+def test_negotiate_msgpack(monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", object())
+    assert negotiate("application/x-msgpack") == MSGPACK
+    assert negotiate("application/vnd.msgpack, application/json;q=0.1") == MSGPACK
+
+
+def test_negotiate_msgpack_missing_falls_back(monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+    assert negotiate(f"{MSGPACK}, application/json;q=0.1") == JSON
+    with pytest.raises(NotAcceptable):
+        negotiate(MSGPACK)
+
+
+@pytest.mark.parametrize("accept", ["text/html", "application/json;q=0", "application/json;q=abc"])
+def test_negotiate_not_acceptable(accept):
+    with pytest.raises(NotAcceptable):
+        negotiate(accept)
@@ -0,0 +1,63 @@
+import numpy as np
+
+from history import HistoryStore, SensorHistory, INITIAL_CAPACITY
+
+
+def ts_ms(*seconds):
+    return np.array(seconds, dtype=np.int64) * 1000
+
+
+def test_append_keeps_order_and_updates_duplicates():
+    store = HistoryStore(retention_s=0)
+    assert store.append("s", ts_ms(1, 2, 3), {"t__a": [1.0, 2.0, 3.0]}) == (3, 0, 3)
+
+    # 2 ya existe (se actualiza), 0 llega atrasada (se intercala), 4 es nueva
+    added, duplicates, size = store.append("s", ts_ms(4, 2, 0), {"t__a": [4.0, 20.0, 0.0]})
+    assert (added, duplicates, size) == (2, 1, 5)
+
+    _, frame = store.frame("s")
+    assert (frame["ds"].astype("int64") // 10**9).tolist() == [0, 1, 2, 3, 4]
+    assert frame["t__a"].tolist() == [0.0, 1.0, 20.0, 3.0, 4.0]
+
+
+def test_duplicate_with_missing_value_keeps_previous():
+    store = HistoryStore(retention_s=0)
+    store.append("s", ts_ms(1, 2), {"t__a": [1.0, 2.0], "t__b": [5.0, 6.0]})
+    store.append("s", ts_ms(2), {"t__a": [np.nan], "t__b": [60.0]})
+    _, frame = store.frame("s")
+    assert frame["t__a"].tolist() == [1.0, 2.0]
+    assert frame["t__b"].tolist() == [5.0, 60.0]
+
+
+def test_retention_and_max_points():
+    store = HistoryStore(retention_s=10, max_points=1000)
+    store.append("s", ts_ms(*range(0, 30)), {"t__a": np.arange(30.0)})
+    _, frame = store.frame("s")
+    assert frame["t__a"].tolist() == list(np.arange(19.0, 30.0))
+
+    store = HistoryStore(retention_s=0, max_points=5)
+    store.append("s", ts_ms(*range(0, 30)), {"t__a": np.arange(30.0)})
+    _, frame = store.frame("s")
+    assert frame["t__a"].tolist() == [25.0, 26.0, 27.0, 28.0, 29.0]
+
+
+def test_compaction_is_amortized(monkeypatch):
+    max_points = 4096  # potencia de dos: el caso que antes compactaba en cada lote
+    history = SensorHistory()
+    reallocations = []
+    original = history._reallocate
+
+    def counting(capacity):
+        reallocations.append(capacity)
+        original(capacity)
+
+    monkeypatch.setattr(history, "_reallocate", counting)
+    for i in range(30000):
+        history.append(np.array([i], dtype=np.int64), {"t__a": [float(i)]}, 0, max_points)
+
+    assert history.size == max_points
+    assert history.ts[history.hi - 1] == 29999
+    assert history.capacity <= 4 * max_points
+    # Cada compactación cuesta O(max_points) y tiene que pagarse con ~max_points lecturas
+    assert len(reallocations) <= 30000 // max_points + 8
+    assert min(reallocations) >= INITIAL_CAPACITY
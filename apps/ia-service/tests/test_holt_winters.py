@@ -0,0 +1,53 @@
+import numpy as np
+
+from holt_winters import SEASON_SECONDS, fit_holt_winters, holt_winters_forecast, regular_grid
+from linear_engine import FORECAST_STEPS, STEP_OFFSETS_S
+
+T0 = 1735689600.0  # 2025-01-01 00:00 UTC
+
+
+def daily(t):
+    return 50 + 0.5 * (t - T0) / 3600 / 24 + 5 * np.sin(2 * np.pi * t / SEASON_SECONDS)
+
+
+def test_regular_grid_averages_and_fills_gaps():
+    ts = T0 + np.array([0, 60, 600, 1800 + 30])
+    start, grid = regular_grid(ts, np.array([1.0, 3.0, 4.0, 10.0]))
+    assert start == T0
+    assert grid.tolist() == [2.0, 4.0, 7.0, 10.0]     # el bucket vacío se interpola
+
+
+def test_daily_cycle_is_forecast_a_day_ahead():
+    rng = np.random.default_rng(0)
+    ts = T0 + np.arange(0, 4 * SEASON_SECONDS, 60.0)
+    y = daily(ts) + rng.normal(0, 0.2, len(ts))
+    model = fit_holt_winters(ts, y)
+    assert model["seasonal"]
+
+    last_ts = np.datetime64(int(ts[-1]), "s")
+    forecast, value_24h = holt_winters_forecast(model, last_ts, y[-1])
+    truth = daily(ts[-1] + STEP_OFFSETS_S)
+    assert len(forecast["value"]) == FORECAST_STEPS
+    assert np.abs(forecast["value"] - truth).mean() < 0.5     # amplitud 5: sigue el ciclo
+    assert abs(value_24h - truth[-1]) < 1.0
+    assert ((forecast["low"] <= forecast["value"]) & (forecast["value"] <= forecast["high"])).all()
+    width = forecast["high"] - forecast["low"]
+    assert width[-1] >= width[0] > 0
+
+
+def test_forecast_starts_at_the_anchor():
+    ts = T0 + np.arange(0, 2 * SEASON_SECONDS, 600.0)
+    model = fit_holt_winters(ts, daily(ts))
+    _, shifted = holt_winters_forecast(model, np.datetime64(int(ts[-1]), "s"), daily(ts[-1]) + 3)
+    _, plain = holt_winters_forecast(model, np.datetime64(int(ts[-1]), "s"), daily(ts[-1]))
+    assert np.isclose(shifted - plain, 3)
+
+
+def test_short_history_without_season():
+    ts = T0 + np.arange(0, 6 * 3600, 600.0)
+    model = fit_holt_winters(ts, np.full(len(ts), 12.0))
+    assert not model["seasonal"] and model["gamma"] == 0.0
+    forecast, value_24h = holt_winters_forecast(model, np.datetime64(int(ts[-1]), "s"), 12.0)
+    assert np.allclose(forecast["value"], 12.0) and np.isclose(value_24h, 12.0)
+
+    assert fit_holt_winters(ts[:5], np.arange(5.0)) is None
@@ -0,0 +1,10 @@
+from instrumentation import _format_labels
+
+
+def test_format_labels_escapes_values():
+    labels = _format_labels(("path", "status"), ('a"b\\c\nd', 200), ("le", "0.5"))
+    assert labels == '{path="a\\"b\\\\c\\nd",status="200",le="0.5"}'
+
+
+def test_format_labels_empty():
+    assert _format_labels((), ()) == ""
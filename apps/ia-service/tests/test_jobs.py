@@ -0,0 +1,101 @@
+import json
+import time
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from jobs import JobStore
+
+client = TestClient(main.app)
+
+
+def wait_finished(store, job_id):
+    for _ in range(200):
+        status = store.status(job_id)
+        if status["finishedAt"] is not None:
+            return status
+        time.sleep(0.01)
+    raise AssertionError("el trabajo no terminó")
+
+
+@pytest.fixture
+def store():
+    store = JobStore(max_workers=1, ttl_s=60)
+    yield store
+    store.shutdown()
+
+
+def test_job_reports_progress_and_result(store):
+    release = threading.Event()
+
+    def run(on_progress, on_plan):
+        on_plan(2)
+        on_progress({"sensorId": "a"})
+        release.wait(5)
+        on_progress({"sensorId": "b"})
+        return {"report": ["a", "b"]}
+
+    job_id = store.submit(run, total=5)
+    for _ in range(200):
+        status = store.status(job_id)
+        if status["completedSensors"]:
+            break
+        time.sleep(0.01)
+    assert status["status"] == "running"
+    assert (status["totalSensors"], status["completedSensors"]) == (2, ["a"])
+
+    release.set()
+    status = wait_finished(store, job_id)
+    assert (status["status"], status["completedSensors"]) == ("done", ["a", "b"])
+    assert store.get(job_id)["result"] == {"report": ["a", "b"]}
+
+
+def test_failed_job_keeps_error(store):
+    def run(on_progress, on_plan):
+        raise ValueError("sin lecturas")
+
+    status = wait_finished(store, store.submit(run, total=1))
+    assert (status["status"], status["error"]) == ("failed", "sin lecturas")
+
+
+def test_finished_jobs_are_purged_after_ttl(store):
+    job_id = store.submit(lambda on_progress, on_plan: {}, total=0)
+    wait_finished(store, job_id)
+    assert store.status(job_id) is not None
+
+    store.ttl_s = 0.05
+    time.sleep(0.1)
+    assert store.status(job_id) is None
+
+
+def test_job_result_matches_analyze(make_payload):
+    payload = make_payload(n_sensors=3)
+    expected = client.post("/analyze?strategy=linear", json=payload).json()
+
+    job_id = client.post("/jobs?strategy=linear", json=payload).json()["jobId"]
+    for _ in range(200):
+        response = client.get(f"/jobs/{job_id}/result")
+        if response.status_code != 202:
+            break
+        time.sleep(0.05)
+    assert response.status_code == 200
+    assert response.json()["report"] == expected["report"]
+
+    assert client.get("/jobs/nada").status_code == 404
+    assert client.get("/jobs/nada/result").status_code == 404
+
+
+def test_stream_sends_one_line_per_sensor_and_closes(make_payload):
+    payload = make_payload(n_sensors=3)
+    expected = client.post("/analyze?strategy=linear", json=payload).json()["report"]
+
+    response = client.post("/analyze/stream?strategy=linear", json=payload)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert lines[-1]["done"] is True and "report" not in lines[-1]
+    # Los sensores salen en el orden en que terminan
+    reports = sorted(lines[:-1], key=lambda report: report["sensorId"])
+    assert reports == sorted(expected, key=lambda report: report["sensorId"])
@@ -0,0 +1,60 @@
+import numpy as np
+
+from linear_engine import FORECAST_STEPS, STEP_SECONDS, first_crossing_hours, fit_linear_batch, linear_forecast, to_epoch_seconds
+
+
+def test_batch_fit_matches_polyfit_per_column():
+    rng = np.random.default_rng(0)
+    ds = np.datetime64("2025-01-01T00:00:00", "ns") + np.arange(300) * np.timedelta64(60, "s")
+    ts = to_epoch_seconds(ds)
+    Y = np.column_stack([
+        20 + 0.001 * (ts - ts[0]) + rng.normal(0, 0.5, len(ts)),
+        80 - 0.003 * (ts - ts[0]) + rng.normal(0, 2.0, len(ts)),
+        rng.normal(0, 1.0, len(ts)),
+    ])
+    Y[rng.random(Y.shape) < 0.3] = np.nan   # cada métrica con sus propios huecos
+
+    slopes, stds, counts = fit_linear_batch(ts, Y)
+    for k in range(Y.shape[1]):
+        present = ~np.isnan(Y[:, k])
+        slope, _ = np.polyfit(ts[present], Y[present, k], 1)
+        assert counts[k] == present.sum()
+        assert np.isclose(slopes[k], slope, rtol=1e-6)
+        assert np.isclose(stds[k], Y[present, k].std(ddof=1))
+
+
+def test_degenerate_columns():
+    ts = np.arange(5, dtype=np.float64) * 60 + 1.7e9
+    Y = np.array([
+        [7.0, np.nan, 1.0],
+        [7.0, np.nan, np.nan],
+        [7.0, 3.0, np.nan],
+        [7.0, np.nan, np.nan],
+        [7.0, np.nan, np.nan],
+    ])
+    slopes, stds, counts = fit_linear_batch(ts, Y)
+    assert counts.tolist() == [5, 1, 1]
+    assert slopes.tolist() == [0.0, 0.0, 0.0]   # plana, o sin puntos suficientes
+    assert stds[0] == 0 and np.isnan(stds[1:]).all()
+
+
+def test_forecast_limits_slope_and_builds_cone():
+    last = np.datetime64("2025-01-01T00:00:00", "ns")
+    forecast, value_24h = linear_forecast(last, 100.0, 1.0, 2.0, 50)
+
+    assert len(forecast["ds"]) == FORECAST_STEPS
+    assert forecast["ds"][0] == last + np.timedelta64(STEP_SECONDS, "s")
+    # 1 unidad/s es absurdo: se limita al 10% del anchor por hora
+    assert np.isclose(value_24h, 100.0 + 10.0 * 24)
+    width = forecast["high"] - forecast["low"]
+    assert (np.diff(width) >= 0).all() and width[0] > 0
+
+
+def test_first_crossing_hours():
+    last = np.datetime64("2025-01-01T00:00:00", "ns")
+    ds = last + np.arange(1, 7) * np.timedelta64(3600, "s")
+    values = np.array([50.0, 60.0, 70.0, 80.0, 90.0, 100.0])
+
+    assert first_crossing_hours(ds, values, last, None, 80) == 4.0
+    assert first_crossing_hours(ds, values, last, 55, None) == 1.0
+    assert first_crossing_hours(ds, values, last, 0, 200) is None
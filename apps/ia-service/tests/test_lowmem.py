@@ -0,0 +1,87 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from lowmem import iter_sensors
+
+client = TestClient(main.app)
+
+
+def parse(payload, dtype="float64", chunk=50_000):
+    fileobj = io.BytesIO(json.dumps(payload).encode())
+    return list(iter_sensors(fileobj, main.parse_timestamps, dtype, chunk))
+
+
+def to_columnar(payload):
+    """Mismo payload en el formato de /analyze/columnar."""
+    out = []
+    for item in payload:
+        ts = main.parse_timestamps([r["timestamp"] for r in item["readings"]])
+        columns = {}
+        for r in item["readings"]:
+            for category, metrics in r["metrics"].items():
+                for name, value in metrics.items():
+                    columns.setdefault(f"{category}__{name}", []).append(value)
+        out.append({
+            "config": item["config"],
+            "timestamps": ts.astype("datetime64[ms]").astype(np.int64).tolist(),
+            "columns": columns,
+        })
+    return out
+
+
+def test_rows_are_parsed_into_sorted_dense_columns():
+    readings = [
+        {"timestamp": "2025-01-01T00:02:00Z", "metrics": {"thermal": {"temp": 3.0}}},
+        {"timestamp": "2025-01-01T00:00:00Z", "metrics": {"thermal": {"temp": 1.0, "hum": 10.0}}},
+        {"timestamp": "2025-01-01T00:01:00Z", "metrics": {"thermal": {"temp": 2.0}}},
+    ]
+    # chunk=2: los timestamps se parsean en más de un bloque
+    (config, ts, columns), = parse([{"config": {"sensorId": "a"}, "readings": readings}], chunk=2)
+    assert config == {"sensorId": "a"}
+    assert (ts // 1000 - ts[0] // 1000).tolist() == [0, 60, 120]
+    assert columns["thermal__temp"].tolist() == [1.0, 2.0, 3.0]
+    assert np.isnan(columns["thermal__hum"][1:]).all() and columns["thermal__hum"][0] == 10.0
+
+
+def test_columnar_body_and_float32(make_payload):
+    payload = make_payload(n_sensors=2, n=20)
+    rows = parse(payload)
+    columnar = parse(to_columnar(payload), dtype="float32")
+    for (_, ts_a, cols_a), (_, ts_b, cols_b) in zip(rows, columnar):
+        assert ts_a.tolist() == ts_b.tolist()
+        for key in cols_a:
+            assert cols_b[key].dtype == np.float32
+            assert np.allclose(cols_a[key], cols_b[key], rtol=1e-6)
+
+
+def test_invalid_timestamps_drop_only_that_sensor(make_payload):
+    payload = make_payload(n_sensors=2, n=5)
+    payload[0]["readings"][2]["timestamp"] = "ayer"
+    (_, bad_ts, bad_cols), (_, ts, _) = parse(payload)
+    assert len(bad_ts) == 0 and bad_cols == {}
+    assert len(ts) == 5
+
+
+def reports(body):
+    return sorted(body["report"], key=lambda report: report["sensorId"])
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_lowmem_matches_analyze(make_payload, columnar):
+    payload = make_payload(n_sensors=3, n=120)
+    expected = client.post("/analyze?strategy=linear", json=payload).json()
+    body = to_columnar(payload) if columnar else payload
+    response = client.post("/analyze/lowmem?strategy=linear", content=json.dumps(body))
+    assert response.status_code == 200
+    assert reports(response.json()) == reports(expected)
+
+
+def test_lowmem_rejects_bad_bodies():
+    assert client.post("/analyze/lowmem", content=b'[{"config": ').status_code == 400
+    response = client.post("/analyze/lowmem", content=json.dumps([{"config": {"metricsConfig": {}}, "readings": []}]))
+    assert response.status_code == 422
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(main, "ANALYZE_WORKERS", 2)
+    main.shutdown_executors()
+    yield
+    main.shutdown_executors()
+
+
+def strip_volatile(result):
+    for key in ("timestamp", "modelCache", "reportCache"):
+        result.pop(key, None)
+    return result
+
+
+def test_pool_matches_serial(pool, make_payload, monkeypatch):
+    client = TestClient(main.app)
+    payload = make_payload(n_sensors=3, n=120)
+    main.report_cache.clear()
+    pooled = strip_volatile(client.post("/analyze?strategy=holt_winters", json=payload).json())
+
+    monkeypatch.setattr(main, "ANALYZE_WORKERS", 1)
+    main.report_cache.clear()
+    serial = strip_volatile(client.post("/analyze?strategy=holt_winters", json=payload).json())
+    assert pooled == serial
+    assert len(pooled["report"]) == 3
+
+
+def test_pool_uses_spawned_single_worker_processes(pool):
+    executors = main.get_executors()
+    assert len(executors) == 2
+    for executor in executors:
+        assert executor._mp_context.get_start_method() == main.ANALYZE_START_METHOD == "spawn"
+        assert executor._max_workers == 1
+    # El hijo es un proceso nuevo que importa main por su cuenta
+    assert executors[0].submit(os.getpid).result() != os.getpid()
+
+
+def test_same_metric_always_goes_to_the_same_process(pool):
+    task = ("s1", "thermal__temp", None, 0, 80, ("s1", "thermal", "temp", 0, 80, "10min", "mean", False), None, {})
+    other = ("s2", "thermal__vib", None, 0, 80, None, None, {})
+    assert main.executor_for(task) is main.executor_for(task)
+    assert main.executor_for(other) is main.executor_for(other)
+    pids = {main.executor_for(task).submit(os.getpid).result() for _ in range(5)}
+    assert len(pids) == 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import LRUCache
+
+
+def minute_history(hours=12, seed=0):
+    ds = pd.date_range("2025-01-01", periods=hours * 60, freq="1min")
+    rng = np.random.default_rng(seed)
+    y = 30 + 0.01 * np.arange(len(ds)) + 2 * np.sin(np.arange(len(ds)) / 90) + rng.normal(0, 0.5, len(ds))
+    return pd.DataFrame({"ds": ds, "y": y})
+
+
+@pytest.mark.parametrize("how", ["mean", "min", "max"])
+def test_aggregate_history_buckets(how):
+    df = minute_history(hours=1)
+    grid = main.aggregate_history(df, "10min", how)
+    assert len(grid) == 6
+    first = df["y"].iloc[:10]
+    assert np.isclose(grid["y"].iloc[0], getattr(first, how)())
+    assert grid["ds"].iloc[1] == pd.Timestamp("2025-01-01 00:10")
+
+
+def test_aggregate_history_keeps_raw_when_it_does_not_shrink():
+    df = minute_history(hours=1)
+    assert main.aggregate_history(df, "", "mean") is df
+    assert main.aggregate_history(df, "30s", "mean") is df     # grilla más fina que los datos
+    assert main.aggregate_history(df, "2h", "mean") is df      # un solo bucket
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    """Registra el largo de cada historia que llega a Prophet.fit."""
+    sizes = []
+    prophet = main.get_prophet()
+
+    class Recording(prophet):
+        def fit(self, df, **kwargs):
+            sizes.append(len(df))
+            return super().fit(df, **kwargs)
+
+    monkeypatch.setattr(main, "_prophet_class", Recording)
+    monkeypatch.setattr(main, "model_cache", LRUCache(max_size=8, max_age_s=None))
+    return sizes
+
+
+def test_fit_uses_the_grid_and_fast_intervals_widen(fits):
+    df = minute_history()
+    options = {**main.DEFAULT_OPTIONS, "resample": "10min", "agg": "mean", "fast": True}
+    forecast, _ = main.fit_prophet_forecast(df, options=options)
+
+    assert fits == [12 * 6]
+    # "Ahora" (para el offset) y los 144 pasos futuros
+    assert len(forecast) == 145
+    assert forecast["ds"].iloc[0] == df["ds"].iloc[-1]
+    width = (forecast["yhat_upper"] - forecast["yhat_lower"]).to_numpy()
+    assert (width > 0).all() and (np.diff(width) > 0).all()
+
+    main.fit_prophet_forecast(df, options={**options, "resample": ""})
+    assert fits[-1] == len(df)
+
+
+def test_invalid_resample_is_rejected(make_payload):
+    client = TestClient(main.app)
+    assert client.post("/analyze?resample=10parsecs", json=make_payload()).status_code == 422
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import runpy
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def not_ready(monkeypatch):
+    for key, value in {"ready": False, "readyAt": None, "warmup": {}, "error": None}.items():
+        monkeypatch.setitem(main.readiness, key, value)
+    monkeypatch.setattr(main, "WARMUP_PROPHET", False)
+    return main.readiness
+
+
+def test_ready_is_503_until_warm_up_finishes(not_ready):
+    client = TestClient(main.app)
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["ready"] is False
+    assert client.get("/health").status_code == 200
+
+    main.run_warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert set(response.json()["warmup"]) == {"linear", "holt_winters", "encode"}
+
+
+def test_failed_warm_up_still_becomes_ready(not_ready, monkeypatch):
+    def broken():
+        raise ImportError("sin prophet")
+
+    monkeypatch.setattr(main, "warm_up", broken)
+    main.run_warm_up()
+    assert not_ready["ready"] and not_ready["error"] == "sin prophet"
+
+
+def test_preloaded_worker_skips_warm_up(not_ready, monkeypatch):
+    started = []
+    monkeypatch.setattr(main.threading, "Thread", lambda *a, **k: started.append(k))
+    monkeypatch.setitem(main.readiness, "ready", True)
+    monkeypatch.setitem(main.readiness, "pid", -1)
+    main.start_warm_up()
+    assert started == [] and main.readiness["pid"] == os.getpid()
+
+
+def test_gunicorn_config_preloads(monkeypatch):
+    monkeypatch.setenv("IA_PRELOAD", "0")
+    monkeypatch.delenv("IA_PRELOAD")
+    config = runpy.run_path(os.path.join(SERVICE_DIR, "gunicorn.conf.py"))
+    assert config["preload_app"] is True
+    assert config["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert os.environ["IA_PRELOAD"] == "1"
+
+
+@pytest.mark.parametrize("preload", ["0", "1"])
+def test_preload_warms_up_at_import(preload):
+    # Lo que hace el maestro de gunicorn con preload_app: importar main antes del fork
+    env = {**os.environ, "IA_PRELOAD": preload, "WARMUP_PROPHET": "0"}
+    out = subprocess.run(
+        [sys.executable, "-c", "import json, main; print(json.dumps(main.readiness))"],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True, timeout=120, check=True,
+    )
+    readiness = json.loads(out.stdout.strip().splitlines()[-1])
+    assert readiness["ready"] is (preload == "1")
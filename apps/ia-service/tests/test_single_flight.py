@@ -0,0 +1,106 @@
+import time
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import SingleFlight
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Un flight perdido haría esperar al próximo request todo este plazo
+    monkeypatch.setattr(main, "REPORT_FLIGHT_TIMEOUT_S", 30)
+    main.report_cache.clear()
+    yield TestClient(main.app)
+    main.report_cache.clear()
+
+
+def with_bad_strategy(payload, index):
+    for metrics in payload[index]["config"]["metricsConfig"].values():
+        for config in metrics.values():
+            config["strategy"] = "bogus"
+    return payload
+
+
+def test_publish_first_value_wins():
+    flights = SingleFlight()
+    flight, leader = flights.claim("k")
+    assert leader
+    follower, leader = flights.claim("k")
+    assert follower is flight and not leader
+
+    flights.publish("k", flight, None)
+    flights.publish("k", flight, "tarde")
+    assert flights.wait(flight, 0) is None
+    assert len(flights) == 0
+    # La clave quedó libre: el próximo vuelve a ser líder
+    assert flights.claim("k")[1]
+
+
+def test_wait_times_out_without_publish():
+    flights = SingleFlight()
+    flight, _ = flights.claim("k")
+    assert flights.wait(flight, 0.01) is None
+
+
+@pytest.mark.parametrize("bad_index", [0, 1])
+def test_failed_plan_releases_claimed_keys(client, make_payload, bad_index):
+    payload = make_payload()
+    response = client.post("/analyze?strategy=linear", json=with_bad_strategy(payload, bad_index))
+    assert response.status_code == 422
+    assert len(main.report_flights) == 0
+
+    # El sensor válido del request fallido no deja a nadie esperando
+    good = make_payload()[1 - bad_index:2 - bad_index]
+    started = time.perf_counter()
+    assert client.post("/analyze?strategy=linear", json=good).status_code == 200
+    assert time.perf_counter() - started < 10
+    assert len(main.report_flights) == 0
+
+
+def test_stream_releases_keys_when_client_disconnects(make_payload):
+    main.report_cache.clear()
+    stats = main.new_run_stats()
+    payload = [main.MachineData(**item) for item in make_payload()]
+    options = main.with_deadline({**main.DEFAULT_OPTIONS, "strategy": "linear"})
+    reports, tasks, task_slots = main.plan_rows(payload, options, stats)
+    assert len(main.report_flights) == 2
+
+    def generate():
+        for sensor_report in main.iter_planned(reports, tasks, task_slots, stats, options):
+            yield b"{}\n"
+
+    response = main.FlightStreamingResponse(generate(), stats, media_type="application/x-ndjson")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("cliente desconectado")
+
+    with pytest.raises(Exception):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+    assert len(main.report_flights) == 0
+
+
+def test_job_with_bad_strategy_is_rejected_at_submit(client, make_payload):
+    response = client.post("/jobs?strategy=linear", json=with_bad_strategy(make_payload(), 1))
+    assert response.status_code == 422
+    assert len(main.report_flights) == 0
+
+
+def test_job_claims_and_releases_in_worker(client, make_payload):
+    response = client.post("/jobs?strategy=linear", json=make_payload(n_sensors=3))
+    assert response.status_code == 202
+    job_id = response.json()["jobId"]
+    for _ in range(200):
+        status = client.get(f"/jobs/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert status["status"] == "done"
+    assert status["totalSensors"] == 3
+    assert len(status["completedSensors"]) == 3
+    assert len(main.report_flights) == 0
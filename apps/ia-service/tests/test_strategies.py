@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from strategies import AUTO, FALLBACK, STRATEGIES, auto_strategy, select_strategy
+
+START = 1.7e9
+DAY = 86400
+
+
+def series(hours, shape, noise=0.5, step_s=60, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = START + np.arange(0, hours * 3600, step_s, dtype=np.float64)
+    return ts, shape(ts) + rng.normal(0, noise, len(ts))
+
+
+def daily(ts):
+    return 5 * np.sin(2 * np.pi * ts / DAY)
+
+
+def test_auto_short_history_is_linear():
+    assert auto_strategy(*series(3, daily)) == FALLBACK
+
+
+def test_auto_trend_plus_noise_is_linear():
+    assert auto_strategy(*series(48, lambda ts: (ts - START) / 3600 * 0.1)) == FALLBACK
+    assert auto_strategy(*series(120, lambda ts: 0 * ts)) == FALLBACK
+
+
+def test_auto_daily_cycle():
+    assert auto_strategy(*series(36, daily)) == "holt_winters"
+    assert auto_strategy(*series(120, daily)) == "prophet"
+
+
+def test_auto_structured_residuals_is_holt_winters():
+    rng = np.random.default_rng(1)
+    ts = START + np.arange(0, 12 * 3600, 60, dtype=np.float64)
+    assert auto_strategy(ts, np.cumsum(rng.normal(0, 0.3, len(ts)))) == "holt_winters"
+
+
+def test_select_strategy_calls_auto_only_for_auto():
+    calls = []
+
+    def pick():
+        calls.append(1)
+        return "holt_winters"
+
+    assert select_strategy(AUTO, 48, pick) == (STRATEGIES["holt_winters"], None)
+    assert select_strategy("linear", 48, pick) == (STRATEGIES["linear"], None)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("name", ["prophet", "holt_winters"])
+def test_select_strategy_short_history_falls_back(name):
+    assert select_strategy(AUTO, 1, name) == (STRATEGIES[FALLBACK], "short_history")
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import main
+from linear_engine import fit_linear_batch
+from streaming import MetricState
+
+client = TestClient(main.app)
+
+
+def test_incremental_state_matches_batch_statistics():
+    rng = np.random.default_rng(0)
+    ts = 1.7e9 + np.cumsum(rng.uniform(30, 90, 500))
+    y = 40 + 0.002 * (ts - ts[0]) + rng.normal(0, 1.5, len(ts))
+
+    state = MetricState(span=5)
+    for t, v in zip(ts, y):
+        assert state.update(t, v)
+
+    slopes, stds, counts = fit_linear_batch(ts, y)
+    assert state.n == counts[0] == 500
+    assert np.isclose(state.slope, slopes[0])
+    assert np.isclose(state.std, stds[0])
+    assert np.isclose(state.ewma, pd.Series(y).ewm(span=5, adjust=False).mean().iloc[-1])
+    assert (state.min, state.max) == (y.min(), y.max())
+
+
+def test_repeated_or_late_readings_are_rejected():
+    state = MetricState()
+    assert state.update(10.0, 1.0)
+    assert not state.update(10.0, 5.0)
+    assert not state.update(5.0, 5.0)
+    assert (state.n, state.rejected, state.ewma) == (1, 2, 1.0)
+
+
+def readings(start, n, value=lambda i: 20 + i):
+    return [
+        {"timestamp": f"2025-01-01T{(start + i) // 60:02d}:{(start + i) % 60:02d}:00Z", "metrics": {"thermal": {"temp": value(i)}}}
+        for i in range(n)
+    ]
+
+
+def test_stream_endpoints():
+    sensor = "stream-test"
+    config = {"thermal": {"temp": {"min": 0, "max": 100}}}
+    response = client.post("/stream/readings", json={"sensorId": sensor, "readings": readings(0, 30), "metricsConfig": config})
+    assert response.json() == {"sensorId": sensor, "accepted": 30, "rejected": 0}
+
+    # Lotes siguientes sin config: se mantiene la conocida; lo repetido se descarta
+    response = client.post("/stream/readings", json={"sensorId": sensor, "readings": readings(29, 11)})
+    assert response.json()["accepted"] == 10 and response.json()["rejected"] == 1
+
+    analysis = client.get(f"/stream/{sensor}?chart=true").json()["resumen"]["thermal"]["temp"]
+    assert analysis["samples"] == 40
+    assert analysis["strategy"] == "linear_streaming"
+    assert analysis["trend"] == "increasing"
+    assert analysis["lastTimestamp"] == "2025-01-01T00:39:00"
+    assert len(analysis["chartData"]) == 144
+
+    assert client.delete(f"/stream/{sensor}").json() == {"sensorId": sensor, "reset": True}
+    assert client.get(f"/stream/{sensor}").status_code == 404
+    assert client.delete(f"/stream/{sensor}").status_code == 404
@@ -1,12 +1,62 @@
-import os, json, time, datetime, requests
-from sensors.hwt905 import HWT905Sensor
+import os, json, gzip, time, datetime, threading, requests
+from requests.adapters import HTTPAdapter
+from sensors.registry import build_sensors, SensorReader
+from pipeline import RingBuffer, Sampler, Uploader
+from processing import Processor, iso
+from telemetry import TELEMETRY
+from outbox import Outbox
 
 API_URL = os.getenv("API_URL", "http://10.0.0.200:5000")
 CONFIG_PATH = os.getenv("CONFIG_PATH", "config.json")
 
+# Muestreo y subida desacoplados: el muestreo llena un buffer circular y la subida
+# manda lotes. BATCH_PATH vacío = una lectura por POST a /ingest (API sin /ingest/batch).
+SAMPLE_BUFFER_SIZE = int(os.getenv("SAMPLE_BUFFER_SIZE", "10000"))
+BATCH_MAX_READINGS = int(os.getenv("BATCH_MAX_READINGS", "200"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "1000"))
+BATCH_PATH = os.getenv("BATCH_PATH", "/ingest/batch")
+UPLOAD_GZIP = os.getenv("UPLOAD_GZIP", "1") == "1"
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "5"))
+
+# Cola en disco para cortes de red (QUEUE_PATH vacío = sin cola, las lecturas fallidas se pierden)
+QUEUE_PATH = os.getenv("QUEUE_PATH", "outbox.db")
+QUEUE_MAX_BYTES = int(os.getenv("QUEUE_MAX_BYTES", str(64 * 2**20)))
+QUEUE_BACKOFF_MIN_S = float(os.getenv("QUEUE_BACKOFF_MIN_S", "1"))
+QUEUE_BACKOFF_MAX_S = float(os.getenv("QUEUE_BACKOFF_MAX_S", "60"))
+
+# Sensores: la lista "sensors" de config.json (ver sensors/registry.py). Sin ella, inclinómetros
+# HWT905 en el bus RS-485: "dirección[:grupo],..." (ej. "0x50,0x51:mechanical_b").
+HWT905_PORT = os.getenv("HWT905_PORT") or None
+HWT905_BAUD = int(os.getenv("HWT905_BAUD", "9600"))
+HWT905_ADDRESSES = os.getenv("HWT905_ADDRESSES", "0x50")
+# Plazo para leer todos los sensores en cada ciclo (vacío = la mitad de intervalMs)
+READ_DEADLINE_MS = os.getenv("READ_DEADLINE_MS", "")
+
+# Telemetría del hub (jitter, latencias, colas, errores) en http://TELEMETRY_HOST:TELEMETRY_PORT/metrics
+# (puerto 0 = apagado). Con TELEMETRY_PIGGYBACK_S > 0 se adjunta un resumen ("hubStats")
+# a una lectura cada ese intervalo, para verlo desde la API sin entrar al hub.
+TELEMETRY_HOST = os.getenv("TELEMETRY_HOST", "127.0.0.1")
+TELEMETRY_PORT = int(os.getenv("TELEMETRY_PORT", "9100"))
+TELEMETRY_PIGGYBACK_S = float(os.getenv("TELEMETRY_PIGGYBACK_S", "0"))
+
+# Respuestas de /ingest que descartan el lote en vez de reintentarlo (payload inválido o demasiado grande)
+DROP_STATUSES = (400, 413, 422)
+
+# Claves que define el hub y no el servidor: se conservan cuando llega una config nueva
+LOCAL_CONFIG_KEYS = ("sensors",)
+
+# Una sola sesión: conexiones keep-alive reutilizadas en vez de una nueva por envío
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
 CONFIG = {}
 CONFIG_LAST_MODIFIED = None
 SENSORS = []
+READER = None
+# Agregación por ventana y compresión según la clave "processing" de la config (ver processing.py)
+PROCESSOR = Processor(lambda: CONFIG)
+LAST_PIGGYBACK = 0.0
 
 def load_config():
     """Carga o recarga la configuración desde disco si cambió."""
@@ -23,9 +73,15 @@ def load_config():
         return False
 
 
+def server_view(config: dict):
+    """La config sin las claves locales del hub (para comparar con la del servidor)."""
+    return {k: v for k, v in config.items() if k not in LOCAL_CONFIG_KEYS}
+
+
 def save_config(new_config: dict):
     """Guarda y aplica nueva configuración enviada por el servidor."""
     global CONFIG_LAST_MODIFIED
+    new_config = {**{k: CONFIG[k] for k in LOCAL_CONFIG_KEYS if k in CONFIG}, **new_config}
     try:
         with open(CONFIG_PATH, "w") as f:
             json.dump(new_config, f, indent=2)
@@ -37,78 +93,150 @@ def save_config(new_config: dict):
         print(f"❌ No se pudo guardar la nueva configuración: {e}")
 
 
+def post_json(path, payload):
+    """POST por la sesión compartida, con el cuerpo comprimido en gzip si UPLOAD_GZIP."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Content-Type": "application/json"}
+    if UPLOAD_GZIP:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    started = time.monotonic()
+    try:
+        res = SESSION.post(f"{API_URL}{path}", data=body, headers=headers, timeout=HTTP_TIMEOUT_S)
+    except requests.RequestException:
+        TELEMETRY.incr("upload.errors")
+        raise
+    TELEMETRY.observe("upload.rtt_ms", (time.monotonic() - started) * 1000.0)
+    TELEMETRY.incr(f"upload.http_{res.status_code // 100}xx")
+    TELEMETRY.incr("upload.bytes", len(body))
+    return res
+
+
 def send_sensor(config):
     """Envía la configuración del sensor al servidor."""
     try:
-        res = requests.post(f"{API_URL}/ingest/sensor", json=config, timeout=5)
+        res = post_json("/ingest/sensor", config)
         return res.ok
     except Exception as e:
         print("❌ Error enviando sensor:", e)
         return False
 
 
+def handle_response(res, count=1):
+    """Procesa la respuesta de /ingest: reenvía la config si hace falta y aplica la nueva. Devuelve si se entregó."""
+    print(f"📨 Respuesta del servidor: {res.status_code} ({count} lecturas)")
+
+    # Cuando el servidor dice ok=false => reenviar config. El lote no cuenta como entregado:
+    # queda en la cola y se reenvía (con backoff) una vez registrado el sensor.
+    if res.status_code == 404:
+        print("⚠️ El servidor no reconoce este sensor. Reenviando configuración...")
+        send_sensor(CONFIG)
+        return False
+
+    # Rechazo definitivo del contenido: reenviarlo no lo arregla, se descarta (y se cuenta)
+    if res.status_code in DROP_STATUSES:
+        print(f"❌ El servidor rechazó {count} lecturas ({res.status_code}): se descartan. {res.text[:200]}")
+        TELEMETRY.incr("upload.rejected", count)
+        return True
+
+    # Error del servidor u otro 4xx (auth, rate limit, timeout): la lectura no quedó guardada
+    if res.status_code >= 400:
+        return False
+
+    # Si no hay contenido, no hacemos nada más
+    if not res.content:
+        print("⚠️ El servidor no devolvió cuerpo en la respuesta.")
+        return True
+
+    # Intentar decodificar JSON
+    try:
+        data = res.json()
+    except Exception as e:
+        print(f"⚠️ No se pudo decodificar JSON: {e}")
+        print(f"Contenido crudo: {res.text[:300]}")
+        return True
+
+    # Revisar si el servidor mandó una nueva config
+    if "config" in data:
+        new_conf = data["config"]
+        if server_view(new_conf) != server_view(CONFIG):
+            print("🔄 Nueva configuración detectada en respuesta del servidor.")
+            save_config(new_conf)
+        else:
+            print("ℹ️ Configuración del servidor sin cambios.")
+    return True
+
+
 def send_reading(reading):
     """Envía una lectura y aplica nueva configuración si llega del servidor."""
     try:
-        res = requests.post(
-            f"{API_URL}/ingest", 
-            json=reading, 
-            timeout=5,
-            # verify=False
-        )
-
-        # Mostrar siempre código de respuesta
-        print(f"📨 Respuesta del servidor: {res.status_code}")
-
-        # Cuando el servidor dice ok=false => reenviar config
-        if res.status_code == 404:
-            print("⚠️ El servidor no reconoce este sensor. Reenviando configuración...")
-            send_sensor(CONFIG)
-            return
-
-        # Si no hay contenido, no hacemos nada más
-        if not res.content:
-            print("⚠️ El servidor no devolvió cuerpo en la respuesta.")
-            return
-
-        # Intentar decodificar JSON
-        try:
-            data = res.json()
-        except Exception as e:
-            print(f"⚠️ No se pudo decodificar JSON: {e}")
-            print(f"Contenido crudo: {res.text[:300]}")
-            return
-
-        # Revisar si el servidor mandó una nueva config
-        if "config" in data:
-            new_conf = data["config"]
-            if new_conf != CONFIG:
-                print("🔄 Nueva configuración detectada en respuesta del servidor.")
-                save_config(new_conf)
-            else:
-                print("ℹ️ Configuración del servidor sin cambios.")
-        else:
-            print("ℹ️ Sin nueva configuración en la respuesta.")
+        return handle_response(post_json("/ingest", reading))
+    except requests.RequestException as e:
+        print(f"❌ Error al comunicarse con el servidor: {e}")
+        return False
+
 
+def send_batch(readings):
+    """
+    Envía un lote de lecturas en un solo POST (o de a una si BATCH_PATH está vacío).
+    Devuelve las que quedan sin entregar, para reintentar solo esas.
+    """
+    if not BATCH_PATH:
+        # En orden: ante el primer fallo se corta (la API seguramente no responde)
+        for i, reading in enumerate(readings):
+            if not send_reading(reading):
+                return readings[i:]
+        return []
+    try:
+        delivered = handle_response(post_json(BATCH_PATH, {"readings": readings}), len(readings))
     except requests.RequestException as e:
         print(f"❌ Error al comunicarse con el servidor: {e}")
+        delivered = False
+    return [] if delivered else readings
 
 
-def build_reading():
-    """Construye el payload con las lecturas de todos los sensores."""
-    metrics = {}
-    for sensor in SENSORS:
-        try:
-            group = sensor.group
-            metrics.setdefault(group, {}).update(sensor.read())
-        except Exception as e:
-            metrics.setdefault(sensor.group, {})["error"] = True
+def read_deadline_s():
+    if READ_DEADLINE_MS:
+        return float(READ_DEADLINE_MS) / 1000.0
+    return CONFIG.get("intervalMs", 2000) / 2000.0
+
 
-    return {
-        "sensorId": CONFIG.get("sensorId", "unknown"),
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
-        "metrics": metrics
-    }
+def build_readings():
+    """
+    Lee todos los sensores (en paralelo, con plazo) y devuelve las lecturas a enviar:
+    con agregación o compresión activas puede no haber ninguna en este ciclo.
+    """
+    global LAST_PIGGYBACK
+    metrics = READER.read_all(read_deadline_s())
+    now = time.time()
+    readings = [
+        {
+            "sensorId": CONFIG.get("sensorId", "unknown"),
+            "timestamp": iso(ts),
+            "metrics": values
+        }
+        for ts, values in PROCESSOR.process(now, metrics, READER.drain_samples())
+    ]
+    if readings and TELEMETRY_PIGGYBACK_S > 0 and now - LAST_PIGGYBACK >= TELEMETRY_PIGGYBACK_S:
+        readings[-1]["hubStats"] = TELEMETRY.summary()
+        LAST_PIGGYBACK = now
+    return readings
+
+
+def sensor_specs():
+    """Sensores declarados en config.json, o los HWT905 de HWT905_ADDRESSES si no hay lista."""
+    if CONFIG.get("sensors"):
+        return CONFIG["sensors"]
+    entries = [e.strip() for e in HWT905_ADDRESSES.split(",") if e.strip()]
+    specs = []
+    for entry in entries:
+        address, _, group = entry.partition(":")
+        address = int(address, 0)
+        if not group:
+            group = "mechanical" if len(entries) == 1 else f"mechanical_{address:x}"
+        specs.append({"type": "hwt905", "port": HWT905_PORT, "baudrate": HWT905_BAUD,
+                      "address": address, "group": group})
+    return specs
 
 
 def run_loop():
@@ -116,24 +244,57 @@ def run_loop():
         print("❌ No se pudo cargar configuración. Abortando.")
         return
 
-    global SENSORS
-    SENSORS = [HWT905Sensor()]
+    global SENSORS, READER
+    SENSORS = build_sensors(sensor_specs())
+    READER = SensorReader(SENSORS)
 
     # Registrar sensor
     while not send_sensor(CONFIG):
         time.sleep(5)
 
-    while True:
-        # Releer config manual si cambió
-        load_config()
+    # Muestreo a tasa fija (intervalMs más reciente) y subida por lotes en otro hilo
+    stop = threading.Event()
+    buffer = RingBuffer(SAMPLE_BUFFER_SIZE)
+    sampler = Sampler(build_readings, buffer, lambda: CONFIG.get("intervalMs", 2000) / 1000.0, stop)
+    outbox = Outbox(QUEUE_PATH, QUEUE_MAX_BYTES) if QUEUE_PATH else None
+    if outbox is not None and len(outbox):
+        print(f"📦 {len(outbox)} lecturas pendientes en {QUEUE_PATH}: se reenvían primero.")
 
-        # Enviar lectura
-        reading = build_reading()
-        send_reading(reading)
+    TELEMETRY.gauge("intervalMs", lambda: CONFIG.get("intervalMs", 2000))
+    TELEMETRY.gauge("buffer", lambda: {"depth": len(buffer), "dropped": buffer.dropped})
+    TELEMETRY.gauge("processing", PROCESSOR.stats)
+    TELEMETRY.gauge("sensors", READER.stats, summary=False)
+    if outbox is not None:
+        TELEMETRY.gauge("queue", outbox.stats)
+    if TELEMETRY_PORT:
+        try:
+            TELEMETRY.serve(TELEMETRY_HOST, TELEMETRY_PORT)
+        except OSError as e:
+            print(f"⚠️ No se pudo abrir la telemetría en el puerto {TELEMETRY_PORT}: {e}")
 
-        # Esperar el intervalo más reciente
-        interval = CONFIG.get("intervalMs", 2000) / 1000.0
-        time.sleep(interval)
+    # Releer config manual si cambió (antes de cada lote, no en cada muestra)
+    uploader = Uploader(
+        buffer, send_batch, BATCH_MAX_READINGS, BATCH_MAX_WAIT_MS / 1000.0, stop, before_batch=load_config,
+        outbox=outbox, backoff_min_s=QUEUE_BACKOFF_MIN_S, backoff_max_s=QUEUE_BACKOFF_MAX_S,
+    )
+    sampler.start()
+    uploader.start()
+
+    try:
+        while sampler.is_alive():
+            sampler.join(1.0)
+    finally:
+        # Cortar el muestreo y dar tiempo a subir lo que quedó en el buffer
+        stop.set()
+        buffer.close()
+        uploader.join(HTTP_TIMEOUT_S * 2)
+        if buffer.dropped:
+            print(f"⚠️ {buffer.dropped} lecturas descartadas por buffer lleno.")
+        if outbox is not None and not uploader.is_alive():
+            if outbox.evicted:
+                print(f"⚠️ {outbox.evicted} lecturas descartadas por cola llena.")
+            outbox.close()
+        READER.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+import json, sqlite3, threading, zlib
+
+
+class Outbox:
+    """
+    Cola persistente (store-and-forward) en SQLite con WAL.
+    Cada fila es un lote de lecturas comprimido, no una lectura: una transacción por lote
+    y synchronous=NORMAL (sin fsync por commit en WAL) para no gastar la tarjeta SD.
+    Se entrega en orden (del más viejo al más nuevo); con el tope de bytes lleno se
+    descartan los lotes más viejos.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum solo se puede fijar antes de crear tablas
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, count INTEGER NOT NULL, body BLOB NOT NULL)"
+        )
+        chunks, readings, size = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(body)), 0) FROM chunks"
+        ).fetchone()
+        self.chunks = chunks
+        self.readings = readings
+        self.bytes = size
+        self.evicted = 0
+
+    def append(self, readings):
+        """Guarda un lote en una sola transacción."""
+        body = zlib.compress(json.dumps(readings, separators=(",", ":")).encode(), 6)
+        with self._lock:
+            counters = (self.chunks, self.readings, self.bytes, self.evicted)
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute("INSERT INTO chunks (count, body) VALUES (?, ?)", (len(readings), body))
+                self.chunks += 1
+                self.readings += len(readings)
+                self.bytes += len(body)
+                if self.bytes > self.max_bytes:
+                    self._evict()
+                self.db.execute("COMMIT")
+            except BaseException:
+                # Sin esto la conexión queda dentro de la transacción y fallan las escrituras siguientes
+                self.db.execute("ROLLBACK")
+                self.chunks, self.readings, self.bytes, self.evicted = counters
+                raise
+
+    def _evict(self):
+        """Descarta los lotes más viejos hasta volver debajo del tope (siempre queda el más nuevo)."""
+        last_id = None
+        while self.bytes > self.max_bytes and self.chunks > 1:
+            after = -1 if last_id is None else last_id
+            rows = self.db.execute(
+                "SELECT id, count, LENGTH(body) FROM chunks WHERE id > ? ORDER BY id LIMIT 16", (after,)
+            ).fetchall()
+            for row_id, count, size in rows:
+                if self.bytes <= self.max_bytes or self.chunks <= 1:
+                    break
+                last_id = row_id
+                self.chunks -= 1
+                self.readings -= count
+                self.bytes -= size
+                self.evicted += count
+        if last_id is not None:
+            self.db.execute("DELETE FROM chunks WHERE id <= ?", (last_id,))
+
+    def peek(self, max_readings: int):
+        """(último id, lecturas) de los lotes más viejos hasta juntar `max_readings`, o None si está vacía."""
+        with self._lock:
+            last_id = None
+            readings = []
+            for row_id, body in self.db.execute("SELECT id, body FROM chunks ORDER BY id"):
+                if readings and len(readings) >= max_readings:
+                    break
+                last_id = row_id
+                readings.extend(json.loads(zlib.decompress(body)))
+            return None if last_id is None else (last_id, readings)
+
+    def ack(self, last_id: int, remaining=()):
+        """
+        Borra los lotes ya entregados. `remaining`: lecturas de esos lotes que no se entregaron;
+        quedan como un lote con el id `last_id`, así siguen primeras en la cola.
+        Al vaciarse, compacta el archivo y el WAL.
+        """
+        body = zlib.compress(json.dumps(remaining, separators=(",", ":")).encode(), 6) if remaining else None
+        with self._lock:
+            self.db.execute("BEGIN")
+            try:
+                count, size = self.db.execute(
+                    "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(body)), 0) FROM chunks WHERE id <= ?",
+                    (last_id,),
+                ).fetchone()
+                deleted = self.db.execute("DELETE FROM chunks WHERE id <= ?", (last_id,)).rowcount
+                if body is not None:
+                    self.db.execute("INSERT INTO chunks (id, count, body) VALUES (?, ?, ?)",
+                                    (last_id, len(remaining), body))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.chunks -= deleted
+            self.readings -= count
+            self.bytes -= size
+            if body is not None:
+                self.chunks += 1
+                self.readings += len(remaining)
+                self.bytes += len(body)
+            if self.chunks == 0:
+                self.db.execute("PRAGMA incremental_vacuum").fetchall()  # libera una página por paso
+                self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def __len__(self):
+        return self.readings
+
+    def stats(self):
+        return {"readings": self.readings, "chunks": self.chunks, "bytes": self.bytes, "evicted": self.evicted}
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,164 @@
+import time, random, threading
+from collections import deque
+from telemetry import TELEMETRY
+
+
+class RingBuffer:
+    """Buffer acotado entre el muestreo y la subida. Si se llena, se descarta lo más viejo."""
+
+    def __init__(self, capacity: int):
+        self._items = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._wanted = 1          # tamaño de lote que espera el consumidor
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            # Despertar al consumidor solo cuando ya hay un lote (no en cada muestra)
+            if len(self._items) >= self._wanted:
+                self._cond.notify()
+
+    def drain(self, max_items: int, timeout: float):
+        """Espera hasta `timeout` s a que haya `max_items` y devuelve lo disponible (puede ser vacío)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._wanted = max_items
+            while len(self._items) < max_items and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(max_items, len(self._items))
+            return [self._items.popleft() for _ in range(n)]
+
+    def close(self):
+        """Deja de esperar lotes completos: el consumidor se lleva lo que haya y termina."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Sampler(threading.Thread):
+    """
+    Muestreo a tasa fija: cada tick se programa sobre el reloj monotónico, no
+    "leer + dormir", así el tiempo de lectura no estira el período.
+    Si una lectura se atrasa más de un período, se realinea en vez de disparar ráfagas.
+    """
+
+    def __init__(self, sample, buffer: RingBuffer, period_s, stop: threading.Event):
+        super().__init__(name="sampler", daemon=True)
+        self.sample = sample          # () -> lecturas a encolar (puede ser vacía)
+        self.buffer = buffer
+        self.period_s = period_s      # () -> segundos (la config puede cambiar en caliente)
+        self.stop = stop
+        self.samples = 0
+        self.overruns = 0
+
+    def run(self):
+        next_t = time.monotonic()
+        while not self.stop.is_set():
+            # Jitter: cuánto tarde arrancó el tick respecto de lo programado
+            started = time.monotonic()
+            TELEMETRY.observe("sampler.jitter_ms", (started - next_t) * 1000.0)
+            for reading in self.sample():
+                self.buffer.put(reading)
+            self.samples += 1
+            TELEMETRY.observe("sampler.cycle_ms", (time.monotonic() - started) * 1000.0)
+
+            next_t += self.period_s()
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                self.stop.wait(delay)
+            else:
+                self.overruns += 1
+                TELEMETRY.incr("sampler.overruns")
+                next_t = time.monotonic()
+
+
+class Uploader(threading.Thread):
+    """
+    Saca lotes del buffer y los envía; la red nunca bloquea al muestreo.
+    Con `outbox`, cada lote pasa primero por la cola en disco y se envía desde ahí en orden:
+    si la API no responde, se reintenta con backoff exponencial mientras se sigue encolando.
+    """
+
+    def __init__(self, buffer: RingBuffer, send, batch_size: int, max_wait_s: float,
+                 stop: threading.Event, before_batch=None, outbox=None,
+                 backoff_min_s: float = 1.0, backoff_max_s: float = 60.0):
+        super().__init__(name="uploader", daemon=True)
+        self.buffer = buffer
+        self.send = send              # (lecturas) -> las que quedan sin entregar ([] = todas)
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+        self.stop = stop
+        self.before_batch = before_batch
+        self.outbox = outbox
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+        self.retry_at = 0.0
+        self.failures = 0             # fallos consecutivos (para el backoff)
+        self.sent = 0
+        self.failed = 0
+
+    def run(self):
+        while not self.stop.is_set():
+            self._cycle(self.max_wait_s)
+        # Al cortar: lo que quedó en el buffer se envía, o se guarda para el próximo arranque
+        while len(self.buffer):
+            self._cycle(0)
+
+    def _cycle(self, wait_s):
+        batch = self.buffer.drain(self.batch_size, wait_s)
+        if self.before_batch:
+            self.before_batch()
+        if self.outbox is None:
+            if batch:
+                self._send(batch)
+            return
+        if batch:
+            self.outbox.append(batch)
+        if not self.stop.is_set():
+            self._replay()
+
+    def _send(self, readings):
+        """Envía y devuelve las lecturas que no se entregaron."""
+        remaining = self.send(readings)
+        delivered = len(readings) - len(remaining)
+        if delivered:
+            self.sent += delivered
+            TELEMETRY.incr("upload.sent", delivered)
+        if remaining:
+            self.failed += len(remaining)
+            TELEMETRY.incr("upload.failed", len(remaining))
+        return remaining
+
+    def _replay(self):
+        """Envía la cola del más viejo al más nuevo hasta vaciarla, fallar o tener un lote nuevo esperando."""
+        while time.monotonic() >= self.retry_at and not self.stop.is_set():
+            pending = self.outbox.peek(self.batch_size)
+            if pending is None:
+                return
+            last_id, readings = pending
+            remaining = self._send(readings)
+            if len(remaining) < len(readings):
+                # Entrega parcial: en la cola queda solo lo que falta, en el mismo lugar
+                self.outbox.ack(last_id, remaining)
+            if remaining:
+                self.failures += 1
+                delay = min(self.backoff_max_s, self.backoff_min_s * 2 ** (self.failures - 1))
+                self.retry_at = time.monotonic() + delay * random.uniform(0.8, 1.2)
+                print(f"⏳ API no disponible: {len(self.outbox)} lecturas en cola, reintento en {delay:.1f}s")
+                return
+            if self.failures:
+                print(f"✅ API disponible de nuevo, reenviando cola ({len(self.outbox)} lecturas pendientes)")
+            self.failures = 0
+            self.retry_at = 0.0
+            if len(self.buffer) >= self.batch_size:
+                return
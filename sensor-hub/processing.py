@@ -0,0 +1,222 @@
+import math, datetime
+
+# Procesamiento en el hub antes de subir, configurado desde el servidor (clave "processing"):
+#   windowMs     ventana de agregación; 0 = sin ventana (un valor por ciclo)
+#   stats        qué se manda por ventana: "mean" (con el nombre de la métrica), "min", "max", "rms"
+#   compression  "none", "deadband" o "swinging_door"
+#   deadband     desvío absoluto que hay que superar para mandar un valor (por métrica:
+#                metricsConfig[grupo][métrica]["deadband"])
+#   heartbeatMs  máximo tiempo sin mandar una métrica aunque no cambie
+# Sin "processing" en la config todo queda como antes: cada ciclo se manda completo.
+STAT_SUFFIX = {"mean": "", "min": "_min", "max": "_max", "rms": "_rms"}
+DEFAULT_STATS = ("mean", "min", "max", "rms")
+
+
+def iso(ts: float):
+    """Epoch -> mismo formato de timestamp que las lecturas ("...Z")."""
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def is_flag(value):
+    return isinstance(value, bool) or not isinstance(value, (int, float))
+
+
+class Window:
+    """Acumula valores por (grupo, métrica) con sumas corridas: no guarda las muestras."""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.acc = {}             # (grupo, métrica) -> [n, suma, suma de cuadrados, min, max]
+        self.flags = {}           # grupo -> {flag: True}
+
+    def add(self, group, metric, value):
+        acc = self.acc.get((group, metric))
+        if acc is None:
+            self.acc[(group, metric)] = [1, value, value * value, value, value]
+            return
+        acc[0] += 1
+        acc[1] += value
+        acc[2] += value * value
+        if value < acc[3]:
+            acc[3] = value
+        if value > acc[4]:
+            acc[4] = value
+
+    def flag(self, group, name):
+        self.flags.setdefault(group, {})[name] = True
+
+    def close(self, stats):
+        metrics = {group: dict(flags) for group, flags in self.flags.items()}
+        for (group, metric), (n, total, squares, low, high) in self.acc.items():
+            values = {"mean": total / n, "min": low, "max": high, "rms": math.sqrt(squares / n)}
+            out = metrics.setdefault(group, {})
+            for stat in stats:
+                out[metric + STAT_SUFFIX[stat]] = round(values[stat], 4)
+        return metrics
+
+
+class DeadbandFilter:
+    """Manda un valor solo si se aleja más de `deviation` del último enviado (o vence el heartbeat)."""
+
+    def __init__(self):
+        self.sent = None          # (t, valor) último enviado
+
+    def offer(self, t, value, deviation, heartbeat_s):
+        if self.sent is None or abs(value - self.sent[1]) > deviation or t - self.sent[0] >= heartbeat_s:
+            self.sent = (t, value)
+            return [(t, value)]
+        return []
+
+
+class SwingingDoorFilter:
+    """
+    Compresión swinging door: desde el último punto guardado (± deviation) se abren dos
+    "puertas" que giran con cada punto nuevo; cuando se cruzan, ninguna recta desde ahí
+    cubre a todos los intermedios y se guarda el punto anterior, con su propio timestamp.
+    """
+
+    def __init__(self):
+        self.archived = None      # (t, valor) último enviado
+        self.last = None          # último punto recibido, todavía no enviado
+        self.slope_upper = -math.inf
+        self.slope_lower = math.inf
+
+    def _restart(self, point):
+        self.archived = point
+        self.last = None
+        self.slope_upper = -math.inf
+        self.slope_lower = math.inf
+
+    def _open(self, t, value, deviation):
+        """Ajusta la puerta con el punto; False si se cerró."""
+        t0, v0 = self.archived
+        dt = t - t0
+        if dt <= 0:
+            return True
+        self.slope_upper = max(self.slope_upper, (value - v0 - deviation) / dt)
+        self.slope_lower = min(self.slope_lower, (value - v0 + deviation) / dt)
+        return self.slope_upper <= self.slope_lower
+
+    def offer(self, t, value, deviation, heartbeat_s):
+        if self.archived is None or t - self.archived[0] >= heartbeat_s:
+            # El punto pendiente sale antes: sin él, la recta hasta el nuevo no cubre a los intermedios
+            emitted = [self.last] if self.last is not None and self.last != self.archived else []
+            self._restart((t, value))
+            return emitted + [(t, value)]
+        if self._open(t, value, deviation):
+            self.last = (t, value)
+            return []
+        # Puerta cerrada: se guarda el punto anterior y se vuelve a abrir desde él
+        emitted = self.last or (t, value)
+        self._restart(emitted)
+        if emitted[0] != t:
+            self._open(t, value, deviation)
+            self.last = (t, value)
+        return [emitted]
+
+
+FILTERS = {"deadband": DeadbandFilter, "swinging_door": SwingingDoorFilter}
+
+
+class Processor:
+    """
+    Etapa entre la lectura de sensores y el buffer de subida: agrega por ventana y comprime.
+    Recibe las métricas del ciclo (y las muestras de alta tasa de los sensores que las
+    tienen) y devuelve [(timestamp, métricas)] a enviar, posiblemente vacío.
+    """
+
+    def __init__(self, config_fn):
+        self.config_fn = config_fn    # () -> config actual (la del servidor puede cambiar en caliente)
+        self.window = None
+        self.filters = {}             # (grupo, métrica) -> filtro
+        self.settings = None
+        self.received = 0
+        self.emitted = 0
+
+    def _settings(self, config):
+        processing = config.get("processing") or {}
+        settings = (
+            float(processing.get("windowMs", 0)) / 1000.0,
+            tuple(s for s in processing.get("stats", DEFAULT_STATS) if s in STAT_SUFFIX) or ("mean",),
+            processing.get("compression", "none"),
+            float(processing.get("deadband", 0.0)),
+            float(processing.get("heartbeatMs", 60000)) / 1000.0,
+        )
+        if settings != self.settings:
+            # Cambió la config: se arranca de cero (el próximo valor de cada métrica sale siempre)
+            self.settings = settings
+            self.window = None
+            self.filters = {}
+        return settings
+
+    def process(self, now, metrics, samples=None):
+        """
+        metrics: {grupo: {métrica: valor}} del ciclo.
+        samples: {grupo: [(t, {métrica: valor})]} de alta tasa desde el ciclo anterior.
+        """
+        config = self.config_fn()
+        window_s, stats, compression, deadband, heartbeat_s = self._settings(config)
+
+        if window_s <= 0:
+            self.received += sum(len(values) for values in metrics.values())
+        else:
+            metrics = self._aggregate(now, metrics, samples or {}, window_s, stats)
+            if metrics is None:
+                return []
+
+        if compression not in FILTERS:
+            self.emitted += sum(len(values) for values in metrics.values())
+            return [(now, metrics)]
+        return self._compress(now, metrics, config, compression, deadband, heartbeat_s)
+
+    def _aggregate(self, now, metrics, samples, window_s, stats):
+        if self.window is None:
+            self.window = Window(now)
+        window = self.window
+        for group, values in metrics.items():
+            high_rate = samples.get(group)
+            for metric, value in values.items():
+                if is_flag(value):
+                    window.flag(group, metric)
+                elif not high_rate:
+                    window.add(group, metric, value)
+                    self.received += 1
+            # Con muestras de alta tasa se agregan esas (las del ciclo son una de ellas)
+            for _, sample in high_rate or ():
+                for metric in values:
+                    value = sample.get(metric)
+                    if value is not None:
+                        window.add(group, metric, value)
+                        self.received += 1
+        if now - window.start < window_s:
+            return None
+        self.window = Window(now)
+        return window.close(stats)
+
+    def _compress(self, now, metrics, config, compression, deadband, heartbeat_s):
+        limits = config.get("metricsConfig") or {}
+        by_time = {}
+        for group, values in metrics.items():
+            group_limits = limits.get(group) or {}
+            for metric, value in values.items():
+                if is_flag(value):
+                    by_time.setdefault(now, {}).setdefault(group, {})[metric] = value
+                    continue
+                # min/max/rms usan el deadband de su métrica base
+                base = metric
+                for suffix in ("_min", "_max", "_rms"):
+                    if metric.endswith(suffix) and metric[:-len(suffix)] in values:
+                        base = metric[:-len(suffix)]
+                deviation = float((group_limits.get(base) or {}).get("deadband", deadband))
+                key = (group, metric)
+                filt = self.filters.get(key)
+                if filt is None:
+                    filt = self.filters[key] = FILTERS[compression]()
+                for t, kept in filt.offer(now, value, deviation, heartbeat_s):
+                    by_time.setdefault(t, {}).setdefault(group, {})[metric] = kept
+                    self.emitted += 1
+        return sorted(by_time.items(), key=lambda item: item[0])
+
+    def stats(self):
+        ratio = self.emitted / self.received if self.received else None
+        return {"received": self.received, "emitted": self.emitted, "ratio": ratio}
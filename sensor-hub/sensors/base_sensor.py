@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from typing import Dict, List, Tuple
 
 class BaseSensor(ABC):
     """Clase base para sensores físicos o simulados."""
 
+    # Sensores de alta tasa: nombre de cada campo de las muestras de drain_samples()
+    sample_fields: Tuple[str, ...] = ()
+
     def __init__(self, name: str, group: str):
         self.name = name      # Ej: "roll", "rpm"
         self.group = group    # Ej: "mechanical", "thermal"
@@ -12,3 +15,7 @@ class BaseSensor(ABC):
     def read(self) -> Dict[str, float]:
         """Debe devolver un diccionario de métricas."""
         pass
+
+    def drain_samples(self) -> List[tuple]:
+        """Muestras (timestamp, *sample_fields) acumuladas desde la última llamada; vacío si no muestrea solo."""
+        return []
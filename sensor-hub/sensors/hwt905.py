@@ -1,25 +1,38 @@
 import serial, struct, time, os, platform
+from collections import deque
 from sensors.base_sensor import BaseSensor
+from sensors.modbus import crc16, leer_registros, ModbusFrameParser
+from sensors.rs485_bus import RS485Bus, RESPONSE_TIMEOUT_S
 
-def crc16(data: bytes):
-    crc = 0xFFFF
-    for b in data:
-        crc ^= b
-        for _ in range(8):
-            if crc & 1:
-                crc = (crc >> 1) ^ 0xA001
-            else:
-                crc >>= 1
-    return crc
-
-def construir_comando(direccion):
-    frame = bytes([direccion, 0x03, 0x00, 0x34, 0x00, 0x06])
-    crc = crc16(frame)
-    return frame + bytes([crc & 0xFF, crc >> 8])
+# Mapa de registros del HWT905 (Modbus): 0x34..0x36 aceleración, 0x37..0x39 velocidad
+# angular, 0x3A..0x3C campo magnético, 0x3D..0x3F roll/pitch/yaw. Se leen los 12 de una vez.
+REG_INICIO = 0x34
+REG_CANTIDAD = 12
+SAMPLE_FIELDS = ("ax", "ay", "az", "gx", "gy", "gz", "roll", "pitch", "yaw")
+
+# Modo continuo: el bus RS-485 encadena pedidos sin sleep fijo (ver rs485_bus.py)
+CONTINUOUS = os.getenv("HWT905_CONTINUOUS", "1") == "1"
+SAMPLE_BUFFER = int(os.getenv("HWT905_SAMPLE_BUFFER", "4096"))
+STALE_S = float(os.getenv("HWT905_STALE_MS", "1000")) / 1000.0
+
+
+def construir_comando(direccion, registro=REG_INICIO, cantidad=REG_CANTIDAD):
+    return leer_registros(direccion, registro, cantidad)
 
 def a_grados(valor):
     return valor / 32768.0 * 180.0
 
+def decodificar(data: bytes):
+    """Registros 0x34..0x3F -> (ax, ay, az [g], gx, gy, gz [°/s], roll, pitch, yaw [°])."""
+    ax, ay, az, gx, gy, gz, _, _, _, roll, pitch, yaw = struct.unpack(">12h", data[:24])
+    acc = 16.0 / 32768.0
+    gyro = 2000.0 / 32768.0
+    return (
+        ax * acc, ay * acc, az * acc,
+        gx * gyro, gy * gyro, gz * gyro,
+        a_grados(roll), a_grados(pitch), a_grados(yaw),
+    )
+
 def detectar_puerto():
     """Detecta el puerto según el sistema operativo."""
     sistema = platform.system().lower()
@@ -30,17 +43,39 @@ def detectar_puerto():
             return candidato
     raise FileNotFoundError("No se encontró ningún puerto serial disponible.")
 
+
 class HWT905Sensor(BaseSensor):
-    """Lectura de ángulos (roll, pitch, yaw) desde el HWT905-485."""
+    """
+    Lectura de ángulos (roll, pitch, yaw) desde el HWT905-485.
+    En modo continuo el sensor es un dispositivo del bus RS-485 de su puerto (compartido
+    con los demás inclinómetros de la línea): `read()` devuelve el último valor sin
+    bloquear y `drain_samples()` entrega todas las muestras (SAMPLE_FIELDS) desde la última llamada.
+    """
+
+    sample_fields = SAMPLE_FIELDS
 
-    def __init__(self, port: str = None, baudrate: int = 9600, address: int = 0x50):
-        super().__init__("hwt905", "mechanical")
+    def __init__(self, port: str = None, baudrate: int = 9600, address: int = 0x50,
+                 continuous: bool = None, group: str = "mechanical", timeout_ms: float = None):
+        super().__init__("hwt905", group)
         self.port = port or detectar_puerto()
         self.baudrate = baudrate
         self.address = address
         self.comando = construir_comando(address)
+        self.continuous = CONTINUOUS if continuous is None else continuous
+        # Timeout de respuesta propio (clave "timeout_ms" en config.json); si no, el del bus
+        self.timeout_s = RESPONSE_TIMEOUT_S if timeout_ms is None else float(timeout_ms) / 1000.0
+        self.latest = None            # (timestamp, muestra)
+        self.samples = deque(maxlen=SAMPLE_BUFFER)
 
         self.ser = None
+        self.bus = None
+        if self.continuous:
+            self.bus = RS485Bus.shared(self.port, self.baudrate)
+            self.device = self.bus.add_device(address, self.comando, 2 * REG_CANTIDAD, self._publish, self.timeout_s)
+            self.ser = self.bus.ser
+            self.simulado = self.bus.simulado
+            return
+
         try:
             self.ser = serial.Serial(self.port, self.baudrate, timeout=0.2)
             print(f"✅ Conectado al puerto {self.port}")
@@ -51,6 +86,35 @@ class HWT905Sensor(BaseSensor):
         else:
             self.simulado = False
 
+    # --- Modo continuo ---
+
+    def _publish(self, data):
+        sample = decodificar(data)
+        now = time.time()
+        self.latest = (now, sample)
+        self.samples.append((now,) + sample)
+
+    def drain_samples(self):
+        """Muestras [(timestamp, *SAMPLE_FIELDS)] acumuladas desde la última llamada."""
+        samples = []
+        while self.samples:
+            samples.append(self.samples.popleft())
+        return samples
+
+    def stats(self):
+        """Contadores del dispositivo más los del bus (CRC, resincronizaciones) que comparte."""
+        if self.bus is None:
+            return {}
+        return {**self.device.counters, "bus": self.bus.stats()}
+
+    def close(self):
+        if self.bus is not None:
+            self.bus.remove_device(self.device)
+        elif self.ser is not None:
+            self.ser.close()
+
+    # --- Lectura ---
+
     def read(self):
         """Lee el sensor real o genera datos simulados."""
         if self.simulado or not self.ser:
@@ -60,18 +124,24 @@ class HWT905Sensor(BaseSensor):
                 "yaw": 0.0
             }
 
+        if self.continuous:
+            # Sin una trama válida reciente: error (build_reading lo marca), no ceros
+            if self.latest is None or time.time() - self.latest[0] > STALE_S:
+                raise TimeoutError(f"HWT905 {self.address:#x} sin tramas válidas recientes")
+            _, sample = self.latest
+            return {name: round(sample[SAMPLE_FIELDS.index(name)], 2) for name in ("roll", "pitch", "yaw")}
+
         try:
+            self.ser.reset_input_buffer()
             self.ser.write(self.comando)
-            time.sleep(0.05)
-            respuesta = self.ser.read(33)
-            if len(respuesta) >= 17 and respuesta[1] == 0x03:
-                data = respuesta[3:15]
-                roll_raw, pitch_raw, yaw_raw = struct.unpack(">hhh", data[:6])
-                return {
-                    "roll": round(a_grados(roll_raw), 2),
-                    "pitch": round(a_grados(pitch_raw), 2),
-                    "yaw": round(a_grados(yaw_raw), 2)
-                }
+            parser = ModbusFrameParser({self.address: 2 * REG_CANTIDAD})
+            deadline = time.monotonic() + self.timeout_s + self.ser.timeout
+            while time.monotonic() < deadline:
+                frames = parser.feed(self.ser.read(self.ser.in_waiting or 1))
+                if frames:
+                    _, data = frames[0]
+                    sample = decodificar(data)
+                    return {name: round(sample[SAMPLE_FIELDS.index(name)], 2) for name in ("roll", "pitch", "yaw")}
         except Exception as e:
             print("⚠️ Error al leer HWT905:", e)
 
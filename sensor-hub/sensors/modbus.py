@@ -0,0 +1,101 @@
+# Utilidades Modbus RTU compartidas por los sensores del bus RS-485.
+
+
+def _tabla_crc():
+    tabla = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        tabla.append(crc)
+    return tuple(tabla)
+
+_CRC_TABLE = _tabla_crc()
+
+def crc16(data: bytes):
+    """CRC-16/Modbus con tabla: un paso por byte en vez de ocho."""
+    crc = 0xFFFF
+    tabla = _CRC_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ tabla[(crc ^ b) & 0xFF]
+    return crc
+
+def leer_registros(direccion, registro, cantidad):
+    """Pedido 0x03 (read holding registers) con su CRC."""
+    frame = bytes([direccion, 0x03, registro >> 8, registro & 0xFF, cantidad >> 8, cantidad & 0xFF])
+    crc = crc16(frame)
+    return frame + bytes([crc & 0xFF, crc >> 8])
+
+
+class ModbusFrameParser:
+    """
+    Arma respuestas Modbus RTU (función 0x03) desde el flujo de bytes del puerto.
+    Si lo que hay no es un inicio de trama válido o el CRC no cierra, descarta un byte y
+    vuelve a sincronizar (eco del propio pedido, basura en la línea, tramas cortadas).
+    `expected`: dirección -> bytes de datos esperados en su respuesta.
+    """
+
+    def __init__(self, expected=None):
+        self.expected = dict(expected or {})
+        self.buffer = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+        self.exceptions = 0
+        self.discarded = 0      # bytes descartados al resincronizar
+
+    def expect(self, address, data_bytes):
+        self.expected[address] = data_bytes
+
+    def reset(self):
+        self.discarded += len(self.buffer)
+        self.buffer.clear()
+
+    def _skip(self, n=1):
+        del self.buffer[:n]
+        self.discarded += n
+
+    def _crc_ok(self, frame):
+        return crc16(frame[:-2]) == frame[-2] | (frame[-1] << 8)
+
+    def feed(self, chunk: bytes):
+        """Agrega bytes y devuelve [(dirección, datos)] de las tramas completas y válidas."""
+        self.buffer += chunk
+        buf = self.buffer
+        frames = []
+        while len(buf) >= 5:
+            address, function = buf[0], buf[1]
+            data_bytes = self.expected.get(address)
+            if data_bytes is None:
+                self._skip()
+                continue
+            if function == 0x83:
+                # Respuesta de excepción: dirección, 0x83, código, CRC
+                if self._crc_ok(buf[:5]):
+                    self.exceptions += 1
+                    del buf[:5]
+                else:
+                    self._skip()
+                continue
+            if function != 0x03 or buf[2] != data_bytes:
+                self._skip()
+                continue
+            total = 3 + data_bytes + 2
+            if len(buf) < total:
+                break
+            frame = buf[:total]
+            if not self._crc_ok(frame):
+                self.crc_errors += 1
+                self._skip()
+                continue
+            frames.append((address, bytes(frame[3:3 + data_bytes])))
+            self.frames += 1
+            del buf[:total]
+        return frames
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "crcErrors": self.crc_errors,
+            "exceptions": self.exceptions,
+            "discardedBytes": self.discarded,
+        }
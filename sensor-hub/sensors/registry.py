@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from sensors.hwt905 import HWT905Sensor
+from telemetry import TELEMETRY
+
+# Tipos de sensor que se pueden declarar en config.json ("sensors": [{"type": ..., ...}]).
+# El resto de las claves de cada entrada se pasan tal cual al constructor.
+SENSOR_TYPES = {
+    "hwt905": HWT905Sensor,
+}
+
+
+def create_sensor(spec: dict):
+    """Instancia un sensor desde su entrada de configuración."""
+    params = dict(spec)
+    kind = params.pop("type", None)
+    cls = SENSOR_TYPES.get(kind)
+    if cls is None:
+        raise ValueError(f"Tipo de sensor desconocido: {kind!r} (disponibles: {', '.join(SENSOR_TYPES)})")
+    # Direcciones en hexa como texto ("0x50") son lo habitual en la config
+    if isinstance(params.get("address"), str):
+        params["address"] = int(params["address"], 0)
+    return cls(**params)
+
+
+def build_sensors(specs):
+    """Sensores de la lista de configuración; una entrada inválida se informa y se saltea."""
+    sensors = []
+    for spec in specs:
+        try:
+            sensors.append(create_sensor(spec))
+        except Exception as e:
+            print(f"⚠️ No se pudo crear el sensor {spec}: {e}")
+    return sensors
+
+
+class SensorReader:
+    """
+    Lee todos los sensores en paralelo con un plazo por ciclo: un dispositivo lento o
+    colgado no atrasa a los demás ni estira el período de muestreo.
+    Un sensor que no respondió a tiempo queda "stale" en ese ciclo; mientras su lectura
+    anterior siga en curso no se le vuelve a pedir (no se acumulan hilos colgados).
+    """
+
+    def __init__(self, sensors):
+        self.sensors = list(sensors)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(self.sensors)), thread_name_prefix="sensor")
+        self.pending = {}                      # sensor -> future aún en curso
+        self.stale = {id(s): 0 for s in self.sensors}
+
+    def read_all(self, deadline_s: float):
+        """Devuelve las métricas por grupo; error/stale se marcan en el grupo como antes."""
+        futures = {}
+        for sensor in self.sensors:
+            future = self.pending.pop(sensor, None)
+            if future is None or future.done():
+                future = self.pool.submit(sensor.read)
+            futures[sensor] = future
+        started = time.monotonic()
+        wait(futures.values(), timeout=deadline_s)
+        TELEMETRY.observe("sensors.read_ms", (time.monotonic() - started) * 1000.0)
+
+        metrics = {}
+        for sensor, future in futures.items():
+            group = metrics.setdefault(sensor.group, {})
+            if not future.done():
+                self.pending[sensor] = future
+                self.stale[id(sensor)] += 1
+                TELEMETRY.incr("sensors.stale")
+                group["stale"] = True
+            elif future.exception() is not None:
+                TELEMETRY.incr("sensors.errors")
+                group["error"] = True
+            else:
+                group.update(future.result())
+        return metrics
+
+    def drain_samples(self):
+        """Muestras de alta tasa por grupo: {grupo: [(t, {campo: valor})]}."""
+        samples = {}
+        for sensor in self.sensors:
+            drained = sensor.drain_samples()
+            if drained:
+                fields = sensor.sample_fields
+                samples.setdefault(sensor.group, []).extend(
+                    (sample[0], dict(zip(fields, sample[1:]))) for sample in drained
+                )
+        return samples
+
+    def stats(self):
+        return [
+            {"type": s.name, "group": s.group, "stale": self.stale[id(s)], "busy": s in self.pending}
+            for s in self.sensors
+        ]
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        for sensor in self.sensors:
+            close = getattr(sensor, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,164 @@
+import os, time, threading
+import serial
+from sensors.modbus import ModbusFrameParser
+from telemetry import TELEMETRY
+
+# Un bus RS-485 por puerto: un solo hilo dueño del puerto consulta a todos los dispositivos.
+# Modbus RTU es half-duplex y admite un pedido en vuelo por bus, así que el próximo pedido
+# sale apenas llega la respuesta anterior (más el silencio de 3.5 caracteres), sin sleeps fijos.
+# Un dispositivo que no responde no frena al resto: timeout propio y, si sigue mudo, backoff.
+# RESPONSE_TIMEOUT_S es el timeout por omisión; cada dispositivo puede tener el suyo.
+RESPONSE_TIMEOUT_S = float(os.getenv("RS485_RESPONSE_TIMEOUT_MS", "100")) / 1000.0
+MIN_PERIOD_S = float(os.getenv("RS485_MIN_PERIOD_MS", "0")) / 1000.0   # por dispositivo; 0 = lo que dé el bus
+DEAD_AFTER = int(os.getenv("RS485_DEAD_AFTER", "3"))                  # timeouts seguidos antes del backoff
+BACKOFF_MAX_S = float(os.getenv("RS485_BACKOFF_MAX_S", "30"))
+
+
+class BusDevice:
+    """Estado de un dispositivo del bus: su pedido, cuándo toca consultarlo y sus contadores."""
+
+    def __init__(self, address, comando, data_bytes, on_frame, timeout_s=None):
+        self.address = address
+        self.comando = comando
+        self.data_bytes = data_bytes
+        self.on_frame = on_frame      # (datos) -> None
+        self.timeout_s = RESPONSE_TIMEOUT_S if timeout_s is None else timeout_s
+        self.next_due = 0.0
+        self.misses = 0               # timeouts consecutivos
+        self.counters = {"requests": 0, "responses": 0, "timeouts": 0, "backoffs": 0}
+
+
+class RS485Bus:
+    _buses = {}
+    _buses_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, port, baudrate):
+        """El bus del puerto (se crea la primera vez): varios sensores en la misma línea lo comparten."""
+        with cls._buses_lock:
+            bus = cls._buses.get(port)
+            if bus is None:
+                bus = cls._buses[port] = cls(port, baudrate)
+            return bus
+
+    def __init__(self, port, baudrate):
+        self.port = port
+        self.baudrate = baudrate
+        # Silencio de 3.5 caracteres entre tramas (Modbus RTU)
+        self.turnaround_s = 3.5 * 11 / baudrate
+        self.parser = ModbusFrameParser()
+        self.devices = []
+        self.by_address = {}
+        self.serial_errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cursor = 0
+
+        self.ser = None
+        try:
+            self.ser = serial.Serial(port, baudrate, timeout=0.01)
+            print(f"✅ Conectado al puerto {port}")
+        except Exception as e:
+            print(f"⚠️ No se pudo abrir el puerto {port}: {e}")
+            print("→ Ejecutando en modo simulado (valores fijos)")
+        self.simulado = self.ser is None
+        TELEMETRY.gauge(f"rs485:{port}", self.stats, summary=False)
+
+    def add_device(self, address, comando, data_bytes, on_frame, timeout_s=None):
+        device = BusDevice(address, comando, data_bytes, on_frame, timeout_s)
+        with self._lock:
+            self.devices = self.devices + [device]
+            self.by_address[address] = device
+            self.parser.expect(address, data_bytes)
+            if self._thread is None and not self.simulado:
+                self._thread = threading.Thread(target=self._run, name=f"rs485-{self.port}", daemon=True)
+                self._thread.start()
+        return device
+
+    def remove_device(self, device):
+        with self._lock:
+            self.devices = [d for d in self.devices if d is not device]
+            self.by_address.pop(device.address, None)
+            empty = not self.devices
+        if empty:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        if self.ser is not None:
+            self.ser.close()
+        with self._buses_lock:
+            if self._buses.get(self.port) is self:
+                del self._buses[self.port]
+
+    # --- Planificación ---
+
+    def _next_device(self, now):
+        """Próximo dispositivo a consultar (round-robin entre los que ya tocan) o (None, cuándo toca alguno)."""
+        devices = self.devices
+        wake_at = now + 0.1
+        for i in range(len(devices)):
+            device = devices[(self._cursor + i) % len(devices)]
+            if device.next_due <= now:
+                self._cursor = (self._cursor + i + 1) % len(devices)
+                return device, now
+            wake_at = min(wake_at, device.next_due)
+        return None, wake_at
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                now = time.monotonic()
+                device, wake_at = self._next_device(now)
+                if device is None:
+                    self._stop.wait(max(0.0, wake_at - now))
+                    continue
+
+                time.sleep(self.turnaround_s)
+                self.ser.write(device.comando)
+                device.counters["requests"] += 1
+                device.next_due = now + MIN_PERIOD_S
+
+                sent = time.monotonic()
+                if self._await(device):
+                    TELEMETRY.observe("rs485.latency_ms", (time.monotonic() - sent) * 1000.0)
+                    device.misses = 0
+                    continue
+                # Sin respuesta: se descarta lo parcial y, si sigue mudo, se lo consulta menos
+                TELEMETRY.incr("rs485.timeouts")
+                device.counters["timeouts"] += 1
+                device.misses += 1
+                self.parser.reset()
+                if device.misses >= DEAD_AFTER:
+                    device.counters["backoffs"] += 1
+                    device.next_due = time.monotonic() + min(BACKOFF_MAX_S, 0.5 * 2 ** (device.misses - DEAD_AFTER))
+            except Exception as e:
+                self.serial_errors += 1
+                TELEMETRY.incr("rs485.serial_errors")
+                print(f"⚠️ Error en el bus {self.port}:", e)
+                self._stop.wait(0.5)
+
+    def _await(self, device):
+        """Lee hasta la respuesta de `device` o su timeout. Respuestas tardías de otros también se publican."""
+        deadline = time.monotonic() + device.timeout_s
+        while time.monotonic() < deadline:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            if not chunk:
+                continue
+            answered = False
+            for address, data in self.parser.feed(chunk):
+                source = self.by_address.get(address)
+                if source is None:
+                    continue
+                source.counters["responses"] += 1
+                source.on_frame(data)
+                answered = answered or source is device
+            if answered:
+                return True
+        return False
+
+    def stats(self):
+        return {"port": self.port, "devices": len(self.devices), "serialErrors": self.serial_errors, **self.parser.stats()}
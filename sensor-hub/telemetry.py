@@ -0,0 +1,138 @@
+import json, time, bisect, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Telemetría del propio hub: contadores, histogramas de latencia y medidores (gauges).
+# Todo en memoria y con costo O(1) por observación: se registra en el camino caliente
+# (cada muestra, cada pedido al bus) sin frenar el muestreo.
+
+# Límites superiores de los buckets en ms (el último bucket es +inf)
+LATENCY_BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Histograma de buckets fijos: los percentiles se estiman con el límite del bucket."""
+
+    def __init__(self, bounds=LATENCY_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # El límite del bucket, sin pasarse del máximo observado
+                return min(self.bounds[i], round(self.max, 3)) if i < len(self.bounds) else round(self.max, 3)
+        return round(self.max, 3)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+            "buckets": {("+inf" if i == len(self.bounds) else str(b)): n
+                        for i, (b, n) in enumerate(zip(self.bounds + (None,), self.counts)) if n},
+        }
+
+
+class Telemetry:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}              # nombre -> () -> valor, se evalúan al pedir el snapshot
+        self.summary_gauges = set()   # los que entran en el resumen compacto
+        self._lock = threading.Lock()
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value_ms):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(value_ms)
+
+    def gauge(self, name, fn, summary=True):
+        self.gauges[name] = fn
+        if summary:
+            self.summary_gauges.add(name)
+
+    def _gauges(self, names=None):
+        values = {}
+        for name, fn in list(self.gauges.items()):
+            if names is not None and name not in names:
+                continue
+            try:
+                values[name] = fn()
+            except Exception:
+                values[name] = None
+        return values
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: h.snapshot() for name, h in self.histograms.items()}
+        return {
+            "uptimeS": round(time.time() - self.started, 1),
+            "counters": counters,
+            "gauges": self._gauges(),
+            "histograms": histograms,
+        }
+
+    def summary(self):
+        """Versión compacta para adjuntar a las lecturas: contadores, gauges y p50/p95/max."""
+        with self._lock:
+            counters = dict(self.counters)
+            latencies = {
+                name: [h.percentile(0.5), h.percentile(0.95), round(h.max, 1)]
+                for name, h in self.histograms.items() if h.count
+            }
+        return {"counters": counters, "gauges": self._gauges(self.summary_gauges), "latency": latencies}
+
+    def serve(self, host, port):
+        """Expone GET /metrics (JSON) en un hilo aparte."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(telemetry.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="telemetry", daemon=True).start()
+        print(f"📊 Telemetría en http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# Instancia única del proceso: los módulos registran acá sin tener que pasarla de mano en mano
+TELEMETRY = Telemetry()
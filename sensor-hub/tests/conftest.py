@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del hub se importan planos (se corre con `python main.py` desde sensor-hub)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
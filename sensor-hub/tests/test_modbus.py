@@ -0,0 +1,61 @@
+from sensors.modbus import ModbusFrameParser, crc16, leer_registros
+
+
+def response(address, data):
+    frame = bytes([address, 0x03, len(data)]) + data
+    crc = crc16(frame)
+    return frame + bytes([crc & 0xFF, crc >> 8])
+
+
+def test_crc16_known_vector():
+    # Ejemplo clásico de la especificación: leer 10 registros desde 0 en el esclavo 1
+    assert leer_registros(0x01, 0x0000, 0x000A) == bytes.fromhex("01030000000AC5CD")
+    assert crc16(b"123456789") == 0x4B37
+
+
+def test_crc16_matches_bitwise_definition():
+    def bitwise(data):
+        crc = 0xFFFF
+        for b in data:
+            crc ^= b
+            for _ in range(8):
+                crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        return crc
+
+    for data in (b"", b"\x00", b"\xff" * 7, bytes(range(256))):
+        assert crc16(data) == bitwise(data)
+
+
+def test_parser_frames_split_across_chunks():
+    parser = ModbusFrameParser({0x50: 4})
+    frame = response(0x50, b"\x01\x02\x03\x04")
+    assert parser.feed(frame[:3]) == []
+    assert parser.feed(frame[3:]) == [(0x50, b"\x01\x02\x03\x04")]
+    assert parser.feed(response(0x50, b"\x05\x06\x07\x08") * 2) == [(0x50, b"\x05\x06\x07\x08")] * 2
+    assert parser.stats()["frames"] == 3
+
+
+def test_parser_resyncs_after_garbage_echo_and_bad_crc():
+    parser = ModbusFrameParser({0x50: 4, 0x51: 4})
+    good = response(0x51, b"\xaa\xbb\xcc\xdd")
+    corrupt = bytearray(response(0x50, b"\x01\x02\x03\x04"))
+    corrupt[-1] ^= 0xFF
+    stream = b"\x00\xff\x13" + leer_registros(0x50, 0x34, 2) + bytes(corrupt) + good
+
+    assert parser.feed(stream) == [(0x51, b"\xaa\xbb\xcc\xdd")]
+    stats = parser.stats()
+    assert stats["frames"] == 1
+    assert stats["crcErrors"] == 1
+    assert stats["discardedBytes"] == len(stream) - len(good)
+    assert not parser.buffer
+
+
+def test_parser_exception_response_and_unknown_address():
+    parser = ModbusFrameParser({0x50: 4})
+    exception = bytes([0x50, 0x83, 0x02])
+    crc = crc16(exception)
+    exception += bytes([crc & 0xFF, crc >> 8])
+    frame = response(0x50, b"\x00\x01\x00\x02")
+
+    assert parser.feed(response(0x52, b"\x09\x09\x09\x09") + exception + frame) == [(0x50, b"\x00\x01\x00\x02")]
+    assert parser.exceptions == 1
@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+import requests
+
+import main
+from outbox import Outbox
+from pipeline import RingBuffer, Uploader
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b""):
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), max_bytes=64 * 2**20)
+    yield box
+    box.close()
+
+
+def readings(n, start=0):
+    return [{"sensorId": "s", "timestamp": str(i), "metrics": {"g": {"v": i}}} for i in range(start, start + n)]
+
+
+def uploader(outbox, send):
+    return Uploader(RingBuffer(100), send, batch_size=10, max_wait_s=0, stop=threading.Event(),
+                    outbox=outbox, backoff_min_s=60, backoff_max_s=60)
+
+
+def test_outbox_fifo_and_ack(outbox):
+    outbox.append(readings(3))
+    outbox.append(readings(3, start=3))
+    last_id, pending = outbox.peek(3)
+    assert [r["timestamp"] for r in pending] == ["0", "1", "2"]
+    outbox.ack(last_id)
+    assert len(outbox) == 3
+    _, pending = outbox.peek(10)
+    assert [r["timestamp"] for r in pending] == ["3", "4", "5"]
+
+
+def test_outbox_survives_reopen(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    box = Outbox(path, max_bytes=2**20)
+    box.append(readings(4))
+    box.close()
+    box = Outbox(path, max_bytes=2**20)
+    assert box.stats()["readings"] == 4
+    assert len(box.peek(10)[1]) == 4
+    box.close()
+
+
+def test_outbox_evicts_oldest_over_limit(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), max_bytes=1)
+    box.append(readings(2))
+    box.append(readings(2, start=2))
+    assert box.stats()["chunks"] == 1
+    assert box.evicted == 2
+    assert [r["timestamp"] for r in box.peek(10)[1]] == ["2", "3"]
+    box.close()
+
+
+def test_failed_append_rolls_back(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path / "outbox.db"), max_bytes=1)
+    box.append(readings(2))
+
+    def broken():
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(box, "_evict", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        box.append(readings(2, start=2))
+    assert not box.db.in_transaction
+    assert box.stats()["readings"] == 2 and box.stats()["chunks"] == 1
+
+    monkeypatch.undo()
+    box.append(readings(2, start=4))
+    assert [r["timestamp"] for r in box.peek(10)[1]] == ["4", "5"]
+    box.close()
+
+
+def test_replay_acks_only_delivered_batches(outbox):
+    outbox.append(readings(3))
+    up = uploader(outbox, lambda batch: batch)
+    up._replay()
+    assert len(outbox) == 3
+    assert up.failures == 1 and up.retry_at > 0
+
+    delivered = []
+    up = uploader(outbox, lambda batch: delivered.extend(batch) or [])
+    up._replay()
+    assert len(outbox) == 0
+    assert len(delivered) == 3
+
+
+@pytest.mark.parametrize("status, delivered", [
+    (202, True), (200, True),
+    (400, True), (413, True), (422, True),    # rechazo definitivo: se descarta
+    (404, False),                             # sensor no registrado: se reenvía la config
+    (401, False), (429, False), (500, False), (503, False),
+])
+def test_handle_response_delivered(monkeypatch, status, delivered):
+    sent_config = []
+    monkeypatch.setattr(main, "send_sensor", lambda config: sent_config.append(config) or True)
+    assert main.handle_response(FakeResponse(status), count=5) is delivered
+    assert bool(sent_config) == (status == 404)
+
+
+def test_rejected_batches_are_counted():
+    before = main.TELEMETRY.counters.get("upload.rejected", 0)
+    main.handle_response(FakeResponse(422), count=7)
+    assert main.TELEMETRY.counters["upload.rejected"] == before + 7
+
+
+def test_404_keeps_batch_queued_until_sensor_is_registered(monkeypatch, outbox):
+    # La API no guarda nada cuando responde 404 (busca la config antes de guardar), así que
+    # reenviar el lote tras registrar el sensor lo guarda una sola vez
+    registered = []
+    saved = []
+    monkeypatch.setattr(main, "send_sensor", lambda config: registered.append(config) or True)
+
+    def api(batch):
+        if not registered:
+            return [] if main.handle_response(FakeResponse(404), len(batch)) else batch
+        saved.extend(batch)
+        return [] if main.handle_response(FakeResponse(202), len(batch)) else batch
+
+    outbox.append(readings(2))
+    up = uploader(outbox, api)
+    up._replay()
+    assert len(outbox) == 2 and saved == []
+
+    up.retry_at = 0.0
+    up._replay()
+    assert len(outbox) == 0
+    assert saved == readings(2)
+
+
+def test_partial_delivery_requeues_only_the_rest(outbox):
+    outbox.append(readings(3))
+    outbox.append(readings(3, start=3))
+    outbox.append(readings(2, start=6))
+    delivered = []
+
+    def send(batch):
+        delivered.extend(batch[:4])
+        return batch[4:]
+
+    up = uploader(outbox, send)
+    up._replay()
+    assert len(outbox) == 4 and outbox.stats()["chunks"] == 1
+    assert up.sent == 4 and up.failed == 4 and up.failures == 1
+
+    up.retry_at = 0.0
+    up.send = lambda batch: delivered.extend(batch) or []
+    up._replay()
+    assert [r["timestamp"] for r in delivered] == [str(i) for i in range(8)]
+    assert len(outbox) == 0
+
+
+def test_fallback_sends_one_by_one_and_retries_from_first_failure(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_PATH", "")
+    attempts = []
+    monkeypatch.setattr(main, "send_reading", lambda r: attempts.append(r["timestamp"]) or r["timestamp"] != "2")
+    batch = readings(5)
+    assert main.send_batch(batch) == batch[2:]
+    assert attempts == ["0", "1", "2"]
+
+    monkeypatch.setattr(main, "send_reading", lambda r: True)
+    assert main.send_batch(batch) == []
+
+
+def test_batch_path_posts_once(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_PATH", "/ingest/batch")
+    posts = []
+    responses = iter([FakeResponse(202), FakeResponse(503)])
+    monkeypatch.setattr(main, "post_json", lambda path, payload: posts.append((path, payload)) or next(responses))
+    batch = readings(3)
+    assert main.send_batch(batch) == []
+    assert posts == [("/ingest/batch", {"readings": batch})]
+    assert main.send_batch(batch) == batch
+
+    def unreachable(path, payload):
+        raise requests.ConnectionError("sin red")
+
+    monkeypatch.setattr(main, "post_json", unreachable)
+    assert main.send_batch(batch) == batch
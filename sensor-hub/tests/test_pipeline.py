@@ -0,0 +1,131 @@
+import gzip
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import main
+from pipeline import RingBuffer, Sampler, Uploader
+
+
+def test_ring_buffer_drops_oldest_when_full():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.put(i)
+    assert buffer.dropped == 2
+    assert buffer.drain(10, 0) == [2, 3, 4]
+
+
+def test_drain_returns_full_batch_without_waiting_the_timeout():
+    buffer = RingBuffer(100)
+    threading.Timer(0.05, lambda: [buffer.put(i) for i in range(4)]).start()
+    started = time.monotonic()
+    assert buffer.drain(4, 5) == [0, 1, 2, 3]
+    assert time.monotonic() - started < 1
+
+
+def test_drain_returns_partial_batch_on_timeout_or_close():
+    buffer = RingBuffer(100)
+    buffer.put("a")
+    assert buffer.drain(4, 0.05) == ["a"]
+
+    threading.Timer(0.05, buffer.close).start()
+    started = time.monotonic()
+    assert buffer.drain(4, 5) == []
+    assert time.monotonic() - started < 1
+
+
+def test_sampler_keeps_the_period_and_counts_overruns():
+    buffer, stop = RingBuffer(1000), threading.Event()
+    slow = [False]
+
+    def sample():
+        if slow[0]:
+            time.sleep(0.03)
+        return [time.monotonic()]
+
+    sampler = Sampler(sample, buffer, lambda: 0.01, stop)
+    sampler.start()
+    time.sleep(0.2)
+    slow[0] = True
+    time.sleep(0.1)
+    stop.set()
+    sampler.join(1)
+
+    ticks = buffer.drain(1000, 0)
+    assert not sampler.is_alive()
+    assert len(ticks) == sampler.samples
+    # Sin atrasos no hay ráfagas: ~20 lecturas en 0.2 s, espaciadas por el período
+    fast = [t for t in ticks if t < ticks[0] + 0.19]
+    assert 12 <= len(fast) <= 21
+    assert sampler.overruns >= 2
+
+
+def test_uploader_sends_batches_and_flushes_on_stop():
+    buffer, stop = RingBuffer(1000), threading.Event()
+    batches = []
+    uploader = Uploader(buffer, lambda batch: batches.append(batch) or [], batch_size=4, max_wait_s=0.05, stop=stop)
+    uploader.start()
+    for i in range(10):
+        buffer.put(i)
+    time.sleep(0.2)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+    # Lo que queda al cortar se envía antes de terminar
+    stop.set()
+    for i in range(10, 13):
+        buffer.put(i)
+    buffer.close()
+    uploader.join(1)
+    assert not uploader.is_alive()
+    assert sum(batches, []) == list(range(13))
+    assert uploader.sent == 13 and uploader.failed == 0
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """API local que registra cada POST (headers, cuerpo y puerto del cliente)."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((dict(self.headers), body, self.client_address[1]))
+            self.send_response(202)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(main, "API_URL", f"http://127.0.0.1:{server.server_port}")
+    yield received
+    server.shutdown()
+    server.server_close()
+
+
+def test_post_json_gzips_over_one_keep_alive_connection(api, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_GZIP", True)
+    payload = {"readings": [{"sensorId": "s", "metrics": {"g": {"v": i}}} for i in range(50)]}
+    for _ in range(3):
+        assert main.post_json("/ingest/batch", payload).status_code == 202
+
+    headers, body, _ = api[0]
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == payload
+    assert len(body) < len(json.dumps(payload))
+    assert len({port for _, _, port in api}) == 1
+
+
+def test_post_json_plain_when_gzip_is_off(api, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_GZIP", False)
+    main.post_json("/ingest", {"a": 1})
+    headers, body, _ = api[0]
+    assert "Content-Encoding" not in headers
+    assert json.loads(body) == {"a": 1}
@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pytest
+
+from processing import DeadbandFilter, SwingingDoorFilter, Processor
+
+HEARTBEAT = 1e9
+
+
+def run(filt, points, deviation, heartbeat_s=HEARTBEAT):
+    emitted = []
+    for t, value in points:
+        emitted.extend(filt.offer(t, value, deviation, heartbeat_s))
+    return emitted
+
+
+def test_deadband_sends_only_significant_changes():
+    points = [(0, 10.0), (1, 10.4), (2, 10.6), (3, 10.2), (4, 9.0), (5, 9.1)]
+    assert run(DeadbandFilter(), points, 0.5) == [(0, 10.0), (2, 10.6), (4, 9.0)]
+
+
+def test_deadband_heartbeat():
+    points = [(t, 1.0) for t in range(10)]
+    assert run(DeadbandFilter(), points, 0.5, heartbeat_s=4) == [(0, 1.0), (4, 1.0), (8, 1.0)]
+
+
+def test_swinging_door_keeps_corners_of_a_polyline():
+    ramp = [(t, float(t)) for t in range(11)]
+    flat = [(t, 10.0) for t in range(11, 21)]
+    emitted = run(SwingingDoorFilter(), ramp + flat, 0.1)
+    # Los puntos sobre una misma recta no se mandan; el quiebre sale con su propio timestamp
+    assert emitted == [(0, 0.0), (10, 10.0)]
+
+
+def test_swinging_door_reconstruction_within_deviation():
+    rng = random.Random(3)
+    points, value = [], 0.0
+    for t in range(2000):
+        value += rng.gauss(0, 0.2)
+        points.append((float(t), value))
+    deviation = 0.5
+    emitted = run(SwingingDoorFilter(), points, deviation)
+    assert len(emitted) < len(points) / 3
+
+    # Entre dos puntos enviados hay una recta a menos de `deviation` de todos los intermedios;
+    # la que los une exactamente (la que dibuja el cliente) puede alejarse hasta el doble
+    times, values = zip(*emitted)
+    inside = [(t, v) for t, v in points if t <= times[-1]]
+    rebuilt = np.interp([t for t, _ in inside], times, values)
+    errors = np.abs(rebuilt - np.array([v for _, v in inside]))
+    assert errors.max() <= 2 * deviation
+
+    by_time = dict(points)
+    for (t0, v0), (t1, _) in zip(emitted, emitted[1:]):
+        slopes = [((by_time[t] - v0 - deviation) / (t - t0), (by_time[t] - v0 + deviation) / (t - t0))
+                  for t in np.arange(t0 + 1, t1 + 1)]
+        assert max(low for low, _ in slopes) <= min(high for _, high in slopes) + 1e-9
+
+
+def test_swinging_door_heartbeat_restarts():
+    points = [(t, 5.0) for t in range(10)]
+    assert run(SwingingDoorFilter(), points, 0.1, heartbeat_s=5) == [(0, 5.0), (4, 5.0), (5, 5.0)]
+
+
+def test_swinging_door_heartbeat_keeps_pending_point():
+    # Rampa que sube y baja; el heartbeat vence en medio de una puerta abierta
+    points = [(t, float(min(t % 14, 14 - t % 14))) for t in range(41)]
+    deviation = 0.1
+    emitted = run(SwingingDoorFilter(), points, deviation, heartbeat_s=5)
+    assert (4, 4.0) in emitted
+
+    times, values = zip(*emitted)
+    rebuilt = np.interp([t for t, _ in points if t <= times[-1]], times, values)
+    errors = np.abs(rebuilt - np.array([v for t, v in points if t <= times[-1]]))
+    assert errors.max() <= 2 * deviation
+
+
+@pytest.mark.parametrize("compression", ["deadband", "swinging_door"])
+def test_processor_per_metric_deadband_and_flags(compression):
+    config = {
+        "processing": {"compression": compression, "deadband": 100.0},
+        "metricsConfig": {"g": {"a": {"deadband": 0.5}}},
+    }
+    processor = Processor(lambda: config)
+    first = processor.process(0.0, {"g": {"a": 1.0, "b": 1.0}})
+    assert first == [(0.0, {"g": {"a": 1.0, "b": 1.0}})]
+    # "b" usa el deadband global (100): no sale; los flags salen siempre
+    out = processor.process(1.0, {"g": {"a": 1.1, "b": 50.0, "error": True}})
+    assert out == [(1.0, {"g": {"error": True}})]
+    assert processor.stats()["emitted"] == 2
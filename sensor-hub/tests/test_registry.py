@@ -0,0 +1,100 @@
+import time
+import threading
+
+import pytest
+
+import main
+from sensors import registry
+from sensors.base_sensor import BaseSensor
+from sensors.registry import SensorReader, build_sensors, create_sensor
+
+
+class FakeSensor(BaseSensor):
+    sample_fields = ("ax", "ay")
+
+    def __init__(self, group="g", value=1.0, address=None, delay=0.0, fail=False):
+        super().__init__("fake", group)
+        self.value = value
+        self.address = address
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.release = threading.Event()
+        self.samples = []
+
+    def read(self):
+        self.calls += 1
+        if self.delay:
+            self.release.wait(self.delay)
+        if self.fail:
+            raise IOError("sin respuesta")
+        return {"v": self.value}
+
+    def drain_samples(self):
+        drained, self.samples = self.samples, []
+        return drained
+
+
+@pytest.fixture
+def fake_type(monkeypatch):
+    monkeypatch.setitem(registry.SENSOR_TYPES, "fake", FakeSensor)
+
+
+def test_create_sensor_from_spec(fake_type):
+    sensor = create_sensor({"type": "fake", "group": "thermal", "address": "0x51"})
+    assert isinstance(sensor, FakeSensor)
+    assert (sensor.group, sensor.address) == ("thermal", 0x51)
+
+    with pytest.raises(ValueError, match="desconocido"):
+        create_sensor({"type": "termocupla"})
+
+
+def test_build_sensors_skips_invalid_entries(fake_type):
+    sensors = build_sensors([{"type": "fake"}, {"type": "nada"}, {"type": "fake", "bogus": 1}, {"type": "fake", "group": "b"}])
+    assert [s.group for s in sensors] == ["g", "b"]
+
+
+def test_slow_sensor_goes_stale_without_delaying_the_rest():
+    fast, slow, broken = FakeSensor("a", 1.0), FakeSensor("b", 2.0, delay=5), FakeSensor("c", fail=True)
+    reader = SensorReader([fast, slow, broken])
+    try:
+        started = time.monotonic()
+        metrics = reader.read_all(0.1)
+        assert time.monotonic() - started < 1
+        assert metrics == {"a": {"v": 1.0}, "b": {"stale": True}, "c": {"error": True}}
+
+        # Mientras la lectura anterior sigue colgada no se le pide otra
+        assert reader.read_all(0.05)["b"] == {"stale": True}
+        assert slow.calls == 1 and fast.calls == 2
+        assert reader.stats()[1] == {"type": "fake", "group": "b", "stale": 2, "busy": True}
+
+        # Cuando termina, el ciclo siguiente vuelve a leerlo (la lectura atrasada no se usa)
+        slow.release.set()
+        time.sleep(0.05)
+        assert reader.read_all(0.1)["b"] == {"v": 2.0}
+        assert slow.calls == 2
+        assert reader.stats()[1]["busy"] is False
+    finally:
+        slow.release.set()
+        reader.close()
+
+
+def test_drain_samples_by_group():
+    a, b = FakeSensor("a"), FakeSensor("a")
+    a.samples = [(1.0, 0.1, 0.2)]
+    b.samples = [(1.5, 0.3, 0.4)]
+    reader = SensorReader([a, b, FakeSensor("c")])
+    assert reader.drain_samples() == {"a": [(1.0, {"ax": 0.1, "ay": 0.2}), (1.5, {"ax": 0.3, "ay": 0.4})]}
+    assert reader.drain_samples() == {}
+    reader.close()
+
+
+def test_sensor_specs_from_config_or_addresses(monkeypatch):
+    monkeypatch.setattr(main, "CONFIG", {"sensors": [{"type": "fake"}]})
+    assert main.sensor_specs() == [{"type": "fake"}]
+
+    monkeypatch.setattr(main, "CONFIG", {})
+    monkeypatch.setattr(main, "HWT905_ADDRESSES", "0x50, 0x51:mechanical_b")
+    assert [(s["address"], s["group"]) for s in main.sensor_specs()] == [(0x50, "mechanical_50"), (0x51, "mechanical_b")]
+    monkeypatch.setattr(main, "HWT905_ADDRESSES", "0x50")
+    assert main.sensor_specs()[0]["group"] == "mechanical"
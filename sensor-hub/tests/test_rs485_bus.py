@@ -0,0 +1,131 @@
+import struct
+import threading
+import time
+
+import pytest
+
+from sensors import rs485_bus
+from sensors.hwt905 import HWT905Sensor
+from sensors.modbus import crc16, leer_registros
+from sensors.registry import create_sensor
+from sensors.rs485_bus import RS485Bus, RESPONSE_TIMEOUT_S
+
+
+class FakeSerial:
+    """Línea RS-485 simulada: responde a 0x03 de las direcciones conocidas y verifica half-duplex."""
+
+    def __init__(self, port, baudrate, timeout=0.01, addresses=(0x50, 0x51), silent=()):
+        self.addresses = set(addresses)
+        self.silent = set(silent)
+        self.timeout = timeout
+        self.out = bytearray()
+        self.lock = threading.Lock()
+        self.writes = []
+        self.overlaps = 0
+        self.awaiting = False     # hay una respuesta sin leer del pedido anterior
+
+    def write(self, command):
+        with self.lock:
+            if self.awaiting and self.out:
+                self.overlaps += 1
+            self.writes.append(command[0])
+            address = command[0]
+            if address in self.addresses and address not in self.silent:
+                data = struct.pack(">12h", *([0] * 11 + [address]))
+                frame = bytearray([address, 0x03, len(data)]) + data
+                crc = crc16(frame)
+                self.out += frame + bytes([crc & 0xFF, crc >> 8])
+                self.awaiting = True
+
+    @property
+    def in_waiting(self):
+        return len(self.out)
+
+    def read(self, n=1):
+        with self.lock:
+            if not self.out:
+                time.sleep(0.001)
+                return b""
+            data = bytes(self.out[:n])
+            del self.out[:n]
+            if not self.out:
+                self.awaiting = False
+            return data
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def line(monkeypatch):
+    lines = {}
+
+    def open_port(port, baudrate, timeout=0.01):
+        lines[port] = FakeSerial(port, baudrate, timeout, silent=(0x52,))
+        return lines[port]
+
+    monkeypatch.setattr(rs485_bus.serial, "Serial", open_port)
+    yield lines
+    for bus in list(RS485Bus._buses.values()):
+        bus.close()
+
+
+def test_one_bus_per_port(line):
+    a = RS485Bus.shared("/dev/fake0", 9600)
+    assert RS485Bus.shared("/dev/fake0", 9600) is a
+    b = RS485Bus.shared("/dev/fake1", 9600)
+    assert b is not a
+    a.close()
+    assert RS485Bus.shared("/dev/fake0", 9600) is not a
+
+
+def test_sensors_on_the_same_port_share_the_bus(line):
+    first = HWT905Sensor(port="/dev/fake0", address=0x50, continuous=True)
+    second = HWT905Sensor(port="/dev/fake0", address=0x51, continuous=True)
+    assert first.bus is second.bus
+    assert len(line) == 1
+    first.close()
+    assert first.bus.devices == [second.device]
+    second.close()
+    assert "/dev/fake0" not in RS485Bus._buses
+
+
+def test_transactions_are_serialized(line):
+    received = {0x50: 0, 0x51: 0}
+    bus = RS485Bus.shared("/dev/fake0", 115200)
+    for address in received:
+        bus.add_device(address, leer_registros(address, 0x34, 12), 24,
+                       lambda data, address=address: received.__setitem__(address, received[address] + 1))
+    time.sleep(0.3)
+    bus.close()
+
+    port = line["/dev/fake0"]
+    assert port.overlaps == 0
+    assert received[0x50] > 5 and received[0x51] > 5
+    # Round-robin: con los dos en el bus, los pedidos se alternan
+    writes = port.writes[port.writes.index(0x51):]
+    assert all(a != b for a, b in zip(writes, writes[1:]))
+
+
+def test_device_timeout_defaults_to_bus_timeout(line):
+    bus = RS485Bus.shared("/dev/fake0", 9600)
+    bus.simulado = True  # sin hilo del bus: se prueba la transacción directamente
+    default = bus.add_device(0x50, leer_registros(0x50, 0x34, 12), 24, lambda data: None)
+    silent = bus.add_device(0x52, leer_registros(0x52, 0x34, 12), 24, lambda data: None, timeout_s=0.02)
+    assert default.timeout_s == RESPONSE_TIMEOUT_S
+    assert silent.timeout_s == 0.02
+
+    bus.ser.write(silent.comando)
+    started = time.monotonic()
+    assert not bus._await(silent)
+    assert time.monotonic() - started < RESPONSE_TIMEOUT_S
+
+
+def test_timeout_ms_from_sensor_spec(line):
+    sensor = create_sensor({"type": "hwt905", "port": "/dev/fake0", "address": "0x51",
+                            "continuous": True, "timeout_ms": 30})
+    assert sensor.device.timeout_s == pytest.approx(0.03)
+    other = create_sensor({"type": "hwt905", "port": "/dev/fake0", "address": "0x50", "continuous": True})
+    assert other.device.timeout_s == RESPONSE_TIMEOUT_S
+    sensor.close()
+    other.close()
@@ -0,0 +1,73 @@
+import json
+import urllib.request
+
+from telemetry import Histogram, Telemetry
+
+
+def test_percentiles_use_bucket_bounds():
+    hist = Histogram()
+    for value in range(1, 101):
+        hist.observe(float(value))
+    assert hist.percentile(0.5) == 50
+    assert hist.percentile(0.95) == 100
+    assert hist.percentile(0.99) == 100
+    snapshot = hist.snapshot()
+    assert snapshot["count"] == 100
+    assert snapshot["mean"] == 50.5
+    assert snapshot["buckets"]["50"] == 30
+
+
+def test_percentile_never_exceeds_max():
+    hist = Histogram()
+    for _ in range(3):
+        hist.observe(3.0)
+    assert hist.percentile(0.5) == 3.0
+    assert hist.percentile(0.99) == 3.0
+
+
+def test_percentile_overflow_bucket_and_empty():
+    hist = Histogram()
+    assert hist.percentile(0.5) is None
+    hist.observe(1.0)
+    hist.observe(9000.0)
+    assert hist.percentile(0.5) == 1
+    assert hist.percentile(0.99) == 9000.0
+    assert hist.snapshot()["buckets"] == {"1": 1, "+inf": 1}
+
+
+def test_values_on_a_bound_fall_in_that_bucket():
+    hist = Histogram(bounds=(1, 10))
+    hist.observe(10.0)
+    hist.observe(20.0)
+    assert hist.counts == [0, 1, 1]
+
+
+def test_snapshot_summary_and_failing_gauge():
+    telemetry = Telemetry()
+    telemetry.incr("upload.sent", 3)
+    telemetry.observe("upload.rtt_ms", 12.0)
+    telemetry.gauge("queue", lambda: 5)
+    telemetry.gauge("broken", lambda: 1 / 0, summary=False)
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["counters"] == {"upload.sent": 3}
+    assert snapshot["gauges"] == {"queue": 5, "broken": None}
+    assert snapshot["histograms"]["upload.rtt_ms"]["p50"] == 12.0
+
+    summary = telemetry.summary()
+    assert summary["gauges"] == {"queue": 5}
+    assert summary["latency"] == {"upload.rtt_ms": [12.0, 12.0, 12.0]}
+
+
+def test_metrics_endpoint():
+    telemetry = Telemetry()
+    telemetry.incr("sensors.errors")
+    server = telemetry.serve("127.0.0.1", 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as res:
+            body = json.loads(res.read())
+        assert body["counters"] == {"sensors.errors": 1}
+    finally:
+        server.shutdown()
+        server.server_close()